@@ -0,0 +1,104 @@
+"""
+对比 json 和二进制编码在区块、交易记录上的编解码速度以及 leveldb 的读写吞吐
+
+    python benchmark/bench_codec.py
+"""
+import gc
+import json
+import shutil
+import tempfile
+import time
+
+import common
+import plyvel
+
+from utils import codec
+
+BLOCKS = 200
+TXS_PER_BLOCK = 100
+ROUNDS = 3
+
+
+def json_encode(value) -> bytes:
+    return bytes(json.dumps(value), "utf-8")
+
+
+def json_decode(data: bytes):
+    return json.loads(data.decode())
+
+
+FORMATS = {
+    "json": (json_encode, json_decode),
+    "binary": (codec.encode, codec.decode),
+}
+
+
+def best_of(func) -> float:
+    """
+    多次运行取最短时间， 减少机器负载带来的波动， 和 timeit 一样在计时期间关闭 gc
+    """
+    result = None
+    gc.disable()
+    try:
+        for _ in range(ROUNDS):
+            start = time.perf_counter()
+            func()
+            used = time.perf_counter() - start
+            result = used if result is None else min(result, used)
+    finally:
+        gc.enable()
+    return result
+
+
+def bench_format(name, blocks):
+    encode, decode = FORMATS[name]
+    records = {}
+    for block in blocks:
+        records[("block#" + block["block_header"]["hash"]).encode()] = block
+        for tx in block["transactions"]:
+            records[("tx#" + tx["tx_hash"]).encode()] = tx
+
+    path = tempfile.mkdtemp()
+    db = plyvel.DB(path, create_if_missing=True)
+    try:
+        encoded = {key: encode(value) for key, value in records.items()}
+
+        def encode_all():
+            for value in records.values():
+                encode(value)
+
+        def decode_all():
+            for value in encoded.values():
+                decode(value)
+
+        def write():
+            with db.write_batch() as wb:
+                for key, value in records.items():
+                    wb.put(key, encode(value))
+
+        def read():
+            for key in records:
+                decode(db.get(key))
+
+        encode_time = best_of(encode_all)
+        decode_time = best_of(decode_all)
+        write_time = best_of(write)
+        read_time = best_of(read)
+        size = sum(len(value) for value in encoded.values())
+    finally:
+        db.close()
+        shutil.rmtree(path)
+
+    count = len(records)
+    print("{:<7} records={} bytes={:>9} encode={:>7.0f} decode={:>7.0f} write={:>7.0f} read={:>7.0f} (rec/s)".format(
+        name, count, size, count / encode_time, count / decode_time, count / write_time, count / read_time))
+
+
+def main():
+    blocks = [common.make_block(TXS_PER_BLOCK, height) for height in range(BLOCKS)]
+    for name in FORMATS:
+        bench_format(name, blocks)
+
+
+if __name__ == "__main__":
+    main()
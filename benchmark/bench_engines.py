@@ -0,0 +1,97 @@
+"""
+在相同的负载上对比各个存储引擎： 按区块提交写入单元、随机点查、批量读取、按命名空间遍历以及快照读取
+
+    python benchmark/bench_engines.py
+"""
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import common
+
+from utils import codec
+from utils.convertor import NS_BLOCK, NS_TX, hash_to_key
+from utils.leveldb import LevelDBEngine
+from utils.memorydb import MemoryEngine
+from utils.sqlitedb import SQLiteEngine
+
+BLOCKS = 200
+TXS_PER_BLOCK = 100
+READS = 20000
+MULTI_GET_SIZE = 100
+
+ENGINES = {
+    "leveldb": lambda path: LevelDBEngine(path),
+    "memory": lambda path: MemoryEngine(),
+    "sqlite": lambda path: SQLiteEngine(os.path.join(path, "bench.sqlite")),
+}
+
+
+def make_batches():
+    """
+    每个区块一个写入单元， 包含区块记录和区块中所有交易的记录
+    """
+    batches = []
+    tx_keys = []
+    for height in range(BLOCKS):
+        block = common.make_block(TXS_PER_BLOCK, height)
+        ops = [(NS_BLOCK + hash_to_key(block["block_header"]["hash"]), codec.encode(block))]
+        for tx in block["transactions"]:
+            key = NS_TX + hash_to_key(tx["tx_hash"])
+            ops.append((key, codec.encode(tx)))
+            tx_keys.append(key)
+        batches.append(ops)
+    return batches, tx_keys
+
+
+def bench_engine(name, batches, tx_keys):
+    path = tempfile.mkdtemp()
+    engine = ENGINES[name](path)
+    try:
+        start = time.perf_counter()
+        for ops in batches:
+            engine.write(ops)
+        write_time = time.perf_counter() - start
+
+        keys = random.sample(tx_keys, min(READS, len(tx_keys)))
+        start = time.perf_counter()
+        for key in keys:
+            engine.get(key)
+        get_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for idx in range(0, len(keys), MULTI_GET_SIZE):
+            engine.multi_get(keys[idx: idx + MULTI_GET_SIZE])
+        multi_get_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        iterator = engine.iterator(NS_TX)
+        scanned = sum(1 for _ in iterator)
+        iterator.close()
+        scan_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot = engine.snapshot()
+        for key in keys:
+            snapshot.get(key)
+        snapshot.close()
+        snapshot_time = time.perf_counter() - start
+    finally:
+        engine.close()
+        shutil.rmtree(path)
+
+    print("{:<8} blocks/s={:>7.1f} get={:>8.0f} multi_get={:>8.0f} scan={:>9.0f} snapshot_get={:>8.0f} (rec/s)".format(
+        name, len(batches) / write_time, len(keys) / get_time, len(keys) / multi_get_time,
+        scanned / scan_time, len(keys) / snapshot_time))
+
+
+def main():
+    batches, tx_keys = make_batches()
+    for name in ENGINES:
+        bench_engine(name, batches, tx_keys)
+
+
+if __name__ == "__main__":
+    main()
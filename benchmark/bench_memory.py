@@ -0,0 +1,64 @@
+"""
+对比缓存中的区块在 __dict__ 表示和 __slots__ 表示下占用的内存， 统计完整反序列化一个区块之后新分配的字节数
+
+    python benchmark/bench_memory.py
+"""
+import gc
+import tracemalloc
+
+import common
+
+from core.block import Block
+from utils.cache import estimate_size
+
+TXS_PER_BLOCK = 10000
+
+
+class DictObject(object):
+    """
+    原来的表示方式， 每个对象通过 __dict__.update(data) 保存字段
+    """
+
+    def __init__(self, data: dict):
+        self.__dict__.update(data)
+
+
+def build_dict_block(data: dict):
+    header = DictObject(data["block_header"])
+    txs = []
+    for tx in data["transactions"]:
+        txs.append(DictObject({
+            "tx_hash": tx["tx_hash"],
+            "inputs": [DictObject(item) for item in tx["inputs"]],
+            "outputs": [DictObject(item) for item in tx["outputs"]]
+        }))
+    return header, txs
+
+
+def build_slots_block(data: dict):
+    block = Block.deserialize(data)
+    # 遍历一次， 保证所有交易都已经反序列化
+    list(block.transactions)
+    return block
+
+
+def measure(build, data: dict):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build(data)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return allocated, estimate_size(value)
+
+
+def main():
+    data = common.make_block(TXS_PER_BLOCK)
+    for name, build in (("dict", build_dict_block), ("slots", build_slots_block)):
+        allocated, estimated = measure(build, data)
+        print("{:<6} txs={} allocated={:>10} bytes ({:>5.0f}/tx) estimate_size={:>10} bytes".format(
+            name, TXS_PER_BLOCK, allocated, allocated / TXS_PER_BLOCK, estimated))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+连续回滚 100 个区块， 对比使用区块的回滚记录和从输入引用的交易中读取被使用的输出（没有回滚记录时）的耗时
+使用内存引擎， 不会修改节点的数据目录
+
+    python benchmark/bench_rollback.py
+"""
+import logging
+import tempfile
+import time
+
+import common
+
+from core.config import Config
+from core.block import Block
+from core.block_chain import BlockChain
+from core.block_header import BlockHeader
+from core.transaction import Transaction, TxInput, TxOutput
+from core.utxo import UTXOSet
+from utils.convertor import NS_TX, NS_UNDO, hash_to_key
+from utils.database import Database
+
+BLOCKS = 100
+TXS_PER_BLOCK = 200
+
+
+def make_block(height: int, txs: list) -> Block:
+    block = Block(BlockHeader("", height), txs)
+    block.set_header_hash()
+    return block
+
+
+def make_chain() -> list:
+    """
+    第一个区块中的 coinbase 交易产生输出， 之后每个区块中的交易使用前一个区块中对应交易的两个输出
+    """
+    txs = []
+    for idx in range(TXS_PER_BLOCK):
+        tx = Transaction([TxInput("", -1)], [TxOutput(idx, common.random_hex(20)) for _ in range(2)])
+        tx.set_id()
+        txs.append(tx)
+    blocks = [make_block(1, txs)]
+
+    for height in range(2, BLOCKS + 2):
+        prev_txs = txs
+        txs = []
+        for prev_tx in prev_txs:
+            tx = Transaction([TxInput(prev_tx.tx_hash, idx, common.random_hex(64)) for idx in range(2)],
+                             [TxOutput(height, common.random_hex(20)) for _ in range(2)])
+            tx.set_id()
+            txs.append(tx)
+        blocks.append(make_block(height, txs))
+    return blocks
+
+
+def connect(blocks: list) -> None:
+    db = Database()
+    txs = db.namespace(NS_TX)
+    for block in blocks:
+        with db.write_batch() as batch:
+            UTXOSet().update(block, batch)
+            for tx in block.transactions:
+                batch.put(txs, hash_to_key(tx.tx_hash), tx.serialize())
+    UTXOSet().flush()
+
+
+def roll_back(blocks: list, with_undo: bool) -> float:
+    db = Database()
+    if not with_undo:
+        with db.write_batch() as batch:
+            for block in blocks:
+                batch.delete(db.namespace(NS_UNDO), hash_to_key(block.header_hash))
+
+    bc = BlockChain()
+    start = time.perf_counter()
+    for block in reversed(blocks):
+        UTXOSet().roll_back(block, bc)
+    return time.perf_counter() - start
+
+
+def main():
+    # 没有回滚记录时每个区块都会输出警告
+    logging.disable(logging.WARNING)
+    Config().set("storage.engine", "memory")
+    Config().set("storage.write_behind", "0")
+    Config().set("storage.header_file", tempfile.mktemp(suffix=".dat"))
+
+    blocks = make_chain()
+    # 第一个区块保留， 只回滚之后的区块
+    connect(blocks)
+    for name, with_undo in (("undo", True), ("tx read", False)):
+        elapsed = roll_back(blocks[1:], with_undo)
+        print("{:<8} blocks={} txs/block={} elapsed={:>7.3f}s ({:>7.1f} blocks/s)".format(
+            name, BLOCKS, TXS_PER_BLOCK, elapsed, BLOCKS / elapsed))
+        connect(blocks[1:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+模拟初次同步： 每个区块先解码、计算哈希（验证）， 再提交一个写入单元
+对比在当前线程直接写入和交给写入线程（group commit）两种方式的吞吐
+
+    python benchmark/bench_writer.py
+"""
+import hashlib
+import json
+import shutil
+import tempfile
+import time
+
+import common
+
+from threads.writer import StorageWriter
+from utils import codec
+from utils.database import WriteBatch
+from utils.leveldb import LevelDBEngine
+
+BLOCKS = 300
+TXS_PER_BLOCK = 100
+
+
+def validate(data: bytes) -> dict:
+    block = codec.decode(data)
+    for tx in block["transactions"]:
+        hashlib.sha256(json.dumps(tx).encode()).hexdigest()
+    return block
+
+
+def sync_blocks(encoded_blocks, write_behind: bool, sync: bool) -> float:
+    path = tempfile.mkdtemp()
+    db = LevelDBEngine(path)
+    writer = StorageWriter(db) if write_behind else None
+    try:
+        start = time.perf_counter()
+        for data in encoded_blocks:
+            block = validate(data)
+            batch = WriteBatch(db, sync, writer)
+            batch.insert("block#" + block["block_header"]["hash"], block)
+            for tx in block["transactions"]:
+                batch.insert("tx#" + tx["tx_hash"], tx)
+            batch.write()
+
+        if writer is not None:
+            writer.flush()
+        return time.perf_counter() - start
+    finally:
+        if writer is not None:
+            writer.close()
+        db.close()
+        shutil.rmtree(path)
+
+
+def main():
+    encoded_blocks = [codec.encode(common.make_block(TXS_PER_BLOCK, height)) for height in range(BLOCKS)]
+    for sync in (False, True):
+        for write_behind in (False, True):
+            used = sync_blocks(encoded_blocks, write_behind, sync)
+            print("sync={:<5} write_behind={:<5} blocks/s={:>7.1f}".format(
+                str(sync), str(write_behind), BLOCKS / used))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import random
+import sys
+
+# 保证在 benchmark 目录下直接运行脚本时能够导入项目中的模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def random_hex(length: int) -> str:
+    return os.urandom(length).hex()
+
+
+def make_tx(inputs: int = 2, outputs: int = 2) -> dict:
+    """
+    生成一笔和 Transaction.serialize() 结构一致的交易数据
+    """
+    tx_inputs = []
+    for idx in range(inputs):
+        tx_input = {
+            "tx_hash": random_hex(32),
+            "index": random.randint(0, 3),
+            "signature": random_hex(64),
+            "pub_key": random_hex(64),
+        }
+        if idx == 0:
+            tx_input["vote_info"] = {}
+            tx_input["delay_params"] = {}
+        tx_inputs.append(tx_input)
+
+    tx_outputs = [{
+        "value": random.randint(1, 10 ** 8),
+        "pub_key_hash": "1PuRN6PvTfhVazxoK8zZ3eFvTUSU76VHRF"
+    } for _ in range(outputs)]
+
+    return {
+        "tx_hash": random_hex(32),
+        "inputs": tx_inputs,
+        "outputs": tx_outputs
+    }
+
+
+def make_block(tx_count: int, height: int = 1) -> dict:
+    """
+    生成一个和 Block.serialize() 结构一致的区块数据
+    """
+    return {
+        "magic_no": "0xD9B4BEF9",
+        "block_header": {
+            "timestamp": "1666000000000",
+            "prev_block_hash": random_hex(32),
+            "hash": random_hex(32),
+            "hash_merkle_root": random_hex(32),
+            "height": height,
+            "nonce": None
+        },
+        "transactions": [make_tx() for _ in range(tx_count)]
+    }
@@ -1,10 +1,86 @@
+import json
 import logging
+import sys
+import threading
+from collections.abc import Sequence
 
 from core.block_header import BlockHeader
 from core.config import Config
+from core.merkle import MerkleTree
 from core.transaction import Transaction
 
 
+def merkle_activation_height() -> int:
+    """
+    merkle 根覆盖区块中实际包含的交易的起始高度， 由 node.merkle_activation_height 配置， 网络升级时统一设置
+    之前的区块的 merkle 根使用去掉冲突交易之前的交易列表计算， 不能通过区块中的交易重新计算校验
+    没有配置时不启用
+    """
+    value = Config().get("node.merkle_activation_height")
+    return int(value) if value else sys.maxsize
+
+
+class LazyTransactions(Sequence):
+    """
+    按需反序列化的交易列表， 保存交易的原始记录， 通过下标访问时只反序列化对应的交易，
+    遍历时按顺序逐个反序列化， 反序列化之后使用交易替换原始记录， 不重复占用内存
+    """
+
+    def __init__(self, records: list):
+        """
+        :param records: 交易的原始记录列表， 元素也可以是已经反序列化的交易
+        """
+        self.__items = list(records)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__decode(idx) for idx in range(*index.indices(len(self.__items)))]
+        if index < 0:
+            index += len(self.__items)
+        if not 0 <= index < len(self.__items):
+            raise IndexError("transaction index out of range")
+        return self.__decode(index)
+
+    def __iter__(self):
+        for idx in range(len(self.__items)):
+            yield self.__decode(idx)
+
+    def __repr__(self):
+        return "LazyTransactions(count={}, decoded={})".format(len(self), self.decoded_count)
+
+    @property
+    def decoded_count(self) -> int:
+        return sum(1 for item in self.__items if not isinstance(item, dict))
+
+    def tx_hashes(self) -> list:
+        """
+        按顺序返回交易哈希， 不需要反序列化交易
+        """
+        return [item["tx_hash"] if isinstance(item, dict) else item.tx_hash for item in self.__items]
+
+    def serialize(self) -> list:
+        """
+        没有反序列化的交易直接返回原始记录
+        """
+        return [item if isinstance(item, dict) else item.serialize() for item in self.__items]
+
+    def __decode(self, index: int) -> Transaction:
+        item = self.__items[index]
+        if not isinstance(item, dict):
+            return item
+
+        tx = Transaction.deserialize(item)
+        with self.__lock:
+            # 多个线程同时反序列化时保留第一个结果， 保证同一个下标总是返回同一个对象
+            if isinstance(self.__items[index], dict):
+                self.__items[index] = tx
+            return self.__items[index]
+
+
 class Block(object):
 
     def __init__(self, block_header=None, transactions=None):
@@ -21,6 +97,16 @@ class Block(object):
     def set_hash_merkle_tree(self, hash_merkle_root):
         self._block_header.hash_merkle_root = hash_merkle_root
 
+    def compute_merkle_root(self) -> str:
+        """
+        根据区块中的交易计算 merkle 根， 每笔交易使用 json 序列化之后的数据
+        """
+        if isinstance(self._transactions, LazyTransactions):
+            data = [json.dumps(tx) for tx in self._transactions.serialize()]
+        else:
+            data = [json.dumps(tx.serialize()) for tx in self._transactions]
+        return MerkleTree(data).root_hash
+
     @classmethod
     def new_genesis_block(cls, coinbase_tx):
         block_header = BlockHeader.new_genesis_block_header()
@@ -78,19 +164,56 @@ class Block(object):
         return self.block_header.hash == other.block_header.hash
 
     def serialize(self):
+        if isinstance(self._transactions, LazyTransactions):
+            transactions = self._transactions.serialize()
+        else:
+            transactions = [tx.serialize() for tx in self._transactions]
+
+        return {
+            "magic_no": self._magic_no,
+            "block_header": self._block_header.serialize(),
+            "transactions": transactions
+        }
+
+    def serialize_compact(self):
+        """
+        数据库中存储的区块记录， 只包含区块头和按顺序排列的交易哈希， 交易的内容存储在交易表中
+        """
         return {
             "magic_no": self._magic_no,
             "block_header": self._block_header.serialize(),
-            "transactions": [tx.serialize() for tx in self._transactions]
+            "tx_hashes": self.tx_hashes()
         }
 
+    def tx_hashes(self) -> list:
+        """
+        按顺序返回区块中的交易哈希， 延迟反序列化的区块不会因此反序列化交易
+        """
+        if isinstance(self._transactions, LazyTransactions):
+            return self._transactions.tx_hashes()
+        return [tx.tx_hash for tx in self._transactions]
+
+    @staticmethod
+    def is_compact(data: dict) -> bool:
+        return "tx_hashes" in data
+
+    @staticmethod
+    def is_pruned(data: dict) -> bool:
+        """
+        裁剪之后的区块记录只保留区块头
+        """
+        return "tx_hashes" not in data and "transactions" not in data
+
     @classmethod
-    def deserialize(cls, data: dict):
+    def deserialize(cls, data: dict, transactions=None):
+        """
+        反序列化区块， 区块头立即反序列化， 交易在第一次访问时才按下标反序列化，
+        对于 serialize_compact 得到的数据需要传入已经按顺序取出的交易列表， 列表中可以是交易或者交易的原始记录
+        """
         block_header_dict = data['block_header']
         block_header = BlockHeader()
         block_header.deserialize(block_header_dict)
-        transactions = data['transactions']
-        txs = []
-        for transaction in transactions:
-            txs.append(Transaction.deserialize(transaction))
-        return cls(block_header, txs)
+
+        if transactions is None:
+            transactions = data['transactions']
+        return cls(block_header, LazyTransactions(transactions))
@@ -4,41 +4,80 @@ import threading
 import time
 from functools import lru_cache
 
-from lru import LRU
-
-from core.block import Block
+from core.block import Block, merkle_activation_height
 from core.block_header import BlockHeader
 from core.config import Config
-from core.merkle import MerkleTree
-from core.transaction import Transaction
+from core.header_index import HeaderIndex
+from core.sighash import SignatureCache, signature_keys, verify_signatures
+from core.transaction import Transaction, TxOutput
 from core.utxo import UTXOSet
-from utils.leveldb import LevelDB
+from core.verifier import VerifyExecutor
+from utils.cache import SizedLRU, estimate_size
+from utils.blockfile import BlockFile, pack_location, unpack_location, pack_position, unpack_position
+from utils.database import Database
+from utils.errors import PrunedBlockError
 from utils.singleton import Singleton
-from utils.convertor import blockhash_to_db_key, tx_hash_to_db_key, utxo_hash_to_db_key, height_to_db_key
+from utils.convertor import hash_to_key, key_to_hash, height_to_key, key_to_height
+from utils.convertor import NS_BLOCK, NS_HEIGHT, NS_TX, NS_META, NS_BLOCK_FILE, NS_UNDO
+from utils.convertor import META_LATEST, META_BLOCK_FILE, META_PRUNE_HEIGHT
+
+
+# 裁剪模式下最少保留的区块数量， 回滚的深度不能超过保留的区块数量
+MIN_KEEP_BLOCKS = 100
+# 每连接一个区块最多裁剪的区块数量， 开启裁剪时逐步清理历史区块
+PRUNE_BATCH_SIZE = 100
+# 遍历区块时每次预读的区块数量
+ITER_READ_AHEAD = 32
+# 估计区块大小时最多抽样的交易数量
+BLOCK_SIZE_SAMPLES = 16
+
+
+def _block_size(block: Block) -> int:
+    """
+    估计区块占用的内存， 交易较多时对交易抽样估计， 避免遍历所有交易
+    """
+    transactions = block.transactions
+    sample = transactions[::max(1, len(transactions) // BLOCK_SIZE_SAMPLES)]
+    tx_size = sum(estimate_size(tx) for tx in sample) * len(transactions) // max(1, len(sample))
+    return estimate_size(block.block_header) + tx_size
 
 
 class BlockChain(Singleton):
     def __init__(self):
-        self.db = LevelDB()
-        self.__tx_cache = LRU(30000)
-        self.__block_cache = LRU(500)
-
-        # map block_height => block_hash
-        self.__block_map = LRU(2000)
+        self.db = Database()
+        self.__blocks = self.db.namespace(NS_BLOCK)
+        self.__heights = self.db.namespace(NS_HEIGHT)
+        self.__txs = self.db.namespace(NS_TX)
+        self.__meta = self.db.namespace(NS_META)
+        self.__locations = self.db.namespace(NS_BLOCK_FILE)
+        self.__undo = self.db.namespace(NS_UNDO)
+        # 区块记录中只存储交易哈希， 交易内容只存储在交易表中
+        self.__compact_blocks = int(Config().get("storage.compact_blocks", 1)) == 1
+        # 区块内容写入分段文件， leveldb 中只存储区块的位置
+        self.__block_files = int(Config().get("storage.block_files", 0)) == 1
+        # 裁剪模式， 只保留最近 keep_last_n_blocks 个区块的内容， 区块头和 UTxO 集合全部保留
+        self.__prune = int(Config().get("storage.prune", 0)) == 1
+        self.__keep_blocks = max(int(Config().get("storage.keep_last_n_blocks", 1000)), MIN_KEEP_BLOCKS)
+        self.__prune_compact_interval = int(Config().get("storage.prune_compact_interval", 1000))
+        # 已经裁剪的最高高度 + 1， 为空时从数据库中加载
+        self.__prune_height = None
+        # 上一次压缩之后裁剪的区块数量
+        self.__pruned_count = 0
+        # 上一次删除分段文件时保留的最小文件编号
+        self.__pruned_file_no = None
+        # 区块和交易的缓存按照内存预算淘汰
+        self.__tx_cache = SizedLRU("transaction", int(Config().get("cache.transaction", 64 * 1024 * 1024)))
+        self.__block_cache = SizedLRU("block", int(Config().get("cache.block", 64 * 1024 * 1024)), _block_size)
+
+        # 主链的区块头索引， 高度 <=> 哈希， 第一次使用时打开并和数据库进行比较
+        self.__headers = HeaderIndex(Config().get_path("storage.header_file", "headers.dat"))
+        self.__headers_lock = threading.Lock()
+        self.__headers_ready = False
 
         # todo: init
         # 目前区块上的最新的区块， 只读
         self.__latest = None
 
-        # 统计使用的变量， 和整体逻辑关系不大
-        self.__cache_count_lock = threading.Lock()
-        self.__block_count_lock = threading.Lock()
-
-        self.__cache_used = 0
-        self.__cache_hit = 0
-        self.__block_used = 0
-        self.__block_hit = 0
-
     def __getitem__(self, index) -> Block:
         """ 重写内部方法，通过索引获取区块
 
@@ -95,17 +134,17 @@ class BlockChain(Singleton):
         coin_base_tx = Transaction.coinbase_tx(vote, delay_params)
         transactions.insert(0, coin_base_tx)
 
-        data = []
-        for tx in transactions:
-            data.append(json.dumps(tx.serialize()))
-        merkle_tree = MerkleTree(data)
-        block_header = BlockHeader(merkle_tree.root_hash, height)
-
+        # merkle 根使用去掉冲突交易之后的交易列表计算， 和区块中实际包含的交易一致， 接收方可以重新计算校验，
+        #  升级之前的区块使用去掉冲突交易之前的交易列表计算， 见 merkle_activation_height
         txs = UTXOSet().clear_transactions(transactions)
-        block = Block(block_header, txs)
+        block = Block(BlockHeader("", height), txs)
+        if height >= merkle_activation_height():
+            block.set_hash_merkle_tree(block.compute_merkle_root())
+        else:
+            block.set_hash_merkle_tree(Block(None, transactions).compute_merkle_root())
 
-        # TODO(Decision): 区块头的哈希是根据merkle树的根哈希值来进行哈希的， 和交易存在关系
-        #  那么是否可以在区块中仅仅存入交易的哈希列表，交易的具体信息存在其他的表中以提高查询效率，区块不存储区块具体的信息？
+        # 区块头的哈希是根据merkle树的根哈希值来进行哈希的， 数据库中的区块记录只存储交易的哈希列表，
+        #  交易的具体信息存储在交易表中（storage.compact_blocks）
         logging.debug("Get block#{} from database.".format(prev_height))
         prev_block = self.get_block_by_height(prev_height)
 
@@ -123,7 +162,7 @@ class BlockChain(Singleton):
         Args:
             transaction: 一般是第一笔coinbase交易
         """
-        if self.db["latest"]:
+        if self.__meta[META_LATEST]:
             # 如果已经存在信息说明不需要生成创世区块
             return
 
@@ -135,42 +174,55 @@ class BlockChain(Singleton):
 
         self.insert_block(genesis_block)
 
-    def get_latest_block(self) -> (Block, str):
+    def get_latest_block(self, snapshot=None) -> (Block, str):
         """ 获取最新区块
 
         首先查询缓存的 __latest 变量是否存在区块，如果存在直接返回
         否则从数据库中得到最新区块的哈希值后再查找区块，最后返回
+        Args:
+            snapshot: 读取使用的快照， 传入时返回快照中的最新区块
         Returns:
             目前本地存储的最新区块，如果不存在则直接返回
         """
+        if snapshot is not None:
+            latest_block_hash_obj = snapshot.namespace(NS_META)[META_LATEST]
+            if not latest_block_hash_obj:
+                return None, None
+            latest_block_hash = latest_block_hash_obj.get("hash", "")
+            return self.get_block_by_hash(latest_block_hash, snapshot), latest_block_hash
+
         if self.__latest:
             block_hash = self.__latest.block_header.hash
             return self.__latest, block_hash
 
-        latest_block_hash_obj = self.db["latest"]
+        latest_block_hash_obj = self.__meta[META_LATEST]
 
         if not latest_block_hash_obj:
             return None, None
 
         latest_block_hash = latest_block_hash_obj.get("hash", "")
-        block_db_key = blockhash_to_db_key(latest_block_hash)
-        block_data = self.db[block_db_key]
-        block = Block.deserialize(block_data)
+        block_data = self.__read_block_record(hash_to_key(latest_block_hash))
+        block = self.__load_block(block_data)
         self.__latest = block
         return block, latest_block_hash
 
-    def set_latest_hash(self, blockhash: str) -> None:
+    def set_latest_hash(self, blockhash: str, batch=None) -> None:
         """ 在数据库中设置最新区块的哈希值
         Args:
             blockhash: 对应的区块哈希值
+            batch: 所属的写入单元，为空时直接写入数据库
         """
         latest_hash_dict = {
             "hash": blockhash
         }
 
-        self.db["latest"] = latest_hash_dict
+        if batch is None:
+            with self.db.write_batch() as batch:
+                batch.put(self.__meta, META_LATEST, latest_hash_dict)
+        else:
+            batch.put(self.__meta, META_LATEST, latest_hash_dict)
 
-    def get_block_by_height(self, height: int):
+    def get_block_by_height(self, height: int, snapshot=None):
         """ 获取指定高度的区块
 
         首先查询区块缓存中是否存在区块
@@ -180,68 +232,350 @@ class BlockChain(Singleton):
 
         Args:
             height: 需要获取的区块的高度
+            snapshot: 读取使用的快照， 由 Database.snapshot 获取
 
         Returns:
             如果区块存在，返回对应高度下的区块，否则返回None
 
         """
-        if self.__block_map.get(height, None):
-            logging.debug("Hit height to hash cache, search block in cache...")
+        block_hash = self.__get_block_hash(height, snapshot)
 
-            block_hash = self.__block_map[height]
-        else:
-            block_height_db_key = height_to_db_key(height)
-            block_hash = self.db[block_height_db_key]
+        if not block_hash:
+            return None
 
-            if not block_hash:
-                return None
+        return self.get_block_by_hash(block_hash, snapshot)
 
-            self.__block_map[height] = block_hash
+    def __get_block_hash(self, height: int, snapshot=None):
+        """
+        获取高度对应的区块哈希， 通过区块头索引查询
+        高度到哈希的映射会因为回滚而改变， 使用快照时从快照的高度索引中读取
+        """
+        if snapshot is not None:
+            block_hash_key = snapshot.namespace(NS_HEIGHT).get_raw(height_to_key(height))
+            return key_to_hash(block_hash_key) if block_hash_key else None
+
+        return self.__header_index().hash_at(height)
+
+    def get_height_by_hash(self, block_hash: str):
+        """
+        获取主链上区块哈希对应的高度， 区块不在主链上时返回 None
+        """
+        return self.__header_index().height_of(block_hash)
 
-        return self.get_block_by_hash(block_hash)
+    def __header_index(self) -> HeaderIndex:
+        """
+        获取区块头索引， 第一次使用时打开索引文件， 和数据库中的最新区块不一致时从区块表中重建
+        """
+        if not self.__headers_ready:
+            with self.__headers_lock:
+                if not self.__headers_ready:
+                    self.__headers.open()
+                    self.__sync_header_index()
+                    self.__headers_ready = True
+        return self.__headers
+
+    def __sync_header_index(self) -> None:
+        """
+        检查区块头索引的最后一个区块是否是数据库中的最新区块
+          - 索引中多出的区块（索引更新之后、数据库提交之前退出）直接删除
+          - 其他情况从区块表中重建
+        """
+        latest_block_hash_obj = self.__meta[META_LATEST]
+        if not latest_block_hash_obj:
+            self.__headers.truncate(0)
+            return
+
+        latest_hash = latest_block_hash_obj.get("hash", "")
+        latest_height = self.__headers.height_of(latest_hash)
+        if latest_height is not None:
+            self.__headers.truncate(latest_height + 1)
+            return
+
+        self.rebuild_header_index()
+
+    def rebuild_header_index(self) -> None:
+        """
+        按照高度遍历区块表， 重建区块头索引， 被裁剪的区块保留了区块头， 同样可以重建
+        """
+        logging.info("Rebuild header index from block table.")
+        # 遍历只能读取到已经写入数据库的记录
+        self.db.flush()
+        self.__headers.truncate(0)
+
+        for height_key in self.__heights.iterator(include_value=False):
+            height = key_to_height(height_key)
+            block_hash_key = self.__heights.get_raw(height_key)
+            data = self.__read_block_record(block_hash_key)
+            if not data or height != len(self.__headers):
+                logging.error("Block at height {} is missing, stop rebuilding header index.".format(height))
+                break
+
+            block_header = BlockHeader()
+            block_header.deserialize(data["block_header"])
+            self.__headers.put(block_header)
+
+        logging.info("Header index rebuilt with {} blocks.".format(len(self.__headers)))
+
+    def get_block_data_by_height(self, height: int, snapshot=None):
+        """ 获取指定高度区块的 json 数据
+
+        用于向邻居节点发送区块， 区块存储在分段文件中时直接返回映射出来的数据， 不需要反序列化
+
+        Args:
+            height: 需要获取的区块的高度
+            snapshot: 读取使用的快照， 由 Database.snapshot 获取
+        Returns:
+            区块的 json 数据， 区块不存在时返回空
+        """
+        block_hash = self.__get_block_hash(height, snapshot)
+
+        if not block_hash:
+            return None
+
+        location = self.__namespace(self.__locations, snapshot).get_raw(hash_to_key(block_hash))
+        if location is not None:
+            try:
+                return BlockFile().read(unpack_location(location))
+            except (OSError, ValueError) as e:
+                logging.warning("Read block#{} from block file failed: {}".format(block_hash, e))
+                return None
+
+        block = self.get_block_by_hash(block_hash, snapshot)
+        if block is None:
+            return None
+        return json.dumps(block.serialize()).encode()
 
     # 缓存100个区块数据
-    def get_block_by_hash(self, block_hash: str):
+    def get_block_by_hash(self, block_hash: str, snapshot=None):
         """ 根据区块哈希值获取区块
 
         首先根据哈希值检索缓存
           - 缓存命中，直接返回区块
           - 缓存不命中，根据区块哈希在数据库中检索区块数据
         如果区块不存在，返回空
+        区块的内容由哈希值决定， 使用快照时同样查询缓存， 但是从快照中读取的区块不放入缓存
 
         Args:
             block_hash: 区块哈希值
+            snapshot: 读取使用的快照， 由 Database.snapshot 获取
         Returns:
             查询区块成功的情况下返回一个区块
             如果区块不存在或哈希值字段不对则返回空
         """
-        block_db_key = blockhash_to_db_key(block_hash)
-        if block_hash in self.__block_cache and self.__block_cache[block_hash]:
+        block = self.__block_cache.get(block_hash)
+        if block is not None:
             # 如果命中区块缓存，直接返回
             logging.debug("Hit block hash in cache, return block.")
-
-            with self.__block_count_lock:
-                self.__block_hit += 1
-                self.__block_used += 1
-
-            return self.__block_cache[block_hash]
+            return block
 
         if not block_hash or block_hash == "":
             return None
 
-        data = self.db[block_db_key]
+        try:
+            data = self.__read_block_record(hash_to_key(block_hash), snapshot)
+        except ValueError:
+            logging.warning("Invalid block hash {}.".format(block_hash))
+            return None
 
         if not data:
             return None
 
-        block = Block.deserialize(data)
-        self.__block_cache[block_hash] = block
+        block = self.__load_block(data, snapshot)
 
-        with self.__block_count_lock:
-            self.__block_used += 1
+        if not block:
+            return None
+
+        if snapshot is None:
+            self.__block_cache[block_hash] = block
 
         return block
 
+    @staticmethod
+    def __namespace(namespace, snapshot):
+        """
+        读取使用的命名空间， 传入快照时从快照中读取
+        """
+        if snapshot is None:
+            return namespace
+        return snapshot.namespace(namespace.prefix)
+
+    def __read_block_record(self, block_hash_key: bytes, snapshot=None):
+        """
+        读取区块记录， 区块存储在分段文件中时根据位置读取， 否则读取 leveldb 中的区块记录
+        """
+        location = self.__namespace(self.__locations, snapshot).get_raw(block_hash_key)
+        if location is not None:
+            try:
+                return json.loads(BlockFile().read(unpack_location(location)))
+            except (OSError, ValueError) as e:
+                # 旧的快照中可能保留了已经被裁剪的区块位置
+                logging.warning("Read block#{} from block file failed: {}".format(key_to_hash(block_hash_key), e))
+                return None
+        return self.__namespace(self.__blocks, snapshot)[block_hash_key]
+
+    def __load_block(self, data: dict, snapshot=None):
+        """ 根据数据库中的区块记录构建区块
+
+        Args:
+            data: 数据库中的区块记录
+            snapshot: 读取使用的快照
+        Returns:
+            构建得到的区块， 如果区块已经被裁剪或者交易缺失则返回空
+        """
+        return self.__load_blocks([data], snapshot)[0]
+
+    def __load_blocks(self, records: list, snapshot=None) -> list:
+        """ 根据数据库中的区块记录批量构建区块
+
+        对于只存储交易哈希的区块记录， 优先从交易缓存中获取交易，
+        所有区块剩余的交易通过一次批量读取从交易表中获取， 读取的交易不放入缓存，
+        交易的记录交给区块在访问时再反序列化
+
+        Args:
+            records: 数据库中的区块记录列表
+            snapshot: 读取使用的快照
+        Returns:
+            和 records 顺序一致的区块列表， 如果区块已经被裁剪或者交易缺失则对应的区块为空
+        """
+        txs = {}
+        missing = []
+        for data in records:
+            if not data or Block.is_pruned(data) or not Block.is_compact(data):
+                continue
+            for tx_hash in data["tx_hashes"]:
+                tx = self.__tx_cache.get(tx_hash)
+                if tx is None:
+                    missing.append(tx_hash)
+                else:
+                    txs[tx_hash] = tx
+
+        if missing:
+            txs_namespace = self.__namespace(self.__txs, snapshot)
+            for tx_hash, record in zip(missing, txs_namespace.multi_get([hash_to_key(h) for h in missing])):
+                if record is not None:
+                    txs[tx_hash] = record
+
+        blocks = []
+        for data in records:
+            if not data or Block.is_pruned(data):
+                blocks.append(None)
+            elif not Block.is_compact(data):
+                blocks.append(Block.deserialize(data))
+            elif all(tx_hash in txs for tx_hash in data["tx_hashes"]):
+                blocks.append(Block.deserialize(data, [txs[tx_hash] for tx_hash in data["tx_hashes"]]))
+            else:
+                logging.error("Transactions of block#{} are missing.".format(data["block_header"]["hash"]))
+                blocks.append(None)
+        return blocks
+
+    def __read_block_records(self, block_hash_keys: list, snapshot=None) -> list:
+        """
+        批量读取区块记录， 分段文件中的区块根据位置读取， 其他区块通过一次批量读取获取
+        """
+        locations = self.__namespace(self.__locations, snapshot).multi_get_raw(block_hash_keys)
+        records = [None] * len(block_hash_keys)
+        pending = []
+
+        for idx, location in enumerate(locations):
+            if location is None:
+                pending.append(idx)
+                continue
+            try:
+                records[idx] = json.loads(BlockFile().read(unpack_location(location)))
+            except (OSError, ValueError) as e:
+                logging.warning("Read block#{} from block file failed: {}".format(
+                    key_to_hash(block_hash_keys[idx]), e))
+
+        if pending:
+            blocks_namespace = self.__namespace(self.__blocks, snapshot)
+            for idx, data in zip(pending, blocks_namespace.multi_get([block_hash_keys[idx] for idx in pending])):
+                records[idx] = data
+        return records
+
+    def iter_blocks(self, start: int = 0, stop: int = None, step: int = 1, headers_only: bool = False,
+                    snapshot=None):
+        """ 按照高度顺序遍历主链上的区块
+
+        遍历的高度和 range(start, stop, step) 一致， stop 为空时遍历到最新区块， step 为负数时遍历到创世区块
+        每次预读 ITER_READ_AHEAD 个区块， 区块记录和交易分别通过一次批量读取获取，
+        读取的区块和交易不放入缓存， 不会挤掉最近使用的区块
+
+        Args:
+            start: 起始高度
+            stop: 结束高度（不包含）
+            step: 高度的步长， 可以为负数
+            headers_only: 只返回区块头， 不读取区块的交易
+            snapshot: 读取使用的快照， 由 Database.snapshot 获取
+        Yields:
+            区块或者区块头， 被裁剪的区块只保留了区块头， 对应的区块为 None
+        Raises:
+            ValueError: step 为 0
+        """
+        if step == 0:
+            raise ValueError("iter_blocks() step must not be zero")
+
+        count = self.__chain_length(snapshot)
+        if stop is None:
+            stop = count if step > 0 else -1
+        heights = range(start, min(stop, count) if step > 0 else max(stop, -1), step)
+
+        for idx in range(0, len(heights), ITER_READ_AHEAD):
+            window = [height for height in heights[idx: idx + ITER_READ_AHEAD] if 0 <= height < count]
+            if headers_only:
+                yield from self.__read_headers(window, snapshot)
+            else:
+                yield from self.__read_blocks(window, snapshot)
+
+    def __chain_length(self, snapshot=None) -> int:
+        """
+        主链上的区块数量， 即最新区块的高度 + 1
+        """
+        if snapshot is None:
+            return len(self.__header_index())
+
+        latest_block_hash_obj = snapshot.namespace(NS_META)[META_LATEST]
+        if not latest_block_hash_obj:
+            return 0
+        data = self.__read_block_record(hash_to_key(latest_block_hash_obj["hash"]), snapshot)
+        return data["block_header"]["height"] + 1 if data else 0
+
+    def __window_hashes(self, heights: list, snapshot=None) -> list:
+        if snapshot is None:
+            index = self.__header_index()
+            return [index.hash_at(height) for height in heights]
+
+        keys = snapshot.namespace(NS_HEIGHT).multi_get_raw([height_to_key(height) for height in heights])
+        return [key_to_hash(key) if key else None for key in keys]
+
+    def __read_headers(self, heights: list, snapshot=None) -> list:
+        headers = [None] * len(heights)
+        if snapshot is None:
+            index = self.__header_index()
+            headers = [index.header_at(height) for height in heights]
+
+        pending = [idx for idx, header in enumerate(headers) if header is None]
+        if pending:
+            hashes = self.__window_hashes([heights[idx] for idx in pending], snapshot)
+            records = self.__read_block_records([hash_to_key(h) for h in hashes if h], snapshot)
+            records = iter(records)
+            for idx, block_hash in zip(pending, hashes):
+                data = next(records) if block_hash else None
+                if data:
+                    headers[idx] = BlockHeader()
+                    headers[idx].deserialize(data["block_header"])
+        return headers
+
+    def __read_blocks(self, heights: list, snapshot=None) -> list:
+        hashes = self.__window_hashes(heights, snapshot)
+        blocks = [self.__block_cache.get(block_hash) if block_hash else None for block_hash in hashes]
+
+        pending = [idx for idx, block in enumerate(blocks) if block is None and hashes[idx]]
+        if pending:
+            records = self.__read_block_records([hash_to_key(hashes[idx]) for idx in pending], snapshot)
+            for idx, block in zip(pending, self.__load_blocks(records, snapshot)):
+                blocks[idx] = block
+        return blocks
+
     def is_transaction_in_cache(self, tx_hash: str):
         """
         检查交易是否在 cache 中，用于 RPC 检查最近交易是否被打包
@@ -252,83 +586,110 @@ class BlockChain(Singleton):
         """
         return tx_hash in self.__tx_cache
 
-    def get_transaction_by_tx_hash(self, tx_hash: str):
+    def get_transaction_by_tx_hash(self, tx_hash: str, snapshot=None):
         """ 根据交易的哈希值获取交易
         Args:
             tx_hash: 需要获取的交易的哈希值
+            snapshot: 读取使用的快照， 从快照中读取的交易不放入缓存
         Returns:
             和根据哈希值获取区块的逻辑类似
             首先查询缓存，在命中缓存的情况下直接返回
             如果检索失败直接返回空
         """
-        if tx_hash in self.__tx_cache:
+        tx = self.__tx_cache.get(tx_hash)
+        if tx is not None:
             logging.debug("Hit cache, return tx#{} directly.".format(tx_hash))
-
-            with self.__cache_count_lock:
-                self.__cache_hit += 1
-                self.__cache_used += 1
-
-            return self.__tx_cache[tx_hash]
+            return tx
 
         logging.debug("Search tx#{} in db".format(tx_hash))
-        db_tx_key = tx_hash_to_db_key(tx_hash)
-        data = self.db[db_tx_key]
-
-        with self.__cache_count_lock:
-            self.__cache_used += 1
+        try:
+            data = self.__namespace(self.__txs, snapshot)[hash_to_key(tx_hash)]
+        except ValueError:
+            return None
 
         try:
             tx = Transaction.deserialize(data)
-            self.__tx_cache[tx_hash] = tx
+            if snapshot is None:
+                self.__tx_cache[tx_hash] = tx
             return tx
         except Exception as e:
             return None
 
-    def roll_back(self) -> None:
+    def roll_back(self, batch=None) -> None:
         """ 将区块链回滚一个高度
 
         回滚需要将状态退回到上一个区块的状态
           - 将所有当前最新区块的交易删除
         对 UTxO 的操作由 UTxOSet 中的 Rollback 函数来实现
+        Args:
+            batch: 所属的写入单元，为空时单独提交
         Returns: None
         """
+        if batch is None:
+            with self.db.write_batch() as batch:
+                return self.roll_back(batch)
+
         # 获取最新区块、最新高度和最新区块的哈希
         latest_block, prev_hash = self.get_latest_block()
         latest_height = latest_block.block_header.height
         latest_hash = latest_block.block_header.hash
 
-        # 先修改索引， 再删除数据， 尽量避免拿到空数据
         block = self.get_block_by_height(latest_height - 1)
-        self.__block_map.pop(latest_height)
-        self.set_latest_hash(block.block_header.hash)
-        self.__latest = block
+        self.set_latest_hash(block.block_header.hash, batch)
+
+        tx_hashes = latest_block.tx_hashes()
+
+        for tx_hash in tx_hashes:
+            batch.delete(self.__txs, hash_to_key(tx_hash))
+
+        # 分段文件只追加， 回滚时只删除区块的位置， 文件中的数据保留
+        batch.delete(self.__blocks, hash_to_key(latest_hash))
+        batch.delete(self.__locations, hash_to_key(latest_hash))
+        batch.delete(self.__heights, height_to_key(latest_height))
+
+        def update_cache():
+            # 数据提交之后再修改内存中的索引， 避免拿到没有落盘的数据
+            self.__header_index().truncate(latest_height)
+            self.__latest = block
 
-        if latest_hash in self.__block_cache:
             self.__block_cache.pop(latest_hash)
 
-        if latest_height in self.__block_cache:
-            self.__block_cache.pop(latest_height)
+            for _tx_hash in tx_hashes:
+                self.__tx_cache.pop(_tx_hash)
 
-        delete_list = []
+            # 回滚之后输入引用的输出可能发生变化， 清空签名缓存
+            SignatureCache().clear()
 
-        for tx in latest_block.transactions:
-            tx_hash = tx.tx_hash
-            tx_db_key = tx_hash_to_db_key(tx_hash)
-            delete_list.append(tx_db_key)
+        batch.after_write(update_cache)
 
-            if tx_hash in self.__tx_cache:
-                self.__tx_cache.pop(tx_hash)
+    def disconnect_block(self, sync: bool = False) -> None:
+        """ 断开最新区块
 
-        latest_block_hash = latest_block.block_header.hash
-        latest_block_db_key = blockhash_to_db_key(latest_block_hash)
-        self.db.remove(latest_block_db_key)
-        self.db.batch_remove(delete_list)
+        区块链和 UTxO 集合的回滚在同一个写入单元中提交
+        Args:
+            sync: 是否在提交时同步刷盘
+        Returns: None
+        """
+        latest_block, _ = self.get_latest_block()
+        logging.info("Disconnect block#{}.".format(latest_block.block_header.hash))
+
+        try:
+            with self.db.write_batch(sync) as batch:
+                UTXOSet().roll_back(latest_block, self, batch)
+                self.roll_back(batch)
+        except Exception:
+            # 写入单元被丢弃， UTxO 集合在内存中已经回滚了该区块， 恢复到已经提交的区块
+            UTXOSet().reset(self)
+            raise
 
     def find_utxo(self):
         """ 查找未被使用的utxo
 
-        目前该函数的作用是返回所有未被使用的 UTxO
+        目前该函数的作用是返回所有未被使用的 UTxO， 用于数据库中没有 UTxO 集合时重建
         但是好像没有被使用到，后面可以考虑删除
+
+        Raises:
+            PrunedBlockError: 区块已经被裁剪， 不能得到完整的 UTxO 集合
         """
         spent_txos = {}
         unspent_txs = {}
@@ -342,8 +703,11 @@ class BlockChain(Singleton):
         if latest_height == -1:
             return unspent_txs
 
-        for height in range(latest_height, -1, -1):
-            block = self.get_block_by_height(height)
+        for height, block in zip(range(latest_height, -1, -1), self.iter_blocks(latest_height, -1, -1)):
+            if block is None:
+                logging.error("Block #{} has been pruned, can not rebuild the UTxO set from blocks.".format(height))
+                raise PrunedBlockError("Block #{} has been pruned.".format(height))
+
             for tx in block.transactions:
                 tx_hash = tx.tx_hash
 
@@ -364,19 +728,96 @@ class BlockChain(Singleton):
                         spent_txos[input_tx_hash] = tx_hash_outputs
         return unspent_txs
 
-    def verify_block(self, block: Block):
+    def resolve_outpoints(self, outpoints) -> dict:
+        """ 批量查询交易输入引用的输出
+
+        去重之后先从 UTxO 缓存和 UTxO 表中查询， 剩余的输出（例如已经被使用的输出）
+        优先从交易缓存中获取， 其他的交易通过一次按 key 排序的批量读取从交易表中获取，
+        只取出需要的输出， 不反序列化整个交易
+
+        Args:
+            outpoints: (交易哈希, 输出索引) 的可迭代对象
+        Returns:
+            (交易哈希, 输出索引) -> TxOutput， 不存在的输出不包含在结果中
+        """
+        outpoints = set(outpoints)
+        outputs = {outpoint: TxOutput.deserialize(utxo)
+                   for outpoint, utxo in UTXOSet().get_outputs(outpoints).items()}
+
+        missing = {}
+        for tx_hash, index in outpoints - outputs.keys():
+            tx = self.__tx_cache.get(tx_hash)
+            if tx is None:
+                missing.setdefault(tx_hash, []).append(index)
+            elif isinstance(index, int) and 0 <= index < len(tx.outputs):
+                outputs[(tx_hash, index)] = tx.outputs[index]
+
+        tx_keys = {}
+        for tx_hash in missing:
+            try:
+                tx_keys[hash_to_key(tx_hash)] = tx_hash
+            except (TypeError, ValueError):
+                continue
+
+        if tx_keys:
+            keys = sorted(tx_keys)
+            for key, record in zip(keys, self.__txs.multi_get(keys)):
+                if record is None:
+                    continue
+                tx_hash = tx_keys[key]
+                tx_outputs = record.get("outputs", [])
+                for index in missing[tx_hash]:
+                    if isinstance(index, int) and 0 <= index < len(tx_outputs):
+                        outputs[(tx_hash, index)] = TxOutput.deserialize(tx_outputs[index])
+        return outputs
+
+    @staticmethod
+    def __prev_pub_key_hashes(transaction: Transaction, outputs: dict):
+        """
+        交易每个输入引用的输出的 pub_key_hash， 有输出不存在时返回 None
+        """
+        prev_pub_key_hashes = []
+        for _input in transaction.inputs:
+            output = outputs.get((_input.tx_hash, _input.index))
+            if output is None:
+                logging.error("Previous output {}#{} not found.".format(_input.tx_hash, _input.index))
+                return None
+            prev_pub_key_hashes.append(output.pub_key_hash)
+        return prev_pub_key_hashes
+
+    def verify_block(self, block: Block, parallel: bool = False):
         """ 校验区块
 
-        传入区块校验区块中的签名是否正确
-        依次对交易的签名进行校验
+        传入区块校验区块中的签名是否正确， coinbase 交易不需要校验
+        区块中所有输入引用的输出通过 resolve_outpoints 一次查询， 引用区块内交易的输出直接从区块中获取，
+        parallel 为 True 并且交易数量足够多时在进程池中并行校验， 否则依次对交易的签名进行校验
         Args:
             block: 待校验区块
+            parallel: 是否使用进程池并行校验
         Returns:
             所有交易校验成功则返回 True
         """
         start_time = time.time()
-        for tx in block.transactions:
-            if not self.verify_transaction(tx):
+        executor = VerifyExecutor()
+
+        txs = [tx for tx in block.transactions if not tx.is_coinbase()]
+        outpoints = {(_input.tx_hash, _input.index) for tx in txs for _input in tx.inputs}
+
+        # 引用区块中其他交易的输出不需要查询数据库
+        created = {(tx.tx_hash, idx): output for tx in block.transactions for idx, output in enumerate(tx.outputs)}
+        outputs = self.resolve_outpoints(outpoints - created.keys())
+        outputs.update((outpoint, created[outpoint]) for outpoint in outpoints & created.keys())
+
+        if parallel and executor.should_parallel(len(txs)):
+            result = self.__verify_block_parallel(txs, outputs, executor)
+            end_time = time.time()
+            logging.debug("Verify block with {} workers use {} s.".format(executor.workers, end_time - start_time))
+            return result
+
+        cache = SignatureCache()
+        for tx in txs:
+            prev_pub_key_hashes = self.__prev_pub_key_hashes(tx, outputs)
+            if prev_pub_key_hashes is None or not verify_signatures(tx, prev_pub_key_hashes, cache):
                 end_time = time.time()
                 logging.debug("Verify block use {} s.".format(end_time - start_time))
                 return False
@@ -384,10 +825,38 @@ class BlockChain(Singleton):
         logging.debug("Verify block use {} s.".format(end_time - start_time))
         return True
 
+    def __verify_block_parallel(self, txs: list, outputs: dict, executor: VerifyExecutor) -> bool:
+        """
+        交易和每个输入引用的输出一起打包交给进程池校验签名， 签名缓存中已有的交易跳过
+        """
+        cache = SignatureCache()
+        jobs = []
+        # 进程池中校验通过之后加入签名缓存的 key
+        pending_keys = []
+        for tx in txs:
+            prev_pub_key_hashes = self.__prev_pub_key_hashes(tx, outputs)
+            if prev_pub_key_hashes is None:
+                return False
+
+            # 进入交易池时已经校验过的交易不再交给进程池
+            keys = signature_keys(tx, prev_pub_key_hashes)
+            if all(cache.contains(key) for key in keys):
+                continue
+
+            jobs.append((tx.serialize(), prev_pub_key_hashes))
+            pending_keys.extend(keys)
+
+        if not executor.verify(jobs):
+            return False
+
+        for key in pending_keys:
+            cache.add(key)
+        return True
+
     def verify_transaction(self, transaction: Transaction):
         """ 校验交易
 
-        在链上拉取到当前交易输入下的交易调用verify方法进行校验
+        通过 resolve_outpoints 批量查询交易输入引用的输出， 然后校验签名
 
         Args:
             transaction: 待校验的交易
@@ -396,20 +865,14 @@ class BlockChain(Singleton):
         """
         st = time.time()
 
-        prev_txs = {}
-        for _input in transaction.inputs:
-            tx_hash = _input.tx_hash
-            prev_tx = self.get_transaction_by_tx_hash(tx_hash)
-
-            if not prev_tx:
-                ed = time.time()
-                logging.debug("Verify transaction use {} s.".format(ed - st))
-                return False
-            prev_txs[prev_tx.tx_hash] = prev_tx
+        outputs = self.resolve_outpoints((_input.tx_hash, _input.index) for _input in transaction.inputs)
+        prev_pub_key_hashes = self.__prev_pub_key_hashes(transaction, outputs)
 
         ed = time.time()
         logging.debug("Verify transaction use {} s.".format(ed - st))
-        return transaction.verify(prev_txs)
+        if prev_pub_key_hashes is None:
+            return False
+        return verify_signatures(transaction, prev_pub_key_hashes, SignatureCache())
 
     def get_latest_delay_params(self) -> dict:
         """ 获取 VDF 的最新计算参数
@@ -422,53 +885,223 @@ class BlockChain(Singleton):
         coinbase_tx_input = latest_block.transactions[0].inputs[0]
         return coinbase_tx_input.delay_params
 
-    def insert_block(self, block: Block) -> None:
+    def insert_block(self, block: Block, sync: bool = False) -> None:
         """ 更新区块
 
         由 MergeThread 调用，将区块插入到数据库中，影响全局状态
-        Attentions:
-            注意先更新区块，再更新索引
+        区块、交易、高度索引、最新区块指针以及 UTxO 的修改在同一个写入单元中提交，
+        提交成功之后再更新内存中的缓存
         Args:
             block: 待插入的区块
+            sync: 是否在提交时同步刷盘
         Returns: None
         """
         block_hash = block.block_header.hash
-        block_db_key = blockhash_to_db_key(block_hash)
-        block_height_db_key = height_to_db_key(block.height)
+        block_hash_key = hash_to_key(block_hash)
         height = block.block_header.height
         logging.info("Insert new block#{} height {}".format(block_hash, block.block_header.height))
 
-        self.set_latest_hash(block_hash)
+        try:
+            with self.db.write_batch(sync) as batch:
+                UTXOSet().update(block, batch)
+                if self.__block_files:
+                    self.__append_block_file(block, batch)
+                elif self.__compact_blocks:
+                    batch.put(self.__blocks, block_hash_key, block.serialize_compact())
+                else:
+                    batch.put(self.__blocks, block_hash_key, block.serialize())
+                batch.put_raw(self.__heights, height_to_key(height), block_hash_key)
+
+                for tx in block.transactions:
+                    batch.put(self.__txs, hash_to_key(tx.tx_hash), tx.serialize())
+
+                self.set_latest_hash(block_hash, batch)
+
+                if self.__prune:
+                    self.__prune_blocks(height, batch)
+        except Exception:
+            # 写入单元被丢弃， UTxO 集合在内存中已经连接了该区块， 恢复到已经提交的区块
+            UTXOSet().reset(self)
+            raise
+
         self.__latest = block
-        self.__block_map[height] = block_hash
-        self.__block_cache[block_hash] = block
-        UTXOSet().update(block)
-        insert_list = {block_db_key: block.serialize(), block_height_db_key: block_hash}
 
+        # 交易的大小只估计一次， 区块的大小使用交易大小的总和
+        block_size = estimate_size(block.block_header)
         for tx in block.transactions:
-            tx_hash = tx.tx_hash
-            db_tx_key = tx_hash_to_db_key(tx_hash)
-            tx_dict = tx.serialize()
-            self.__tx_cache[tx_hash] = tx
-            insert_list[db_tx_key] = tx_dict
+            tx_size = estimate_size(tx)
+            self.__tx_cache.put(tx.tx_hash, tx, tx_size)
+            block_size += tx_size
+        self.__block_cache.put(block_hash, block, block_size)
+
+        try:
+            self.__header_index().put(block.block_header)
+        except ValueError as e:
+            # 索引和数据库不一致， 下一次使用时重新检查
+            logging.warning("Update header index failed: {}".format(e))
+            self.__headers_ready = False
+
+    def __append_block_file(self, block: Block, batch) -> None:
+        """
+        将区块追加到分段文件中， 区块的位置和文件的写入位置在同一个写入单元中提交
+        """
+        block_file = BlockFile()
+        if not block_file.opened:
+            position = self.__meta.get_raw(META_BLOCK_FILE)
+            block_file.open(unpack_position(position) if position else None)
+
+        location = block_file.append(json.dumps(block.serialize()).encode())
+        batch.put_raw(self.__locations, hash_to_key(block.block_header.hash), pack_location(*location))
+        batch.put_raw(self.__meta, META_BLOCK_FILE, pack_position(*block_file.position))
+
+    def get_prune_height(self) -> int:
+        """
+        获取裁剪的高度， 低于该高度的区块（创世区块除外）只保留区块头
+        """
+        if self.__prune_height is None:
+            data = self.__meta.get_raw(META_PRUNE_HEIGHT)
+            self.__prune_height = key_to_height(data) if data else 1
+        return self.__prune_height
+
+    def is_pruned(self, height: int) -> bool:
+        """
+        检查对应高度的区块内容是否已经被裁剪， 创世区块不会被裁剪
+        """
+        return 0 < height < self.get_prune_height()
+
+    def get_block_header_by_height(self, height: int, snapshot=None):
+        """ 获取指定高度的区块头， 区块被裁剪之后区块头仍然保留
+
+        Args:
+            height: 区块的高度
+            snapshot: 读取使用的快照
+        Returns:
+            区块头， 区块不存在时返回空
+        """
+        if snapshot is None:
+            block_header = self.__header_index().header_at(height)
+            if block_header is not None:
+                return block_header
 
-        self.db.batch_insert(insert_list)
+        block_hash = self.__get_block_hash(height, snapshot)
+        if not block_hash:
+            return None
+
+        block = self.__block_cache.get(block_hash)
+        if block is not None:
+            return block.block_header
+
+        data = self.__read_block_record(hash_to_key(block_hash), snapshot)
+        if not data:
+            return None
+
+        block_header = BlockHeader()
+        block_header.deserialize(data["block_header"])
+        return block_header
+
+    def __prune_blocks(self, height: int, batch) -> None:
+        """ 裁剪高度低于 height - keep_last_n_blocks + 1 并且 UTxO 集合已经写入数据库的区块
+
+        删除区块的交易记录， 区块记录替换为只包含区块头的记录， 区块的高度索引保留
+        裁剪的高度和区块的修改在同一个写入单元中提交
+
+        Args:
+            height: 新连接的区块的高度
+            batch: 所属的写入单元
+        """
+        prune_height = self.get_prune_height()
+        # UTxO 集合写入数据库之后的区块在重启时需要重新连接， 不能裁剪
+        target = min(height - self.__keep_blocks + 1, prune_height + PRUNE_BATCH_SIZE,
+                     UTXOSet().get_flushed_height() + 1)
+        if target <= prune_height:
+            return
+
+        pruned_hashes = []
+        pruned_txs = []
+        file_no = None
+
+        for prune in range(prune_height, target):
+            block_hash = self.__get_block_hash(prune)
+            if not block_hash:
+                continue
+
+            block_hash_key = hash_to_key(block_hash)
+            location = self.__locations.get_raw(block_hash_key)
+            if location is not None:
+                file_no = unpack_location(location)[0]
+
+            data = self.__read_block_record(block_hash_key)
+            if not data or Block.is_pruned(data):
+                continue
+
+            if Block.is_compact(data):
+                tx_hashes = data["tx_hashes"]
+            else:
+                tx_hashes = [tx["tx_hash"] for tx in data["transactions"]]
+
+            for tx_hash in tx_hashes:
+                batch.delete(self.__txs, hash_to_key(tx_hash))
+
+            batch.put(self.__blocks, block_hash_key, {
+                "magic_no": data["magic_no"],
+                "block_header": data["block_header"]
+            })
+            batch.delete(self.__locations, block_hash_key)
+            # 裁剪之后区块不能再回滚， 回滚记录一起删除
+            batch.delete(self.__undo, block_hash_key)
+            pruned_hashes.append(block_hash)
+            pruned_txs.extend(tx_hashes)
+
+        batch.put_raw(self.__meta, META_PRUNE_HEIGHT, height_to_key(target))
+        remove = file_no is not None and file_no != self.__pruned_file_no
+        compact = self.__pruned_count + len(pruned_hashes) >= self.__prune_compact_interval
+
+        def update_cache():
+            self.__prune_height = target
+            for block_hash in pruned_hashes:
+                self.__block_cache.pop(block_hash, None)
+            for tx_hash in pruned_txs:
+                self.__tx_cache.pop(tx_hash, None)
+            self.__pruned_count = 0 if compact else self.__pruned_count + len(pruned_hashes)
+            if remove:
+                self.__pruned_file_no = file_no
+
+        def remove_files():
+            # 区块位置的删除写入存储引擎之后才能删除文件和压缩， 否则崩溃之后数据库中的位置指向已经删除的文件
+            if remove:
+                # 创世区块不会被裁剪， 保留创世区块所在的文件
+                genesis_location = self.__locations.get_raw(hash_to_key(self.__get_block_hash(0)))
+                keep = {unpack_location(genesis_location)[0]} if genesis_location else set()
+                BlockFile().remove_before(file_no, keep)
+            if compact:
+                threading.Thread(target=self.__compact, args=(), name="Compact Thread", daemon=True).start()
+
+        batch.after_write(update_cache)
+        # 等待写入线程提交， 只在需要删除文件或者压缩时注册
+        if remove or compact:
+            batch.after_commit(remove_files)
+        logging.debug("Prune blocks from height {} to {}.".format(prune_height, target - 1))
+
+    def __compact(self):
+        """
+        压缩被裁剪的交易和区块所在的命名空间
+        """
+        for prefix in (NS_TX, NS_BLOCK, NS_BLOCK_FILE, NS_UNDO):
+            self.db.compact(prefix)
+        logging.info("Compact pruned blocks finished.")
 
     def get_cache_status(self):
         """ 获取缓存命中情况
 
         由 RPC 调用，后续视情况删除
         """
-        with self.__cache_count_lock:
-            try:
-                tx_cache_rate = round(self.__cache_hit / self.__cache_used, 3)
-            except ZeroDivisionError:
-                tx_cache_rate = 0
-
-        with self.__block_count_lock:
-            try:
-                block_cache_rate = round(self.__block_hit / self.__block_used, 3)
-            except ZeroDivisionError:
-                block_cache_rate = 0
+        return self.__tx_cache.hit_rate(), self.__block_cache.hit_rate()
 
-        return tx_cache_rate, block_cache_rate
+    def get_cache_stats(self) -> dict:
+        """
+        获取区块、交易、UTxO 以及签名缓存的统计信息， 见 SizedLRU.stats
+        """
+        stats = {cache.name: cache.stats() for cache in (self.__block_cache, self.__tx_cache)}
+        stats.update(UTXOSet().get_cache_stats())
+        stats["signature"] = SignatureCache().stats()
+        return stats
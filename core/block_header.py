@@ -5,6 +5,10 @@ from utils import funcs
 
 
 class BlockHeader(object):
+    # 序列化的字段和顺序
+    FIELDS = ("timestamp", "prev_block_hash", "hash", "hash_merkle_root", "height", "nonce")
+    __slots__ = FIELDS
+
     def __init__(self, hash_merkle_root='', height=0, prev_block_hash=''):
         # fixed: 转换为整数毫秒级时间戳
         self.timestamp = str(int(time.time() * 1000))
@@ -19,13 +23,19 @@ class BlockHeader(object):
 
         if prev_block_hash:
             self.prev_block_hash = prev_block_hash
+        self.hash = self.compute_hash()
+
+    def compute_hash(self) -> str:
+        """
+        根据区块头的字段计算哈希， 不修改 hash 字段， 用于校验收到的区块
+        """
         data_list = [str(self.timestamp),
                      str(self.prev_block_hash),
                      str(self.hash_merkle_root),
                      str(self.height),
                      str(self.nonce)]
         data = ''.join(data_list)
-        self.hash = funcs.sum256_hex(data)
+        return funcs.sum256_hex(data)
 
     @classmethod
     def new_genesis_block_header(cls):
@@ -46,7 +56,9 @@ class BlockHeader(object):
                                           )
 
     def serialize(self):
-        return self.__dict__
+        return {field: getattr(self, field) for field in self.FIELDS}
 
     def deserialize(self, data: dict):
-        self.__dict__.update(data)
+        for field in self.FIELDS:
+            if field in data:
+                setattr(self, field, data[field])
@@ -0,0 +1,200 @@
+import sys
+import threading
+
+"""
+UTxO 集合的写回缓存
+
+连接和回滚区块时对 UTxO 的修改先保存在内存中， 达到内存阈值或者区块数量之后在一个写入单元中写入数据库：
+  - FRESH： 数据库中不存在的输出， 在写入之前被使用时直接从缓存中删除， 不会写入数据库
+  - DIRTY： 和数据库中的记录不一致， 写入时更新数据库
+  - SPENT： 已经被使用， 写入时从数据库中删除， 记录保留用于删除地址索引
+只保存被修改过的条目， 未修改的 UTxO 仍然由 UTXOSet 中的读缓存保存
+
+被修改过的地址的余额（金额和 UTxO 数量）同样保存在缓存中， 保存的是完整的余额而不是变化量，
+读取时缓存中存在的地址直接使用缓存， 不需要和数据库中的记录相加， 写入期间的读取不会重复计算
+"""
+
+FRESH = 0x01
+DIRTY = 0x02
+SPENT = 0x04
+
+
+def utxo_size(utxo: dict) -> int:
+    """
+    估计 UTxO 记录占用的内存， 记录只包含字符串和整数， 直接计算 dict 和各个值的大小， 比 estimate_size 快一个数量级
+    字段名是所有记录共用的字符串， 不计算在内
+    """
+    return sys.getsizeof(utxo) + sum(sys.getsizeof(value) for value in utxo.values())
+
+
+class CoinsViewCache(object):
+    """
+    在数据库的 UTxO 集合之上的一层修改， 由 UTXOSet 持有， 合并线程写入， RPC 等线程读取
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # UTxO 的 key -> [UTxO 记录, 标记, 估计的字节数]
+        self.__entries = {}
+        # 地址 -> 该地址被修改过的 UTxO 的 key 集合， 用于按地址遍历时合并缓存中的修改
+        self.__addresses = {}
+        # 地址 -> [金额, UTxO 数量]， 修改 UTxO 之前需要通过 set_balances 加载地址的余额
+        self.__balances = {}
+        self.__bytes = 0
+        # 两次写入之间连接或者回滚的区块数量
+        self.blocks = 0
+
+    @property
+    def bytes(self) -> int:
+        return self.__bytes
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def lookup(self, utxo_key: bytes) -> (bool, dict):
+        """
+        查询缓存中的修改， 返回 (是否存在修改, UTxO 记录)， 已经被使用的 UTxO 返回的记录为 None
+        """
+        with self.__lock:
+            entry = self.__entries.get(utxo_key)
+        if entry is None:
+            return False, None
+        utxo, flags, _ = entry
+        return True, None if flags & SPENT else utxo
+
+    def add(self, utxo_key: bytes, utxo: dict, stored: bool = False) -> None:
+        """ 添加新的 UTxO
+
+        缓存中不存在的 UTxO 在数据库中也不存在（新产生的输出， 或者回滚时恢复的已经写入删除的输出）， 标记为 FRESH；
+        缓存中已经被使用的 UTxO 以及覆盖数据库中未使用输出的 UTxO 在数据库中可能还存在， 只标记为 DIRTY
+
+        Args:
+            utxo_key: UTxO 的 key
+            utxo: 包含 pub_key_hash、value、index 和 tx_hash 的 UTxO 记录
+            stored: 数据库中是否存在同一个 key 的未使用输出（交易哈希相同的 coinbase 交易）
+        """
+        with self.__lock:
+            entry = self.__entries.get(utxo_key)
+            if entry is None:
+                flags = DIRTY if stored else FRESH | DIRTY
+                replaced = stored
+            else:
+                flags = entry[1] & FRESH | DIRTY
+                replaced = not entry[1] & SPENT
+            self.__set(utxo_key, utxo, flags)
+            # 覆盖的未使用输出和新的输出来自内容相同的交易， 余额不变
+            if not replaced:
+                self.__update_balance(utxo, 1)
+
+    def spend(self, utxo_key: bytes, utxo: dict) -> None:
+        """ 使用 UTxO
+
+        FRESH 的 UTxO 直接从缓存中删除， 其他的 UTxO 标记为 SPENT， 写入时从数据库中删除
+
+        Args:
+            utxo_key: UTxO 的 key
+            utxo: 被使用的 UTxO 记录， 写入时通过其中的地址删除地址索引
+        """
+        with self.__lock:
+            entry = self.__entries.get(utxo_key)
+            if entry is not None and entry[1] & FRESH:
+                self.__remove(utxo_key)
+            else:
+                self.__set(utxo_key, utxo, DIRTY | SPENT)
+            self.__update_balance(utxo, -1)
+
+    def address_entries(self, address: str) -> dict:
+        """
+        地址被修改过的 UTxO， 返回 UTxO 的 key -> UTxO 记录， 已经被使用的 UTxO 对应 None
+        """
+        with self.__lock:
+            result = {}
+            for utxo_key in self.__addresses.get(address, ()):
+                utxo, flags, _ = self.__entries[utxo_key]
+                result[utxo_key] = None if flags & SPENT else utxo
+            return result
+
+    def missing_balances(self, addresses) -> list:
+        """
+        缓存中还没有余额的地址
+        """
+        with self.__lock:
+            return [address for address in addresses if address not in self.__balances]
+
+    def set_balances(self, balances: dict) -> None:
+        """
+        加载地址在数据库中的余额， 地址 -> (金额, UTxO 数量)， 缓存中已经存在的地址保持不变
+        """
+        with self.__lock:
+            for address, (value, count) in balances.items():
+                self.__balances.setdefault(address, [value, count])
+
+    def balance(self, address: str):
+        """
+        缓存中地址的余额 (金额, UTxO 数量)， 不存在时返回 None
+        """
+        with self.__lock:
+            balance = self.__balances.get(address)
+            return None if balance is None else tuple(balance)
+
+    def balances(self) -> dict:
+        """
+        所有被修改过的地址的余额， 地址 -> (金额, UTxO 数量)
+        """
+        with self.__lock:
+            return {address: tuple(balance) for address, balance in self.__balances.items()}
+
+    def changes(self) -> list:
+        """
+        所有的修改， 返回 (UTxO 的 key, UTxO 记录, 是否已经被使用) 的列表
+        """
+        with self.__lock:
+            return [(utxo_key, utxo, bool(flags & SPENT)) for utxo_key, (utxo, flags, _) in self.__entries.items()]
+
+    def clear(self) -> None:
+        """
+        修改写入数据库之后清空缓存
+        """
+        with self.__lock:
+            self.__entries = {}
+            self.__addresses = {}
+            self.__balances = {}
+            self.__bytes = 0
+            self.blocks = 0
+
+    def stats(self) -> dict:
+        """
+        缓存的统计信息： 条目数量、其中已经被使用的数量、地址余额的数量、字节数以及还没有写入的区块数量
+        """
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "spent": sum(1 for _, flags, _ in self.__entries.values() if flags & SPENT),
+                "balances": len(self.__balances),
+                "bytes": self.__bytes,
+                "blocks": self.blocks,
+            }
+
+    def __set(self, utxo_key: bytes, utxo: dict, flags: int) -> None:
+        if utxo_key in self.__entries:
+            self.__remove(utxo_key)
+
+        size = sys.getsizeof(utxo_key) + utxo_size(utxo)
+        self.__entries[utxo_key] = [utxo, flags, size]
+        self.__addresses.setdefault(utxo["pub_key_hash"], set()).add(utxo_key)
+        self.__bytes += size
+
+    def __remove(self, utxo_key: bytes) -> None:
+        utxo, _, size = self.__entries.pop(utxo_key)
+        self.__bytes -= size
+
+        address = utxo["pub_key_hash"]
+        utxo_keys = self.__addresses[address]
+        utxo_keys.discard(utxo_key)
+        if not utxo_keys:
+            del self.__addresses[address]
+
+    def __update_balance(self, utxo: dict, sign: int) -> None:
+        balance = self.__balances.setdefault(utxo["pub_key_hash"], [0, 0])
+        balance[0] += sign * utxo["value"]
+        balance[1] += sign
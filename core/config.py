@@ -63,6 +63,15 @@ class Config(Singleton):
         except NoOptionError:
             return default
 
+    def get_path(self, key: str, default: str) -> str:
+        """
+        获取数据文件的路径， 相对路径位于 storage.data_dir 目录中
+        :param key: 键值，格式为[section].[key]
+        :param default: 配置文件中没有该键值时使用的路径
+        :return: 数据文件的路径
+        """
+        return os.path.join(self.get("storage.data_dir", "."), self.get(key, default))
+
     def set(self, key: str, value: str):
         map_key = key.split('.')
         if len(map_key) < 2:
@@ -0,0 +1,268 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from core.block_header import BlockHeader
+
+"""
+区块头索引
+
+主链上每个高度的区块头按照高度保存在一个定长记录的文件中， 通过 mmap 读取：
+  - header_at(height) 和 hash_at(height) 直接根据高度计算偏移
+  - height_of(hash) 通过内存中 哈希前 8 字节 -> 高度 的字典查找， 打开时扫描文件建立
+
+文件的格式:
+    [文件头 RECORD_SIZE 字节: magic 4 字节、版本 1 字节、区块数量 8 字节大端]
+    [高度 0 的记录][高度 1 的记录]...
+每条记录的格式:
+    [标志 1 字节][区块哈希 32 字节][前一个区块哈希 32 字节][merkle 根 32 字节][时间戳 8 字节][nonce 8 字节]
+
+索引由 BlockChain 在区块连接、回滚之后更新， 不和数据库在同一个写入单元中提交，
+打开时和数据库中的最新区块进行比较， 不一致时从区块表中重建
+"""
+
+HEADER_MAGIC = b"chdr"
+HEADER_VERSION = 1
+RECORD_SIZE = 128
+
+# 存在前一个区块的哈希， 创世区块没有
+FLAG_PREV = 0x01
+# 存在 merkle 根
+FLAG_MERKLE = 0x02
+# nonce 不为空
+FLAG_NONCE = 0x04
+# 区块头的所有字段都可以从记录中还原， 否则只能通过记录查询哈希和高度
+FLAG_HEADER = 0x08
+
+_FILE_HEADER = struct.Struct(">4sBQ")
+_RECORD = struct.Struct(">B32s32s32sQq")
+# 文件每次扩展的记录数量
+_GROW_RECORDS = 4096
+
+
+def _hash_bytes(hex_hash):
+    """
+    16进制的哈希值转换为 32 字节， 格式不正确时返回 None
+    """
+    try:
+        data = bytes.fromhex(hex_hash)
+    except (TypeError, ValueError):
+        return None
+    return data if len(data) == 32 else None
+
+
+def pack_record(header: BlockHeader) -> bytes:
+    """ 区块头转换为定长记录
+
+    Raises:
+        ValueError: 区块哈希的格式不正确
+    """
+    block_hash = _hash_bytes(header.hash)
+    if block_hash is None:
+        raise ValueError("Invalid block hash {}".format(header.hash))
+
+    flags = FLAG_HEADER
+    prev_hash = merkle_root = bytes(32)
+    timestamp = nonce = 0
+
+    if header.prev_block_hash:
+        prev_hash = _hash_bytes(header.prev_block_hash)
+        flags |= FLAG_PREV
+
+    if header.hash_merkle_root:
+        merkle_root = _hash_bytes(header.hash_merkle_root)
+        flags |= FLAG_MERKLE
+
+    if header.nonce is not None:
+        nonce = header.nonce
+        flags |= FLAG_NONCE
+
+    # 时间戳是整数毫秒的字符串， 其他格式无法从整数还原
+    if isinstance(header.timestamp, str) and header.timestamp.isdigit() and \
+            str(int(header.timestamp)) == header.timestamp and int(header.timestamp) < 2 ** 64:
+        timestamp = int(header.timestamp)
+    else:
+        flags &= ~FLAG_HEADER
+
+    if prev_hash is None or merkle_root is None or not isinstance(nonce, int) or not -2 ** 63 <= nonce < 2 ** 63:
+        flags &= ~FLAG_HEADER
+        prev_hash = prev_hash or bytes(32)
+        merkle_root = merkle_root or bytes(32)
+        nonce = 0
+
+    return _RECORD.pack(flags, block_hash, prev_hash, merkle_root, timestamp, nonce).ljust(RECORD_SIZE, b"\x00")
+
+
+def unpack_record(data, height: int):
+    """
+    定长记录转换为区块头， 记录中的字段不完整时返回 None
+    """
+    flags, block_hash, prev_hash, merkle_root, timestamp, nonce = _RECORD.unpack_from(data)
+    if not flags & FLAG_HEADER:
+        return None
+
+    block_header = BlockHeader()
+    block_header.deserialize({
+        "timestamp": str(timestamp),
+        "prev_block_hash": prev_hash.hex() if flags & FLAG_PREV else "",
+        "hash": block_hash.hex(),
+        "hash_merkle_root": merkle_root.hex() if flags & FLAG_MERKLE else "",
+        "height": height,
+        "nonce": nonce if flags & FLAG_NONCE else None
+    })
+    return block_header
+
+
+class HeaderIndex(object):
+    def __init__(self, path: str):
+        self.__path = path
+        self.__lock = threading.Lock()
+        self.__file = None
+        self.__map = None
+        self.__count = 0
+        # 区块哈希的前 8 字节 -> 高度
+        self.__heights = {}
+
+    @property
+    def opened(self) -> bool:
+        return self.__map is not None
+
+    def __len__(self):
+        return self.__count
+
+    def open(self) -> None:
+        """
+        打开索引文件并建立哈希到高度的映射， 文件不存在或者格式不正确时创建空的索引
+        """
+        with self.__lock:
+            if self.__map is not None:
+                return
+
+            directory = os.path.dirname(self.__path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            file = open(self.__path, "r+b" if os.path.exists(self.__path) else "w+b")
+            if os.fstat(file.fileno()).st_size < RECORD_SIZE:
+                file.truncate(RECORD_SIZE * (_GROW_RECORDS + 1))
+
+            self.__file = file
+            self.__map = mmap.mmap(file.fileno(), 0)
+
+            magic, version, count = _FILE_HEADER.unpack_from(self.__map, 0)
+            if magic != HEADER_MAGIC or version != HEADER_VERSION or (count + 1) * RECORD_SIZE > len(self.__map):
+                if magic != b"\x00" * 4:
+                    logging.warning("Invalid header index file {}, reset.".format(self.__path))
+                count = 0
+                self.__set_count(0)
+
+            self.__count = count
+            self.__heights = {}
+            for height in range(count):
+                self.__heights[self.__hash_prefix(height)] = height
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__map is not None:
+                self.__map.flush()
+                self.__map.close()
+                self.__map = None
+            if self.__file is not None:
+                self.__file.close()
+                self.__file = None
+            self.__count = 0
+            self.__heights = {}
+
+    def hash_at(self, height: int):
+        """
+        获取高度对应的区块哈希， 不存在时返回 None
+        """
+        with self.__lock:
+            if not 0 <= height < self.__count:
+                return None
+            offset = self.__offset(height) + 1
+            return self.__map[offset: offset + 32].hex()
+
+    def header_at(self, height: int):
+        """
+        获取高度对应的区块头， 不存在或者记录中的字段不完整时返回 None
+        """
+        with self.__lock:
+            if not 0 <= height < self.__count:
+                return None
+            offset = self.__offset(height)
+            data = self.__map[offset: offset + RECORD_SIZE]
+        return unpack_record(data, height)
+
+    def height_of(self, block_hash: str):
+        """
+        获取主链上区块哈希对应的高度， 不存在时返回 None
+        """
+        key = _hash_bytes(block_hash)
+        if key is None:
+            return None
+
+        with self.__lock:
+            height = self.__heights.get(key[:8])
+            if height is None or height >= self.__count:
+                return None
+            offset = self.__offset(height) + 1
+            if self.__map[offset: offset + 32] != key:
+                return None
+            return height
+
+    def put(self, header: BlockHeader) -> None:
+        """ 写入主链上新连接的区块头， 高度不低于当前数量时追加， 否则覆盖该高度及之后的记录
+
+        Raises:
+            ValueError: 区块的高度大于当前的区块数量或者哈希的格式不正确
+        """
+        height = header.height
+        record = pack_record(header)
+
+        with self.__lock:
+            if height > self.__count:
+                raise ValueError("Header index has {} blocks, can not put block at height {}".format(
+                    self.__count, height))
+
+            if height < self.__count:
+                self.__truncate(height)
+
+            if len(self.__map) < self.__offset(height + 1):
+                self.__map.resize(len(self.__map) + RECORD_SIZE * _GROW_RECORDS)
+
+            offset = self.__offset(height)
+            self.__map[offset: offset + RECORD_SIZE] = record
+            self.__heights[record[1: 9]] = height
+            self.__set_count(height + 1)
+
+    def truncate(self, count: int) -> None:
+        """
+        删除高度不低于 count 的记录， 用于回滚
+        """
+        with self.__lock:
+            self.__truncate(count)
+
+    def __truncate(self, count: int) -> None:
+        for height in range(count, self.__count):
+            key = self.__hash_prefix(height)
+            if self.__heights.get(key) == height:
+                del self.__heights[key]
+
+        if count < self.__count:
+            self.__set_count(count)
+
+    def __set_count(self, count: int) -> None:
+        _FILE_HEADER.pack_into(self.__map, 0, HEADER_MAGIC, HEADER_VERSION, count)
+        self.__count = count
+
+    def __hash_prefix(self, height: int) -> bytes:
+        offset = self.__offset(height) + 1
+        return self.__map[offset: offset + 8]
+
+    @staticmethod
+    def __offset(height: int) -> int:
+        # 第一个记录的位置保存文件头
+        return (height + 1) * RECORD_SIZE
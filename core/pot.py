@@ -5,12 +5,12 @@ from core.block_chain import BlockChain
 from core.config import Config
 from utils import funcs
 from utils.b58code import Base58Code
-from utils.leveldb import LevelDB
+from utils.database import Database
 
 
 class ProofOfTime(object):
     def __init__(self):
-        self.db = LevelDB()
+        self.db = Database()
 
     def local_vote(self):
         local_address = Config().get('node.address')
@@ -0,0 +1,166 @@
+import binascii
+import hashlib
+from functools import lru_cache
+
+import ecdsa
+
+from core.config import Config
+from utils.cache import SizedLRU, estimate_size
+from utils.singleton import Singleton
+
+"""
+交易的签名哈希
+
+签名的消息是交易在以下修改之后重新计算的交易哈希（16 进制字符串）：
+  - 当前输入之前的输入： signature 和 pub_key 为 None
+  - 当前输入： signature 为 None， pub_key 为引用的输出的 pub_key_hash
+  - 当前输入之后的输入： 保持原样
+交易哈希是所有输入（去掉 vote_info 和 delay_params）和输出的 str 拼接之后的 sha256，
+所以每个输入和输出只序列化一次， 之前的输入部分使用增量的 sha256 状态， 之后的部分使用预先拼接好的字节
+"""
+
+# 计算交易哈希时不包含的输入字段
+EXCLUDED_FIELDS = ("vote_info", "delay_params")
+# 公钥的缓存数量
+VERIFYING_KEY_CACHE_SIZE = 4096
+
+
+def input_str(_input, signature=None, pub_key=None, keep: bool = True) -> str:
+    """ 交易哈希中输入的字符串表示
+
+    Args:
+        _input: 交易的输入
+        signature: keep 为 False 时使用的签名
+        pub_key: keep 为 False 时使用的公钥
+        keep: 是否保留输入原本的签名和公钥
+    Returns:
+        输入去掉 EXCLUDED_FIELDS 之后的 dict 的 str
+    """
+    data = {key: value for key, value in _input.serialize().items() if key not in EXCLUDED_FIELDS}
+    if not keep:
+        data["signature"] = signature
+        data["pub_key"] = pub_key
+    return str(data)
+
+
+@lru_cache(maxsize=VERIFYING_KEY_CACHE_SIZE)
+def verifying_key(pub_key: str) -> ecdsa.VerifyingKey:
+    """
+    16进制的公钥转换为 VerifyingKey， 同一个地址的多个输入只解析一次
+    """
+    return ecdsa.VerifyingKey.from_string(binascii.a2b_hex(pub_key), curve=ecdsa.SECP256k1)
+
+
+class SigHasher(object):
+    """
+    计算一笔交易每个输入的签名哈希， 输入需要按照下标递增的顺序计算
+    """
+
+    def __init__(self, tx):
+        self.__inputs = tx.inputs
+        parts = [input_str(_input).encode() for _input in tx.inputs]
+        parts.extend(str(output).encode() for output in tx.outputs)
+
+        # 第 i 个输入之后的部分为 self.__tail[self.__offsets[i + 1]:]
+        self.__tail = memoryview(b"".join(parts))
+        self.__offsets = [0]
+        for part in parts[:len(self.__inputs)]:
+            self.__offsets.append(self.__offsets[-1] + len(part))
+
+        # 已经加入签名和公钥置空的输入的哈希状态
+        self.__prefix = hashlib.sha256()
+        self.__prefix_count = 0
+
+    def digest(self, index: int, prev_pub_key_hash) -> str:
+        """ 计算第 index 个输入的签名哈希
+
+        Args:
+            index: 输入的下标
+            prev_pub_key_hash: 输入引用的输出的 pub_key_hash
+        Returns:
+            16进制的签名哈希， 和修改后的交易调用 set_id 的结果一致
+        """
+        if index < self.__prefix_count:
+            self.__prefix = hashlib.sha256()
+            self.__prefix_count = 0
+
+        while self.__prefix_count < index:
+            self.__prefix.update(input_str(self.__inputs[self.__prefix_count], keep=False).encode())
+            self.__prefix_count += 1
+
+        m = self.__prefix.copy()
+        m.update(input_str(self.__inputs[index], None, prev_pub_key_hash, False).encode())
+        m.update(self.__tail[self.__offsets[index + 1]:])
+        return m.hexdigest()
+
+
+class SignatureCache(Singleton):
+    """
+    校验通过的签名的缓存， 交易在进入交易池时校验过的签名在区块校验时不再重复校验
+
+    key 为 (交易哈希, 输入的下标, 公钥, 签名哈希, 签名)， 签名哈希覆盖了交易的全部内容和引用的输出，
+    交易哈希相同但是内容不同的交易不会命中缓存
+    """
+
+    def __init__(self):
+        self.__cache = SizedLRU("signature", int(Config().get("cache.signature", 16 * 1024 * 1024)))
+
+    def contains(self, key: tuple) -> bool:
+        return self.__cache.get(key) is not None
+
+    def add(self, key: tuple) -> None:
+        self.__cache.put(key, True, estimate_size(key))
+
+    def clear(self) -> None:
+        """
+        区块回滚之后清空缓存
+        """
+        self.__cache.clear()
+
+    def stats(self) -> dict:
+        return self.__cache.stats()
+
+    def hit_rate(self) -> float:
+        return self.__cache.hit_rate()
+
+
+def signature_keys(tx, prev_pub_key_hashes: list) -> list:
+    """
+    交易每个输入在签名缓存中的 key
+    """
+    hasher = SigHasher(tx)
+    return [(tx.tx_hash, idx, _input.pub_key, hasher.digest(idx, prev_pub_key_hashes[idx]), _input.signature)
+            for idx, _input in enumerate(tx.inputs)]
+
+
+def verify_signatures(tx, prev_pub_key_hashes: list, cache: SignatureCache = None) -> bool:
+    """ 按顺序校验交易每个输入的签名， 第一个签名错误时返回
+
+    Args:
+        tx: 待校验的交易
+        prev_pub_key_hashes: 每个输入引用的输出的 pub_key_hash， 和输入的顺序一致
+        cache: 签名缓存， 命中的输入跳过校验， 校验通过的输入加入缓存， 为空时不使用缓存
+    Returns:
+        所有签名正确时返回 True
+    """
+    hasher = SigHasher(tx)
+
+    for idx, _input in enumerate(tx.inputs):
+        digest = hasher.digest(idx, prev_pub_key_hashes[idx])
+        key = (tx.tx_hash, idx, _input.pub_key, digest, _input.signature)
+        if cache is not None and cache.contains(key):
+            continue
+
+        signature = binascii.a2b_hex(_input.signature)
+        vk = verifying_key(_input.pub_key)
+
+        try:
+            if not vk.verify(signature, digest.encode()):
+                return False
+        except ecdsa.keys.BadSignatureError:
+            return False
+
+        if cache is not None:
+            cache.add(key)
+
+    return True
@@ -1,15 +1,16 @@
 import binascii
-import copy
 import logging
 import time
 
 # from fastecdsa import keys
-import ecdsa
 from core.config import Config
+from core.sighash import SignatureCache, input_str, verify_signatures
 from utils import funcs
 
 
 class Transaction(object):
+    __slots__ = ("tx_hash", "inputs", "outputs")
+
     def __init__(self, inputs, outputs):
         self.tx_hash = ''
         self.inputs = inputs
@@ -20,15 +21,7 @@ class Transaction(object):
         设置当前交易的交易id，根据输入和输出的数据哈希得到
         :return: None
         """
-        data_list = []
-
-        for _input in self.inputs:
-            input_dict = copy.deepcopy(_input.serialize())
-            if "vote_info" in input_dict:
-                input_dict.pop("vote_info")
-            if "delay_params" in input_dict:
-                input_dict.pop("delay_params")
-            data_list.append(str(input_dict))
+        data_list = [input_str(_input) for _input in self.inputs]
 
         output_list = [str(_) for _ in self.outputs]
         # 加入随机数保证同一个节点coinbase交易的hash不一样
@@ -59,29 +52,16 @@ class Transaction(object):
             logging.debug("Transaction is coinbase tx.")
             return True
 
-        tx_copy = copy.deepcopy(self)
-
-        for idx, _input in enumerate(self.inputs):
+        prev_pub_key_hashes = []
+        for _input in self.inputs:
             prev_tx = prev_txs.get(_input.tx_hash, None)
             if not prev_tx:
                 # raise ValueError('Previous transaction error.')
                 logging.error("Previous transaction error")
                 return False
-            tx_copy.inputs[idx].signature = None
-            tx_copy.inputs[idx].pub_key = prev_tx.outputs[_input.index].pub_key_hash
-            tx_copy.set_id()
-            tx_copy.inputs[idx].pub_key = None
-
-            signature = binascii.a2b_hex(self.inputs[idx].signature)
-            vk = ecdsa.VerifyingKey.from_string(binascii.a2b_hex(_input.pub_key), curve=ecdsa.SECP256k1)
-
-            try:
-                if not vk.verify(signature, tx_copy.tx_hash.encode()):
-                    return False
-            except ecdsa.keys.BadSignatureError:
-                return False
+            prev_pub_key_hashes.append(prev_tx.outputs[_input.index].pub_key_hash)
 
-        return True
+        return verify_signatures(self, prev_pub_key_hashes, SignatureCache())
 
     def serialize(self):
         """
@@ -150,6 +130,10 @@ class Transaction(object):
 
 
 class TxInput(object):
+    # 序列化的字段， 顺序和交易哈希的计算有关， 不能修改
+    FIELDS = ("tx_hash", "index", "signature", "pub_key")
+    __slots__ = FIELDS
+
     def __init__(self, tx_hash=None, index=None, pub_key=None):
         """ 交易初始化
 
@@ -173,20 +157,28 @@ class TxInput(object):
         return pub_key_hash == pub_hash
 
     def serialize(self):
-        return self.__dict__
+        """
+        按照 FIELDS 的顺序导出为新的 dict， 修改返回值不会影响对象本身
+        """
+        return {field: getattr(self, field) for field in self.FIELDS}
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(self.serialize())
 
-    # 直接更新dict进行初始化, 后面需要通过json-schema校验
+    # 只读取 FIELDS 中的字段， 后面需要通过json-schema校验
     @classmethod
     def deserialize(cls, data: dict):
         result = cls()
-        result.__dict__.update(data)
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(result, field, data[field])
         return result
 
 
 class TxOutput(object):
+    FIELDS = ("value", "pub_key_hash")
+    __slots__ = FIELDS
+
     def __init__(self, value=0, pub_key_hash=''):
         self.value = value
         self.pub_key_hash = pub_key_hash
@@ -201,19 +193,24 @@ class TxOutput(object):
         return self.pub_key_hash == pub_key_hash
 
     def serialize(self):
-        return self.__dict__
+        return {"value": self.value, "pub_key_hash": self.pub_key_hash}
 
     def __repr__(self):
-        return str(self.__dict__)
+        return str(self.serialize())
 
     @classmethod
     def deserialize(cls, data: dict):
         result = cls()
-        result.__dict__.update(data)
+        for field in cls.FIELDS:
+            if field in data:
+                setattr(result, field, data[field])
         return result
 
 
 class CoinBaseInput(TxInput):
+    FIELDS = TxInput.FIELDS + ("vote_info", "delay_params")
+    __slots__ = ("vote_info", "delay_params")
+
     def __init__(self, tx_hash=None, inputs=None, outputs=None):
         super().__init__(tx_hash, inputs, outputs)
         self.vote_info = {}
@@ -235,4 +232,4 @@ class CoinBaseInput(TxInput):
         重写方法， 相比tx_input多了投票信息, 去掉投票信息
         保证在出现coinbase交易时与用户的签名信息一致
         """
-        return str(self.__dict__)
+        return str(self.serialize())
@@ -1,238 +1,591 @@
-import copy
+import atexit
+import heapq
+import itertools
 import logging
+import struct
 
-import pycouchdb.exceptions
-from lru import LRU
-
+from core.coins import CoinsViewCache, utxo_size
+from core.config import Config
 from core.transaction import Transaction
-from utils.leveldb import LevelDB
+from utils.cache import SizedLRU
+from utils.database import Database
+from utils.errors import PrunedBlockError
 from utils.singleton import Singleton
-from utils.funcs import pub_to_address
-from utils.convertor import utxo_hash_to_db_key, addr_utxo_db_key, remove_utxo_db_prefix
+from utils.convertor import outpoint_to_key, key_to_outpoint, address_prefix, address_outpoint_to_key, hash_to_key
+from utils.convertor import address_to_key
+from utils.convertor import NS_UTXO, NS_ADDRESS, NS_BALANCE, NS_META, NS_UNDO, META_UTXO_HEIGHT
+
+# 遍历地址的 UTxO 时每次批量读取的 UTxO 数量
+UTXO_READ_BATCH = 256
 
 
 class UTXOSet(Singleton):
     def __init__(self):
-        self.db = LevelDB()
-        self.__utxo_cache = LRU(50000)
-        self.__address_cache = LRU(50000)
-
-    def addr_cache_callback(self, key: str, value: list):
-        # todo(Decision): 这个函数存在问题， 会导致出块错误
-        self.db[key] = {"utxos": value}
+        self.db = Database()
+        self.__utxos = self.db.namespace(NS_UTXO)
+        self.__addresses = self.db.namespace(NS_ADDRESS)
+        self.__balances = self.db.namespace(NS_BALANCE)
+        self.__meta = self.db.namespace(NS_META)
+        self.__undo = self.db.namespace(NS_UNDO)
+        # 未修改的 UTxO 的读缓存， 按照内存预算淘汰
+        self.__utxo_cache = SizedLRU("utxo", int(Config().get("cache.utxo", 32 * 1024 * 1024)), utxo_size)
+        # 还没有写入数据库的修改， 见 core.coins
+        self.__view = CoinsViewCache()
+        # 修改占用的内存达到 flush_bytes 或者累计 flush_interval 个区块之后写入数据库
+        self.__flush_bytes = int(Config().get("utxo.flush_bytes", 64 * 1024 * 1024))
+        self.__flush_interval = int(Config().get("utxo.flush_interval", 1000))
+        # 内存中 UTxO 集合对应的高度， 数据库中的高度只在写入修改时更新
+        self.__height = None
+        # 数据库中 UTxO 集合对应的高度， 为空时从数据库中加载
+        self.__flushed_height = None
+
+        # 先打开数据库， 退出时先写入修改再关闭写入线程
+        _ = self.db.db
+        atexit.register(self.close)
 
     def reindex(self, bc):
         """
         更新数据库的UTXO， 将UTXO和链进行同步
         :param bc: Blockchain的实例
+        :raises PrunedBlockError: 需要重新连接的区块已经被裁剪
         """
-        utxo_latest_db_key = utxo_hash_to_db_key("latest", 0)
         latest_block, prev_hash = bc.get_latest_block()
-        insert_list = {}
 
-        if not self.db[utxo_latest_db_key]:
+        if self.__meta[META_UTXO_HEIGHT] is None:
             # 通过blockchain查询到未使用的交易
             utxos = bc.find_utxo()
             if not latest_block:
                 return
-            for tx_hash, index_vouts in utxos.items():
-
-                for index_vout in index_vouts:
-                    index = index_vout[0]
-                    vout = index_vout[1]
-
-                    vout_dict = vout.serialize()
-                    utxo_db_key = utxo_hash_to_db_key(tx_hash, index)
-                    vout_dict.update({
-                        'hash': tx_hash,
-                        'index': index
-                    })
-                    insert_list[utxo_db_key] = vout_dict
-            try:
-                self.db.batch_insert(insert_list)
-            except pycouchdb.exceptions.Conflict as e:
-                logging.error(e)
-            self.set_latest_height(latest_block.block_header.height)
+
+            balances = {}
+            # 交易哈希相同的 coinbase 交易在 find_utxo 的结果中重复出现， 同一个输出只计入一次余额
+            utxo_keys = set()
+            with self.db.write_batch() as batch:
+                for tx_hash, index_vouts in utxos.items():
+
+                    for index_vout in index_vouts:
+                        index = index_vout[0]
+                        vout = index_vout[1]
+
+                        utxo_key = outpoint_to_key(tx_hash, index)
+                        if utxo_key in utxo_keys:
+                            continue
+                        utxo_keys.add(utxo_key)
+
+                        vout_dict = vout.serialize()
+                        vout_dict.update({
+                            'index': index,
+                            'tx_hash': tx_hash
+                        })
+                        batch.put(self.__utxos, utxo_key, vout_dict)
+                        batch.put(self.__addresses, address_outpoint_to_key(vout.pub_key_hash, tx_hash, index),
+                                  vout.value)
+                        balance = balances.setdefault(vout.pub_key_hash, {"value": 0, "count": 0})
+                        balance["value"] += vout.value
+                        balance["count"] += 1
+
+                for address, balance in balances.items():
+                    batch.put(self.__balances, address_to_key(address), balance)
+                self.set_latest_height(latest_block.block_header.height, batch)
         else:
+            # 数据库中的 UTxO 集合停留在最近一次写入修改的高度， 之后的区块重新连接
             latest_utxo_height = self.get_latest_height()
             latest_block_height = latest_block.block_header.height
-            for i in range(latest_utxo_height, latest_block_height):
-                block = bc.get_block_by_height(i)
+            for height, block in zip(range(latest_utxo_height + 1, latest_block_height + 1),
+                                     bc.iter_blocks(latest_utxo_height + 1, latest_block_height + 1)):
+                if block is None:
+                    logging.error("Block #{} has been pruned, can not reconnect it to the UTxO set.".format(height))
+                    raise PrunedBlockError("Block #{} has been pruned.".format(height))
                 self.update(block)
 
-    def set_latest_height(self, height):
+    def reset(self, bc):
+        """
+        写入单元被丢弃之后调用， 丢弃内存中已经修改的 UTxO 和高度， 从数据库中的 UTxO 高度重新连接之后的区块
+        :param bc: Blockchain的实例， 最新区块是已经提交的区块
+        """
+        self.__view.clear()
+        self.__utxo_cache.clear()
+        self.__height = None
+        self.__flushed_height = None
+        try:
+            self.reindex(bc)
+        except Exception as e:
+            logging.error("Reconnect blocks to the UTxO set failed: {}".format(e))
+
+    def set_latest_height(self, height, batch=None):
         """
         设置本地UTXO的最新高度
         :param height: 需要设置的高度， 更新到数据库
+        :param batch: 所属的写入单元， 为空时直接写入数据库
         """
-        utxo_latest_db_key = utxo_hash_to_db_key("latest", 0)
-        self.db[utxo_latest_db_key] = {'height': height}
+        self.__height = height
+        self.__flushed_height = height
+        if batch is None:
+            with self.db.write_batch() as batch:
+                batch.put(self.__meta, META_UTXO_HEIGHT, {'height': height})
+        else:
+            batch.put(self.__meta, META_UTXO_HEIGHT, {'height': height})
 
     def get_latest_height(self):
-        utxo_latest_db_key = utxo_hash_to_db_key("latest", 0)
-        utxo_latest_height_dict = self.db[utxo_latest_db_key]
+        if self.__height is not None:
+            return self.__height
+
+        utxo_latest_height_dict = self.__meta[META_UTXO_HEIGHT]
         if utxo_latest_height_dict:
             return utxo_latest_height_dict['height']
         return 0
 
-    def update(self, block):
+    def get_flushed_height(self) -> int:
+        """
+        数据库中 UTxO 集合对应的高度， 包括已经放入写入单元还没有提交的写入， 重启之后从下一个区块开始重新连接
+        数据库中没有 UTxO 集合时返回 -1
+        """
+        if self.__flushed_height is None:
+            utxo_latest_height_dict = self.__meta[META_UTXO_HEIGHT]
+            self.__flushed_height = utxo_latest_height_dict['height'] if utxo_latest_height_dict else -1
+        return self.__flushed_height
+
+    def get_cache_stats(self) -> dict:
+        """
+        获取 UTxO 读缓存和写回缓存的统计信息
+        """
+        return {self.__utxo_cache.name: self.__utxo_cache.stats(), "utxo_view": self.__view.stats()}
+
+    def flush(self, batch=None) -> None:
+        """ 将写回缓存中的修改写入数据库
+
+        新的 UTxO 和地址索引写入数据库并放入读缓存， 被使用的 UTxO 和地址索引从数据库中删除，
+        被修改过的地址的余额写入数据库， 同时更新数据库中的 UTxO 高度， 重启之后从该高度继续连接区块
+        写入单元的 write 在修改写入存储引擎之后才返回， 期间不会再修改 UTxO 集合
+        Args:
+            batch: 所属的写入单元， 为空时单独提交
+        """
+        if batch is None:
+            with self.db.write_batch(True) as batch:
+                return self.flush(batch)
+
+        changes = self.__view.changes()
+        for utxo_key, utxo, spent in changes:
+            address_key = address_outpoint_to_key(utxo["pub_key_hash"], utxo["tx_hash"], utxo["index"])
+            if spent:
+                batch.delete(self.__utxos, utxo_key)
+                batch.delete(self.__addresses, address_key)
+            else:
+                batch.put(self.__utxos, utxo_key, utxo)
+                batch.put(self.__addresses, address_key, utxo["value"])
+
+        for address, (value, count) in self.__view.balances().items():
+            if count > 0:
+                batch.put(self.__balances, address_to_key(address), {"value": value, "count": count})
+            else:
+                batch.delete(self.__balances, address_to_key(address))
+
+        height = self.get_latest_height()
+        self.set_latest_height(height, batch)
+
+        def update_cache():
+            # 写入存储引擎之后再清空写回缓存， 开启写入线程时交给写入线程的修改还不能通过快照读取，
+            # 在这之前的读取仍然需要从写回缓存中读到修改
+            self.__view.clear()
+            for _utxo_key, _utxo, _spent in changes:
+                if not _spent:
+                    self.__utxo_cache[_utxo_key] = _utxo
+
+        batch.after_commit(update_cache)
+        logging.info("Flush {} UTxO changes at height {}.".format(len(changes), height))
+
+    def close(self) -> None:
+        """
+        退出时写入还没有写入数据库的修改
+        """
+        if len(self.__view) == 0 and self.__view.blocks == 0:
+            return
+        try:
+            self.flush()
+        except Exception as e:
+            logging.error("Flush UTxO changes failed: {}".format(e))
+
+    def __should_flush(self) -> bool:
+        return self.__view.bytes >= self.__flush_bytes or self.__view.blocks >= self.__flush_interval
+
+    def __load_balances(self, addresses) -> None:
+        """
+        修改 UTxO 之前批量读取写回缓存中还没有的地址余额
+        """
+        missing = self.__view.missing_balances(addresses)
+        if not missing:
+            return
+
+        records = self.__balances.multi_get([address_to_key(address) for address in missing])
+        self.__view.set_balances({address: (record["value"], record["count"]) if record else (0, 0)
+                                  for address, record in zip(missing, records)})
+
+    def get_balance(self, address: str, use_snapshot: bool = False) -> dict:
+        """ 查询地址的余额
+
+        写回缓存中存在的地址直接返回缓存中的余额， 否则读取一条余额记录， 和地址的 UTxO 数量无关
+
+        Args:
+            address: 需要查询的地址
+            use_snapshot: 是否从快照中读取余额记录， 快照在查询写回缓存之后获取，
+                写回缓存中的余额总是对应最新的区块
+        Returns:
+            {"value": 金额, "count": UTxO 数量}
+        """
+        balance = self.__view.balance(address)
+        if balance is not None:
+            return {"value": balance[0], "count": balance[1]}
+
+        # 写回缓存在提交之后才清空， 之后获取的快照一定包含写回缓存中已经写入的余额
+        balances = self.db.snapshot().namespace(NS_BALANCE) if use_snapshot else self.__balances
+        record = balances.get(address_to_key(address))
+        if not record:
+            return {"value": 0, "count": 0}
+        return {"value": record["value"], "count": record["count"]}
+
+    def __get(self, utxo_key: bytes):
         """
-        更新数据库中的UTXO， 添加新的UTXO， 并且删除已被使用的UTXO
+        依次从写回缓存、读缓存和数据库中读取 UTxO， 不存在或者已经被使用时返回 None
         """
+        exists, utxo = self.__view.lookup(utxo_key)
+        if exists:
+            return utxo
+
+        utxo = self.__utxo_cache.get(utxo_key)
+        if utxo is None:
+            utxo = self.__utxos.get(utxo_key)
+        return utxo
+
+    def update(self, block, batch=None):
+        """
+        连接区块， 添加新的 UTxO， 并且删除已被使用的 UTxO
+        修改保存在写回缓存中， 达到阈值时写入所属的写入单元
+        :param block: 新连接的区块
+        :param batch: 所属的写入单元， 为空时单独提交
+        """
+        if batch is None:
+            with self.db.write_batch() as batch:
+                return self.update(block, batch)
+
         logging.debug("Update UTXO set.")
-        insert_list = {}
-        delete_list = []
+        # 一次批量读取区块中引用的输出， 同一个区块中产生的输出在处理到对应的交易时从写回缓存中读取
+        spent_outputs = self.get_outputs({(_input.tx_hash, _input.index) for tx in block.transactions
+                                          if not tx.is_coinbase() for _input in tx.inputs})
+        # 内容相同的 coinbase 交易哈希相同， 产生的输出会覆盖还没有被使用的输出， 不能标记为 FRESH，
+        # 其他交易使用的输出各不相同， 交易哈希不会重复
+        stored_outputs = self.get_outputs({(tx.tx_hash, idx) for tx in block.transactions
+                                           if tx.is_coinbase() for idx in range(len(tx.outputs))})
+        # 回滚记录， 和区块中非 coinbase 交易的输入一一对应
+        undo = []
+        self.__load_balances({output.pub_key_hash for tx in block.transactions for output in tx.outputs} |
+                             {utxo["pub_key_hash"] for utxo in spent_outputs.values()})
+
         for tx in block.transactions:
             tx_hash = tx.tx_hash
 
             for idx, outputs in enumerate(tx.outputs):
+                # serialize 每次返回新的 dict， 可以直接修改
                 output_dict = outputs.serialize()
                 output_dict["index"] = idx
                 output_dict["tx_hash"] = tx_hash
-                utxo_db_key = utxo_hash_to_db_key(tx_hash, idx)
-                address = outputs.pub_key_hash
-                address_db_key = addr_utxo_db_key(address)
-                if address not in self.__address_cache:
-                    self.find_utxo(address)
-                self.__utxo_cache[utxo_db_key] = output_dict
-                self.__address_cache[address].add(utxo_db_key)
-                insert_list[utxo_db_key] = copy.deepcopy(output_dict)
-                insert_list[address_db_key] = list(self.__address_cache[address])
+                utxo_key = outpoint_to_key(tx_hash, idx)
+                self.__utxo_cache.pop(utxo_key)
+                self.__view.add(utxo_key, output_dict, (tx_hash, idx) in stored_outputs)
+
+            # coinbase 交易的输入不对应任何 UTxO
+            if tx.is_coinbase():
+                continue
 
             for _input in tx.inputs:
                 input_tx_hash = _input.tx_hash
-                utxo_db_key = utxo_hash_to_db_key(input_tx_hash, _input.index)
-                tx_hash_index_str = "{0}#{1}".format(tx_hash, _input.index)
-                input_address = pub_to_address(_input.pub_key)
-                address_db_key = addr_utxo_db_key(input_address)
-
-                delete_list.append(utxo_db_key)
-
-                self.__address_cache[input_address].discard(utxo_db_key)
-                if utxo_db_key in self.__utxo_cache:
-                    self.__utxo_cache.pop(utxo_db_key)
-                insert_list[address_db_key] = {
-                    "utxos": list(self.__address_cache[input_address])
-                }
-                logging.debug("UTxO {} cleaned.".format(tx_hash_index_str))
+                utxo_key = outpoint_to_key(input_tx_hash, _input.index)
+                tx_hash_index_str = "{0}#{1}".format(input_tx_hash, _input.index)
+
+                utxo = spent_outputs.get((input_tx_hash, _input.index)) or self.__get(utxo_key)
+                if utxo is None:
+                    logging.error("UTxO {} spent by tx#{} not found.".format(tx_hash_index_str, tx_hash))
+                    undo.append(None)
+                    continue
 
-        self.db.batch_insert(insert_list)
-        self.db.batch_remove(delete_list)
+                undo.append([utxo["pub_key_hash"], utxo["value"]])
+                self.__utxo_cache.pop(utxo_key)
+                self.__view.spend(utxo_key, utxo)
+                logging.debug("UTxO {} cleaned.".format(tx_hash_index_str))
 
-        self.set_latest_height(block.block_header.height)
+        # 回滚记录直接写入， 不经过写回缓存
+        batch.put(self.__undo, hash_to_key(block.block_header.hash), undo)
+        self.__height = block.block_header.height
+        self.__view.blocks += 1
+        if self.__should_flush():
+            self.flush(batch)
 
-    def roll_back(self, block, bc):
+    def roll_back(self, block, bc, batch=None):
         """
-        UTXO集合回滚逻辑， 遍历当前最高区块的交易进行回滚
+        UTXO集合回滚逻辑， 倒序遍历当前最高区块的交易进行回滚， 被使用的输出从区块的回滚记录中恢复
+        回滚之后总是写入修改， 避免数据库中的 UTxO 高度高于区块链的高度
+        :param block: 待回滚的区块
+        :param bc: Blockchain的实例， 区块没有回滚记录时从交易中读取被使用的输出
+        :param batch: 所属的写入单元， 为空时单独提交
         """
-        insert_list = {}
-        delete_list = []
+        if batch is None:
+            with self.db.write_batch() as batch:
+                return self.roll_back(block, bc, batch)
+
+        block_hash_key = hash_to_key(block.block_header.hash)
+        spent_outputs = self.__load_undo(block, block_hash_key, bc)
+        self.__load_balances({output.pub_key_hash for tx in block.transactions for output in tx.outputs} |
+                             {utxo["pub_key_hash"] for utxo in spent_outputs.values()})
+
         transaction: Transaction
-        for transaction in block.transactions:
+        for transaction in reversed(block.transactions):
             tx_hash = transaction.tx_hash
 
             for idx, output in enumerate(transaction.outputs):
-                utxo_db_key = utxo_hash_to_db_key(tx_hash, idx)
+                utxo_key = outpoint_to_key(tx_hash, idx)
+                output_dict = output.serialize()
+                output_dict.update({"index": idx, "tx_hash": tx_hash})
+                self.__utxo_cache.pop(utxo_key)
+                self.__view.spend(utxo_key, output_dict)
+
+            if transaction.is_coinbase():
+                continue
+
+            for _input in transaction.inputs:
+                outpoint = (_input.tx_hash, _input.index)
+                output_dict = spent_outputs.get(outpoint)
+                if output_dict is None:
+                    logging.error("Spent output {}#{} of tx#{} not found.".format(*outpoint, tx_hash))
+                    continue
+                self.__view.add(outpoint_to_key(*outpoint), output_dict)
 
-                address = output.pub_key_hash
-                address_db_key = addr_utxo_db_key(address)
-                delete_list.append(utxo_db_key)
+        batch.delete(self.__undo, block_hash_key)
+        self.__height = block.block_header.height - 1
+        self.__view.blocks += 1
+        self.flush(batch)
 
-                if address not in self.__address_cache:
-                    self.find_utxo(address)
-                self.__address_cache[address].discard(utxo_db_key)
+    def __load_undo(self, block, block_hash_key: bytes, bc) -> dict:
+        """ 读取区块被使用的输出
 
-                if utxo_db_key in self.__utxo_cache:
-                    self.__utxo_cache.pop(utxo_db_key)
-                insert_list[address_db_key] = {
-                    "utxos": list(self.__address_cache[address])
-                }
+        回滚记录按照顺序保存了每个输入使用的输出的地址和金额， 和输入的 (交易哈希, 输出索引) 组合为 UTxO 记录
+        在回滚记录之前连接的区块没有回滚记录， 从输入引用的交易中读取
 
-            if transaction.is_coinbase():
+        Returns:
+            (交易哈希, 输出索引) -> UTxO 记录
+        """
+        outpoints = [(_input.tx_hash, _input.index)
+                     for tx in block.transactions if not tx.is_coinbase() for _input in tx.inputs]
+
+        undo = self.__undo.get(block_hash_key)
+        if undo is not None:
+            return {(tx_hash, index): {"value": item[1], "pub_key_hash": item[0], "index": index, "tx_hash": tx_hash}
+                    for (tx_hash, index), item in zip(outpoints, undo) if item is not None}
+
+        logging.warning("Undo record of block#{} not found, read spent outputs from transactions.".format(
+            block.block_header.hash))
+        spent_outputs = {}
+        for tx_hash, index in outpoints:
+            transaction = bc.get_transaction_by_tx_hash(tx_hash)
+            if transaction is None or index >= len(transaction.outputs):
                 continue
+            output_dict = transaction.outputs[index].serialize()
+            output_dict.update({"index": index, "tx_hash": tx_hash})
+            spent_outputs[(tx_hash, index)] = output_dict
+        return spent_outputs
 
-            for _input in transaction.inputs:
-                input_tx_hash = _input.tx_hash
-                output_index = _input.index
-                utxo_db_key = utxo_hash_to_db_key(input_tx_hash, output_index)
+    def get_outputs(self, outpoints) -> dict:
+        """ 批量查询未使用的输出
 
-                transaction = bc.get_transaction_by_tx_hash(tx_hash)
-                outputs = transaction.outputs
+        先查询写回缓存和读缓存， 剩余的输出通过一次批量读取从数据库中获取， 读取的结果不放入缓存
 
-                try:
-                    output = outputs[output_index]
-                except IndexError:
-                    logging.error("Get output with index {} in tx#{} failed.".format(output_index, tx_hash))
-                    continue
-                output_dict = output.serialize()
-                output_dict.update({'index': output_index})
-                address = output_dict["pub_key_hash"]
-                address_db_key = addr_utxo_db_key(address)
-                tx_hash_index_str = "{0}#{1}".format(input_tx_hash, output_index)
-
-                if address not in self.__address_cache:
-                    self.find_utxo(address)
-                self.__address_cache[address].add(utxo_db_key)
-                self.__utxo_cache[utxo_db_key] = output_dict
-                output_dict.update({"tx_hash": input_tx_hash})
-                insert_list[utxo_db_key] = copy.deepcopy(output_dict)
-                insert_list[address_db_key] = {
-                    "utxos": list(self.__address_cache[address])
-                }
-
-        self.db.batch_insert(insert_list)
-        self.db.batch_remove(delete_list)
-        self.set_latest_height(block.block_header.height - 1)
-
-    def find_utxo(self, address):
-        # todo: leveldb 中如何检索
-        """
-        开放给openapi用于查询utxo的方法
-        :param address: 需要查询的地址
-        :return: 对应地址的utxo
-        """
-        address_db_key = addr_utxo_db_key(address)
-        if address in self.__address_cache:
-            utxos_db_key_set = self.__address_cache[address]
-        else:
-            utxos_db_key_set = self.db.get(address_db_key, {}).get("utxos", [])
-            self.__address_cache[address] = set(utxos_db_key_set)
-
-        utxos = {}
-        for utxo_db_key in utxos_db_key_set:
-            tx_hash_index_str = remove_utxo_db_prefix(utxo_db_key)
-            if utxo_db_key in self.__utxo_cache:
-                utxo = self.__utxo_cache[utxo_db_key]
-            else:
-                utxo = self.db.get(utxo_db_key, None)
+        Args:
+            outpoints: (交易哈希, 输出索引) 的集合
+        Returns:
+            (交易哈希, 输出索引) -> UTxO 记录， 不存在的输出不包含在结果中
+        """
+        outputs = {}
+        missing = {}
+        for outpoint in outpoints:
+            try:
+                utxo_key = outpoint_to_key(*outpoint)
+            except (TypeError, ValueError, struct.error):
+                continue
 
-                if utxo:
-                    self.__utxo_cache[utxo_db_key] = utxo
-                else:
-                    logging.error("Get utxo error, get none from database.")
+            exists, utxo = self.__view.lookup(utxo_key)
+            if exists:
+                if utxo is not None:
+                    outputs[outpoint] = utxo
+                continue
 
-            if not utxo:
+            utxo = self.__utxo_cache.get(utxo_key)
+            if utxo is None:
+                missing[utxo_key] = outpoint
+            else:
+                outputs[outpoint] = utxo
+
+        if missing:
+            utxo_keys = sorted(missing)
+            for utxo_key, utxo in zip(utxo_keys, self.__utxos.multi_get(utxo_keys)):
+                if utxo is not None:
+                    outputs[missing[utxo_key]] = utxo
+        return outputs
+
+    def iter_utxo(self, address, use_snapshot: bool = False, start: tuple = None):
+        """ 按照 UTxO 的 key 的顺序遍历地址的 UTxO
+
+        通过地址索引的前缀遍历得到 UTxO 的 key， 和写回缓存中该地址的修改合并，
+        每 UTXO_READ_BATCH 个 key 批量读取一次 UTxO 记录， 占用的内存和地址的 UTxO 数量无关
+        写回缓存中的修改总是对应最新的区块， 传入快照时结果同样包含还没有写入数据库的修改
+
+        Args:
+            address: 需要查询的地址
+            use_snapshot: 是否从快照中读取， 不经过读缓存， 快照在取出写回缓存中的修改之后获取
+            start: 游标 (交易哈希, 输出索引)， 从不小于该 UTxO 的位置开始遍历， 为空时从头开始
+        Returns:
+            产生 (交易哈希, 输出索引, UTxO 记录) 的生成器
+        """
+        start_utxo_key = None if start is None else outpoint_to_key(*start)
+        # 先取出缓存中的修改再读取数据库或者获取快照， 期间写入数据库的修改仍然包含在取出的结果中，
+        # 写回缓存在提交之后才清空， 取出的修改为空时之后获取的快照一定包含已经写入的修改
+        changes = {utxo_key: utxo for utxo_key, utxo in self.__view.address_entries(address).items()
+                   if start_utxo_key is None or utxo_key >= start_utxo_key}
+
+        if not use_snapshot:
+            # 地址索引通过前缀遍历读取， 只能读取到已经写入数据库的修改
+            self.db.flush()
+            addresses = self.__addresses
+            utxos = self.__utxos
+        else:
+            snapshot = self.db.snapshot()
+            addresses = snapshot.namespace(NS_ADDRESS)
+            utxos = snapshot.namespace(NS_UTXO)
+
+        prefix = address_prefix(address)
+        start_key = None if start is None else prefix + start_utxo_key
+        stored = (bytes(address_key[len(prefix):]) for address_key in addresses.iterator(False, prefix, start_key))
+        added = sorted(utxo_key for utxo_key, utxo in changes.items() if utxo is not None)
+
+        utxo_keys = []
+        last_key = None
+        for utxo_key in heapq.merge(stored, added):
+            # 同时存在于数据库和缓存中， 或者已经被使用
+            if utxo_key == last_key or (utxo_key in changes and changes[utxo_key] is None):
                 continue
+            last_key = utxo_key
 
-            flag_index = tx_hash_index_str.find("#")
-            tx_hash = tx_hash_index_str[:flag_index]
+            utxo_keys.append(utxo_key)
+            if len(utxo_keys) >= UTXO_READ_BATCH:
+                yield from self.__read_utxos(utxo_keys, changes, utxos, not use_snapshot)
+                utxo_keys = []
+        yield from self.__read_utxos(utxo_keys, changes, utxos, not use_snapshot)
+
+    def __read_utxos(self, utxo_keys: list, changes: dict, utxos, use_cache: bool):
+        """
+        批量读取一组 UTxO 记录， 优先使用写回缓存中的修改， 使用读缓存时先查询读缓存， 读取到的记录放入读缓存
+        """
+        records = {}
+        missing = []
+        for utxo_key in utxo_keys:
+            utxo = changes.get(utxo_key)
+            if utxo is None and use_cache:
+                utxo = self.__utxo_cache.get(utxo_key)
+            if utxo is None:
+                missing.append(utxo_key)
+            else:
+                records[utxo_key] = utxo
 
-            utxos[tx_hash] = utxo
-        return utxos
+        for utxo_key, utxo in zip(missing, utxos.multi_get(missing)):
+            if not utxo:
+                logging.error("Get utxo error, get none from database.")
+                continue
+            if use_cache:
+                self.__utxo_cache[utxo_key] = utxo
+            records[utxo_key] = utxo
+
+        for utxo_key in utxo_keys:
+            if utxo_key in records:
+                yield key_to_outpoint(utxo_key) + (records[utxo_key],)
+
+    def scan_utxo(self, address, use_snapshot: bool = False, after: tuple = None, min_value: int = 0):
+        """ 从游标之后按照 UTxO 的 key 的顺序遍历地址的 UTxO
+
+        Args:
+            address: 需要查询的地址
+            use_snapshot: 是否从快照中读取， 见 iter_utxo
+            after: 游标 (交易哈希, 输出索引)， 通常是上一页的最后一个 UTxO， 只遍历在它之后的 UTxO
+            min_value: 只遍历金额不小于该值的 UTxO
+        Returns:
+            产生 UTxO 记录的生成器， 记录中包含交易哈希和输出索引
+        """
+        for tx_hash, index, utxo in self.iter_utxo(address, use_snapshot, after):
+            # iter_utxo 的游标包含游标所在的 UTxO
+            if (tx_hash, index) == after or utxo["value"] < min_value:
+                continue
+            yield utxo
+
+    def find_utxo(self, address, use_snapshot: bool = False, after: tuple = None, limit: int = None,
+                  min_value: int = 0) -> list:
+        """ 开放给openapi用于分页查询utxo的方法
+
+        Args:
+            address: 需要查询的地址
+            use_snapshot: 是否从快照中读取， 见 iter_utxo
+            after: 游标 (交易哈希, 输出索引)， 传入上一页最后一个 UTxO 查询下一页
+            limit: 最多返回的数量， 为空时返回全部
+            min_value: 只返回金额不小于该值的 UTxO
+        Returns:
+            按照 UTxO 的 key 排序的 UTxO 记录列表
+        """
+        return list(itertools.islice(self.scan_utxo(address, use_snapshot, after, min_value), limit))
 
     @staticmethod
     def clear_transactions(transactions):
-        used_utxo = []
+        """
+        去掉和之前的交易使用了相同输出的交易， 每笔交易最多保留一次
+        :param transactions: 按顺序排列的交易列表
+        :return: 没有冲突的交易列表
+        """
+        used_utxo = set()
         txs = []
         for tx in transactions:
-            for _input in tx.inputs:
-                input_tx_hash = _input.tx_hash
-                utxo = (input_tx_hash, _input.index)
-                if utxo not in used_utxo:
-                    used_utxo.append(utxo)
-                    txs.append(tx)
+            utxos = [(_input.tx_hash, _input.index) for _input in tx.inputs]
+            if len(set(utxos)) != len(utxos) or any(utxo in used_utxo for utxo in utxos):
+                continue
+            used_utxo.update(utxos)
+            txs.append(tx)
         return txs
 
+    def check_spends(self, block) -> bool:
+        """ 检查区块中的交易是否存在双花
+
+        每个输入必须引用 UTxO 集合中的输出或者区块中之前的交易产生的输出， 并且在区块中只能使用一次
+
+        Args:
+            block: 待连接的区块， 前一个区块需要已经连接
+        Returns:
+            不存在双花时返回 True
+        """
+        outpoints = {(_input.tx_hash, _input.index)
+                     for tx in block.transactions if not tx.is_coinbase() for _input in tx.inputs}
+        unspent = self.get_outputs(outpoints)
+
+        created = set()
+        spent = set()
+        for tx in block.transactions:
+            if not tx.is_coinbase():
+                for _input in tx.inputs:
+                    outpoint = (_input.tx_hash, _input.index)
+                    if outpoint in spent:
+                        logging.warning("Output {}#{} is spent twice in tx#{}.".format(*outpoint, tx.tx_hash))
+                        return False
+                    if outpoint not in unspent and outpoint not in created:
+                        logging.warning("Output {}#{} spent by tx#{} is not unspent.".format(*outpoint, tx.tx_hash))
+                        return False
+                    spent.add(outpoint)
+
+            for idx in range(len(tx.outputs)):
+                created.add((tx.tx_hash, idx))
+        return True
+
 
 class FullTXOutput(object):
     def __init__(self, txid, txoutput, index):
@@ -0,0 +1,98 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from core.config import Config
+from core.sighash import verify_signatures
+from core.transaction import Transaction
+from utils.singleton import Singleton
+
+"""
+区块签名的并行校验
+
+纯 Python 的 ecdsa 在校验时一直持有 GIL， 大区块的签名校验放到进程池中进行：
+  - 每个任务是 (交易的序列化数据, 每个输入引用的输出的 pub_key_hash)， 子进程不需要访问数据库
+  - 区块中的交易按顺序切分成多段， 每段交给一个子进程， 某一段校验失败之后取消还没有开始的段
+  - 进程池在第一次使用时创建， 使用 spawn 启动子进程， 不继承父进程中数据库的句柄和线程
+"""
+
+# 每个子进程平均分到的任务段数量， 段越多失败时越早停止， 但是进程间通信的次数越多
+CHUNKS_PER_WORKER = 4
+
+
+def _verify_chunk(jobs: list) -> bool:
+    """
+    在子进程中按顺序校验一段交易的签名， 第一个失败时返回 False
+    """
+    for tx_data, prev_pub_key_hashes in jobs:
+        tx = Transaction.deserialize(tx_data)
+        if not verify_signatures(tx, prev_pub_key_hashes):
+            return False
+    return True
+
+
+class VerifyExecutor(Singleton):
+    def __init__(self):
+        # 为 0 时使用 CPU 的数量
+        self.__workers = int(Config().get("verify.workers", 0)) or os.cpu_count() or 1
+        # 交易数量少于该值的区块直接在当前线程校验
+        self.__min_txs = int(Config().get("verify.parallel_min_txs", 64))
+        self.__pool = None
+        self.__lock = threading.Lock()
+        atexit.register(self.close)
+
+    @property
+    def workers(self) -> int:
+        return self.__workers
+
+    def should_parallel(self, tx_count: int) -> bool:
+        return self.__workers > 1 and tx_count >= self.__min_txs
+
+    def verify(self, jobs: list) -> bool:
+        """ 在进程池中校验一组交易的签名
+
+        Args:
+            jobs: (交易的序列化数据, 每个输入引用的输出的 pub_key_hash 列表) 的列表
+        Returns:
+            所有签名正确时返回 True， 任意一段失败时取消剩余的段并返回 False
+        Raises:
+            BrokenProcessPool: 子进程异常退出， 进程池会在下一次使用时重新创建
+        """
+        if not jobs:
+            return True
+
+        chunk_count = min(len(jobs), self.__workers * CHUNKS_PER_WORKER)
+        chunk_size = (len(jobs) + chunk_count - 1) // chunk_count
+
+        pool = self.__get_pool()
+        futures = [pool.submit(_verify_chunk, jobs[idx: idx + chunk_size])
+                   for idx in range(0, len(jobs), chunk_size)]
+        try:
+            for future in as_completed(futures):
+                if not future.result():
+                    return False
+            return True
+        except BrokenProcessPool:
+            logging.warning("Verify process pool is broken, recreate it next time.")
+            self.close()
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.shutdown(wait=False, cancel_futures=True)
+                self.__pool = None
+
+    def __get_pool(self) -> ProcessPoolExecutor:
+        with self.__lock:
+            if self.__pool is None:
+                logging.info("Start verify process pool with {} workers.".format(self.__workers))
+                self.__pool = ProcessPoolExecutor(self.__workers, mp_context=multiprocessing.get_context("spawn"))
+            return self.__pool
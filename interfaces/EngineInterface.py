@@ -0,0 +1,51 @@
+from abc import abstractmethod, ABC
+
+
+class EngineInterface(ABC):
+    """
+    底层的有序 key-value 存储引擎， key 和 value 都是 bytes
+    命名空间、编码、写入线程和快照的管理由 utils.database.Database 完成， 引擎只需要提供下面的操作
+    """
+
+    @abstractmethod
+    def get(self, key: bytes):
+        """
+        获取 key 对应的 value， 不存在时返回 None
+        """
+
+    @abstractmethod
+    def multi_get(self, keys) -> dict:
+        """
+        批量获取多个 key， 返回存在的 key 和对应的 value
+        """
+
+    @abstractmethod
+    def write(self, ops: list, sync: bool = False) -> None:
+        """
+        原子地提交一组修改， ops 为 (key, value) 列表， value 为 None 表示删除， 按照顺序生效
+        """
+
+    @abstractmethod
+    def iterator(self, prefix: bytes = b""):
+        """
+        按照 key 的顺序遍历以 prefix 开头的记录， 返回的迭代器产生 (key, value)，
+        支持 seek(key) 跳转到第一个不小于 key 的记录， 使用之后调用 close
+        """
+
+    @abstractmethod
+    def snapshot(self):
+        """
+        创建当前状态的只读快照， 快照提供 get、multi_get 和 iterator
+        """
+
+    @abstractmethod
+    def compact_range(self, start: bytes, stop: bytes) -> None:
+        """
+        压缩 [start, stop) 范围内的数据， 回收被删除的记录占用的空间
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        关闭存储引擎
+        """
@@ -28,6 +28,7 @@ from node.server import Server
 from utils import funcs
 from utils.b58code import Base58Code
 from utils import number_theory
+from utils import migration
 from rpc.rpcserver import RPCServer
 from threads.merge import MergeThread
 
@@ -83,7 +84,7 @@ def run():
                 core.block_chain, core.utxo, core.transaction, core.txmempool,
                 node.server, node.client, node.gossip,
                 threads.merge, threads.calculator,
-                utils.leveldb, utils.network,
+                utils.database, utils.network,
                 rrpc.node, rrpc.block, rrpc.address, rrpc.transaction
             ])).sort("ttot", "desc").print_all(f)
             # yappi.get_func_stats().sort("ttot", "desc").print_all(f)
@@ -153,14 +154,25 @@ def clear():
     db.delete('block_chain1')
 
 
+def migrate(path=None):
+    """
+    离线迁移数据目录， 需要在节点停止运行的情况下执行
+    :param path: leveldb 数据目录， 默认使用配置文件中的路径
+    :return:
+    """
+    setup_logger()
+    if path is None:
+        path = Config().get("leveldb.path")
+    migration.migrate(path)
+
+
 def get_tx_data(height):
     bc = BlockChain()
     heights = []
     result = []
 
-    for i in range(height):
+    for i, block in enumerate(bc.iter_blocks(0, height)):
         print(i)
-        block = bc.get_block_by_height(i)
         heights.append(i)
         result.append(len(block.transactions))
 
@@ -178,14 +190,13 @@ def get_timestamp(height):
     heights = []
     result = []
 
-    block = bc.get_block_by_height(0)
-    timestamp = int(block.block_header.timestamp)
+    block_header = bc.get_block_header_by_height(0)
+    timestamp = int(block_header.timestamp)
 
-    for i in range(1, height, 1):
-        block = bc.get_block_by_height(i)
+    for i, block_header in enumerate(bc.iter_blocks(1, height, headers_only=True), 1):
         heights.append(i)
-        result.append((int(block.block_header.timestamp) - timestamp) / 1000)
-        timestamp = int(block.block_header.timestamp)
+        result.append((int(block_header.timestamp) - timestamp) / 1000)
+        timestamp = int(block_header.timestamp)
 
     print("heights: ", height)
     print("result:", result)
@@ -12,12 +12,12 @@ from core.block_chain import BlockChain
 from core.config import Config
 from core.txmempool import TxMemPool
 from node.constants import STATUS
-from node.message import Message
+from node.message import Message, RawMessage
 from node.timer import Timer
 from threads.calculator import Calculator
 from threads.merge import MergeThread
 # from threads.vote_center import VoteCenter
-from utils.leveldb import LevelDB
+from utils.database import Database
 from utils.locks import package_lock, package_cond
 from utils.network import TCPConnect
 
@@ -48,6 +48,9 @@ class Client(object):
         # 最新区块的数据
         self.new_block = None
 
+        # 对端节点已经裁剪的区块高度， 对端没有裁剪或者没有请求过被裁剪的区块时为 -1
+        self.remote_pruned_height = -1
+
     def add_transaction(self, transaction):
         """
         添加交易到本地client, 即直接append到txs列表中
@@ -63,7 +66,7 @@ class Client(object):
         """
         # 解析得到接收的消息的数据
         rec_message = None
-        data = json.dumps(message.__dict__)
+        data = message.dumps()
 
         # 尝试发送数据，如果数据发送出现错误则说明链接存在问题，关闭链接
         try:
@@ -87,7 +90,7 @@ class Client(object):
             if isinstance(data, dict):
                 address = data.get('address', '')
                 if address != "":
-                    db = LevelDB()
+                    db = Database()
                     old_wallets = db.get('wallets')
 
                     if old_wallets is None:
@@ -254,6 +257,8 @@ class Client(object):
             self.handle_update(message)
         elif code == STATUS.BLOCK:
             self.handle_send_block(message)
+        elif code == STATUS.PRUNED:
+            self.handle_pruned(message)
 
     def handle_shake(self, message: dict):
         """
@@ -294,11 +299,26 @@ class Client(object):
 
         # 请求本地没有的区块
         start_height = 0 if local_height == -1 else local_height
+        self.remote_pruned_height = -1
         for i in range(start_height, remote_height + 1):
             logging.debug("Client pull block#{}.".format(i))
             send_msg = Message(STATUS.GET_BLOCK_MSG, i)
             self.send(send_msg)
 
+            # 对端节点已经裁剪了需要的区块， 不再从该节点拉取
+            if self.remote_pruned_height != -1:
+                break
+
+    def handle_pruned(self, message: dict):
+        """
+        状态码为STATUS.PRUNED = 7, 对端节点已经裁剪了请求的区块
+        :param message: 包含被裁剪区块高度的消息
+        :return: None
+        """
+        height = message.get('data', -1)
+        logging.info("Remote node pruned block#{}, pull from other nodes.".format(height))
+        self.remote_pruned_height = height
+
     def handle_get_block(self, message: dict):
         """
         状态码为STATUS.GET_BLOCK_MSG = 2, 处理服务器发送过来的区块数据
@@ -447,9 +467,10 @@ class Client(object):
 
         local_height = latest_block.block_header.height
         start_height = height + 1
-        for i in range(start_height, local_height + 1):
-            # logging.debug("Client send block #{}.".format(i))
-            block = bc.get_block_by_height(i)
+        for block in bc.iter_blocks(start_height, local_height + 1):
+            # 裁剪模式下更早的区块已经不存在， 对端需要从其他节点同步
+            if block is None:
+                break
             data = block.serialize()
             data['address'] = address
             data['time'] = time.time()
@@ -470,12 +491,12 @@ class Client(object):
             send_message = Message.empty_message()
             self.send(send_message)
             return
-        block = BlockChain().get_block_by_height(height)
+        block_data = BlockChain().get_block_data_by_height(height)
 
-        if block is None:
+        if block_data is None:
             send_message = Message.empty_message()
         else:
-            send_message = Message(STATUS.UPDATE_MSG, block.serialize())
+            send_message = RawMessage(STATUS.UPDATE_MSG, block_data)
 
         self.send(send_message)
 
@@ -10,3 +10,5 @@ class STATUS(object):
     SYNC_MSG = 4
     UPDATE_MSG = 5
     BLOCK = 6
+    # 请求的区块已经被裁剪， 需要向其他节点请求
+    PRUNED = 7
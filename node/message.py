@@ -1,3 +1,5 @@
+import json
+
 from node.constants import STATUS
 
 
@@ -9,3 +11,15 @@ class Message(object):
     @classmethod
     def empty_message(cls):
         return cls(STATUS.NODE_MSG, "0")
+
+    def dumps(self) -> str:
+        return json.dumps(self.__dict__)
+
+
+class RawMessage(Message):
+    """
+    data 是已经序列化好的 json 数据（bytes）， 发送时直接拼接到消息中， 不需要再次解码和编码
+    """
+
+    def dumps(self) -> str:
+        return '{"code": %d, "data": %s}' % (self.code, self.data.decode())
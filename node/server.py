@@ -10,12 +10,13 @@ from core.block_chain import BlockChain
 from core.config import Config
 from core.txmempool import TxMemPool
 from node.constants import STATUS
-from node.message import Message
+from node.message import Message, RawMessage
 from node.timer import Timer
 from threads.calculator import Calculator
 # from threads.counter import Counter
 from threads.merge import MergeThread
 # from threads.vote_center import VoteCenter
+from utils.database import Database
 from utils.locks import package_lock, package_cond
 from utils.network import TCPConnect
 
@@ -167,7 +168,7 @@ class Server(object):
             result_message = self.handle_send_block(message)
         else:
             result_message = Message.empty_message()
-        return json.dumps(result_message.__dict__)
+        return result_message.dumps()
 
     # @staticmethod
     # def check_vote_synced(vote_data):
@@ -337,14 +338,15 @@ class Server(object):
         """
         height = message.get("data", 1)
         bc = BlockChain()
-        block = bc.get_block_by_height(height)
-        try:
-            result_data = block.serialize()
-            # logging.debug("Return get block message: {}".format(result_data))
-        except AttributeError:
+        if bc.is_pruned(height):
+            # 区块内容已经被裁剪， 对端需要向其他节点请求
+            return Message(STATUS.PRUNED, height)
+
+        block_data = bc.get_block_data_by_height(height, Database().snapshot())
+        if block_data is None:
             result = Message.empty_message()
         else:
-            result = Message(STATUS.GET_BLOCK_MSG, result_data)
+            result = RawMessage(STATUS.GET_BLOCK_MSG, block_data)
         return result
 
     # def handle_sync_vote(self, message: dict):
@@ -420,11 +422,14 @@ class Server(object):
             send_message = Message.empty_message()
             return send_message
 
-        block = BlockChain().get_block_by_height(height)
+        if BlockChain().is_pruned(height):
+            return Message(STATUS.PRUNED, height)
+
+        block_data = BlockChain().get_block_data_by_height(height, Database().snapshot())
 
-        if block is None:
+        if block_data is None:
             send_message = Message.empty_message()
         else:
-            send_message = Message(STATUS.GET_BLOCK_MSG, block.serialize())
+            send_message = RawMessage(STATUS.GET_BLOCK_MSG, block_data)
 
         return send_message
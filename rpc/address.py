@@ -1,23 +1,68 @@
+import itertools
 import json
 import logging
+import struct
 
 from core.utxo import UTXOSet
 from rpc.grpcs import address_pb2
 from rpc.grpcs import address_pb2_grpc
 
 
+def page_args(request) -> (tuple, int):
+    """
+    请求中的分页参数， 返回 (游标, 最多返回的数量)， 没有传入的参数为空
+    """
+    after = (request.after_tx_hash, request.after_index) if request.HasField("after_tx_hash") else None
+    limit = request.limit if request.HasField("limit") else None
+    return after, limit
+
+
 class AddressService(address_pb2_grpc.AddressServicer):
     def get_address_utxo(self, request, context):
+        """
+        查询地址的 UTxO， 结果按照 UTxO 的 key 排序并编码为一个 JSON 列表，
+        可以传入上一页最后一个 UTxO 作为游标和数量限制分页查询
+        """
         address = request.address
 
         if address is None:
             logging.error("RPC receive error address.")
 
         utxo_set = UTXOSet()
+        after, limit = page_args(request)
 
-        result = utxo_set.find_utxo(address)
-        utxo: dict
+        try:
+            result = utxo_set.find_utxo(address, True, after, limit, request.min_value)
+        except (ValueError, struct.error):
+            logging.error("RPC receive error utxo cursor or limit.")
+            return address_pb2.UtxoRespond(status=-1)
 
         return address_pb2.UtxoRespond(utxos=json.dumps(result))
 
+    def stream_address_utxo(self, request, context):
+        """
+        流式返回地址的 UTxO， 每个 UTxO 一条消息， 边读取边发送， 占用的内存和地址的 UTxO 数量无关
+        分页参数和 get_address_utxo 相同， 参数错误时只返回一条 status 为 -1 的消息
+        """
+        after, limit = page_args(request)
+        utxos = UTXOSet().scan_utxo(request.address, True, after, request.min_value)
+
+        try:
+            for utxo in itertools.islice(utxos, limit):
+                yield address_pb2.UtxoStreamRespond(status=0, tx_hash=utxo["tx_hash"], index=utxo["index"],
+                                                    value=utxo["value"])
+        except (ValueError, struct.error):
+            logging.error("RPC receive error utxo cursor or limit.")
+            yield address_pb2.UtxoStreamRespond(status=-1)
+
+    def get_balance(self, request, context):
+        """
+        查询地址的余额和 UTxO 数量， 只读取一条余额记录， 和地址的 UTxO 数量无关
+        """
+        address = request.address
+        if not address:
+            logging.error("RPC receive error address.")
+            return address_pb2.BalanceRespond(status=-1)
 
+        balance = UTXOSet().get_balance(address, True)
+        return address_pb2.BalanceRespond(status=0, value=balance["value"], count=balance["count"])
@@ -1,6 +1,7 @@
 import json
 
 from core.block_chain import BlockChain
+from utils.database import Database
 from rpc.grpcs import block_pb2
 from rpc.grpcs import block_pb2_grpc
 
@@ -23,15 +24,17 @@ class BlockService(block_pb2_grpc.BlockServicer):
 
         bc = BlockChain()
         block = None
+        # 从最近一次提交的快照中读取， 不会读到正在写入的区块
+        snapshot = Database().snapshot()
 
         if request_type == block_pb2.HEIGHT:
             height = request.height
-            block = bc.get_block_by_height(height)
+            block = bc.get_block_by_height(height, snapshot)
         elif request_type == block_pb2.HASH:
             block_hash = request.hash
-            block = bc.get_block_by_hash(block_hash)
+            block = bc.get_block_by_hash(block_hash, snapshot)
         elif request_type == block_pb2.LATEST:
-            block, _ = bc.get_latest_block()
+            block, _ = bc.get_latest_block(snapshot)
 
         if block is not None:
             result = block.serialize()
@@ -14,12 +14,15 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x18rpc/protos/address.proto\"/\n\x0bUtxoRequest\x12\x14\n\x07\x61\x64\x64ress\x18\x01 \x01(\tH\x00\x88\x01\x01\x42\n\n\x08_address\"K\n\x0bUtxoRespond\x12\x13\n\x06status\x18\x01 \x01(\x05H\x00\x88\x01\x01\x12\x12\n\x05utxos\x18\x02 \x01(\tH\x01\x88\x01\x01\x42\t\n\x07_statusB\x08\n\x06_utxos29\n\x07\x41\x64\x64ress\x12.\n\x10get_address_utxo\x12\x0c.UtxoRequest\x1a\x0c.UtxoRespondb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x18rpc/protos/address.proto\"\xcb\x01\n\x0bUtxoRequest\x12\x14\n\x07\x61\x64\x64ress\x18\x01 \x01(\tH\x00\x88\x01\x01\x12\x1a\n\rafter_tx_hash\x18\x02 \x01(\tH\x01\x88\x01\x01\x12\x18\n\x0b\x61\x66ter_index\x18\x03 \x01(\x05H\x02\x88\x01\x01\x12\x12\n\x05limit\x18\x04 \x01(\x05H\x03\x88\x01\x01\x12\x16\n\tmin_value\x18\x05 \x01(\x03H\x04\x88\x01\x01\x42\n\n\x08_addressB\x10\n\x0e_after_tx_hashB\x0e\n\x0c_after_indexB\x08\n\x06_limitB\x0c\n\n_min_value\"K\n\x0bUtxoRespond\x12\x13\n\x06status\x18\x01 \x01(\x05H\x00\x88\x01\x01\x12\x12\n\x05utxos\x18\x02 \x01(\tH\x01\x88\x01\x01\x42\t\n\x07_statusB\x08\n\x06_utxos\"2\n\x0e\x42\x61lanceRequest\x12\x14\n\x07\x61\x64\x64ress\x18\x01 \x01(\tH\x00\x88\x01\x01\x42\n\n\x08_address\"l\n\x0e\x42\x61lanceRespond\x12\x13\n\x06status\x18\x01 \x01(\x05H\x00\x88\x01\x01\x12\x12\n\x05value\x18\x02 \x01(\x03H\x01\x88\x01\x01\x12\x12\n\x05\x63ount\x18\x03 \x01(\x03H\x02\x88\x01\x01\x42\t\n\x07_statusB\x08\n\x06_valueB\x08\n\x06_count\"\x91\x01\n\x11UtxoStreamRespond\x12\x13\n\x06status\x18\x01 \x01(\x05H\x00\x88\x01\x01\x12\x14\n\x07tx_hash\x18\x02 \x01(\tH\x01\x88\x01\x01\x12\x12\n\x05index\x18\x03 \x01(\x05H\x02\x88\x01\x01\x12\x12\n\x05value\x18\x04 \x01(\x03H\x03\x88\x01\x01\x42\t\n\x07_statusB\n\n\x08_tx_hashB\x08\n\x06_indexB\x08\n\x06_value2\xa5\x01\n\x07\x41\x64\x64ress\x12.\n\x10get_address_utxo\x12\x0c.UtxoRequest\x1a\x0c.UtxoRespond\x12/\n\x0bget_balance\x12\x0f.BalanceRequest\x1a\x0f.BalanceRespond\x12\x39\n\x13stream_address_utxo\x12\x0c.UtxoRequest\x1a\x12.UtxoStreamRespond0\x01\x62\x06proto3')
 
 
 
 _UTXOREQUEST = DESCRIPTOR.message_types_by_name['UtxoRequest']
 _UTXORESPOND = DESCRIPTOR.message_types_by_name['UtxoRespond']
+_BALANCEREQUEST = DESCRIPTOR.message_types_by_name['BalanceRequest']
+_BALANCERESPOND = DESCRIPTOR.message_types_by_name['BalanceRespond']
+_UTXOSTREAMRESPOND = DESCRIPTOR.message_types_by_name['UtxoStreamRespond']
 UtxoRequest = _reflection.GeneratedProtocolMessageType('UtxoRequest', (_message.Message,), {
   'DESCRIPTOR' : _UTXOREQUEST,
   '__module__' : 'rpc.protos.address_pb2'
@@ -34,14 +37,41 @@ UtxoRespond = _reflection.GeneratedProtocolMessageType('UtxoRespond', (_message.
   })
 _sym_db.RegisterMessage(UtxoRespond)
 
+BalanceRequest = _reflection.GeneratedProtocolMessageType('BalanceRequest', (_message.Message,), {
+  'DESCRIPTOR' : _BALANCEREQUEST,
+  '__module__' : 'rpc.protos.address_pb2'
+  # @@protoc_insertion_point(class_scope:BalanceRequest)
+  })
+_sym_db.RegisterMessage(BalanceRequest)
+
+BalanceRespond = _reflection.GeneratedProtocolMessageType('BalanceRespond', (_message.Message,), {
+  'DESCRIPTOR' : _BALANCERESPOND,
+  '__module__' : 'rpc.protos.address_pb2'
+  # @@protoc_insertion_point(class_scope:BalanceRespond)
+  })
+_sym_db.RegisterMessage(BalanceRespond)
+
+UtxoStreamRespond = _reflection.GeneratedProtocolMessageType('UtxoStreamRespond', (_message.Message,), {
+  'DESCRIPTOR' : _UTXOSTREAMRESPOND,
+  '__module__' : 'rpc.protos.address_pb2'
+  # @@protoc_insertion_point(class_scope:UtxoStreamRespond)
+  })
+_sym_db.RegisterMessage(UtxoStreamRespond)
+
 _ADDRESS = DESCRIPTOR.services_by_name['Address']
 if _descriptor._USE_C_DESCRIPTORS == False:
 
   DESCRIPTOR._options = None
-  _UTXOREQUEST._serialized_start=28
-  _UTXOREQUEST._serialized_end=75
-  _UTXORESPOND._serialized_start=77
-  _UTXORESPOND._serialized_end=152
-  _ADDRESS._serialized_start=154
-  _ADDRESS._serialized_end=211
+  _UTXOREQUEST._serialized_start=29
+  _UTXOREQUEST._serialized_end=232
+  _UTXORESPOND._serialized_start=234
+  _UTXORESPOND._serialized_end=309
+  _BALANCEREQUEST._serialized_start=311
+  _BALANCEREQUEST._serialized_end=361
+  _BALANCERESPOND._serialized_start=363
+  _BALANCERESPOND._serialized_end=471
+  _UTXOSTREAMRESPOND._serialized_start=474
+  _UTXOSTREAMRESPOND._serialized_end=619
+  _ADDRESS._serialized_start=622
+  _ADDRESS._serialized_end=787
 # @@protoc_insertion_point(module_scope)
@@ -19,6 +19,16 @@ class AddressStub(object):
                 request_serializer=rpc_dot_protos_dot_address__pb2.UtxoRequest.SerializeToString,
                 response_deserializer=rpc_dot_protos_dot_address__pb2.UtxoRespond.FromString,
                 )
+        self.get_balance = channel.unary_unary(
+                '/Address/get_balance',
+                request_serializer=rpc_dot_protos_dot_address__pb2.BalanceRequest.SerializeToString,
+                response_deserializer=rpc_dot_protos_dot_address__pb2.BalanceRespond.FromString,
+                )
+        self.stream_address_utxo = channel.unary_stream(
+                '/Address/stream_address_utxo',
+                request_serializer=rpc_dot_protos_dot_address__pb2.UtxoRequest.SerializeToString,
+                response_deserializer=rpc_dot_protos_dot_address__pb2.UtxoStreamRespond.FromString,
+                )
 
 
 class AddressServicer(object):
@@ -30,6 +40,18 @@ class AddressServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def get_balance(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def stream_address_utxo(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_AddressServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -38,6 +60,16 @@ def add_AddressServicer_to_server(servicer, server):
                     request_deserializer=rpc_dot_protos_dot_address__pb2.UtxoRequest.FromString,
                     response_serializer=rpc_dot_protos_dot_address__pb2.UtxoRespond.SerializeToString,
             ),
+            'get_balance': grpc.unary_unary_rpc_method_handler(
+                    servicer.get_balance,
+                    request_deserializer=rpc_dot_protos_dot_address__pb2.BalanceRequest.FromString,
+                    response_serializer=rpc_dot_protos_dot_address__pb2.BalanceRespond.SerializeToString,
+            ),
+            'stream_address_utxo': grpc.unary_stream_rpc_method_handler(
+                    servicer.stream_address_utxo,
+                    request_deserializer=rpc_dot_protos_dot_address__pb2.UtxoRequest.FromString,
+                    response_serializer=rpc_dot_protos_dot_address__pb2.UtxoStreamRespond.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'Address', rpc_method_handlers)
@@ -64,3 +96,37 @@ class Address(object):
             rpc_dot_protos_dot_address__pb2.UtxoRespond.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def get_balance(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Address/get_balance',
+            rpc_dot_protos_dot_address__pb2.BalanceRequest.SerializeToString,
+            rpc_dot_protos_dot_address__pb2.BalanceRespond.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def stream_address_utxo(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/Address/stream_address_utxo',
+            rpc_dot_protos_dot_address__pb2.UtxoRequest.SerializeToString,
+            rpc_dot_protos_dot_address__pb2.UtxoStreamRespond.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
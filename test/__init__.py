@@ -0,0 +1,10 @@
+import atexit
+import shutil
+import tempfile
+
+from core.config import Config
+
+# 区块文件和区块头索引写入临时目录， 不留在测试的工作目录中
+_DATA_DIR = tempfile.mkdtemp(prefix="chronos-test-")
+Config().set("storage.data_dir", _DATA_DIR)
+atexit.register(shutil.rmtree, _DATA_DIR, True)
@@ -1,5 +1,6 @@
 import unittest
 
 if __name__ == "__main__":
-    discover = unittest.defaultTestLoader.discover("./", "test*.py")
-    unittest.TextTestRunner().run(discover)
\ No newline at end of file
+    # 以项目根目录为顶层目录， 测试模块作为 test 包导入， 先执行 test/__init__.py 中的配置
+    discover = unittest.defaultTestLoader.discover("./", "test*.py", top_level_dir="..")
+    unittest.TextTestRunner().run(discover)
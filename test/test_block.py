@@ -0,0 +1,87 @@
+import unittest
+
+from core.block import Block, LazyTransactions
+from core.block_header import BlockHeader
+from core.transaction import Transaction, TxOutput
+
+
+def make_tx(idx: int) -> Transaction:
+    tx = Transaction([], [TxOutput(idx, "{:040x}".format(idx))])
+    tx.set_id()
+    return tx
+
+
+class TestLazyBlock(unittest.TestCase):
+
+    def setUp(self):
+        header = BlockHeader("", 1, "00" * 32)
+        header.set_hash()
+        self.txs = [make_tx(idx) for idx in range(10)]
+        self.data = Block(header, self.txs).serialize()
+
+    def test_decode_on_access(self):
+        block = Block.deserialize(self.data)
+        transactions = block.transactions
+
+        self.assertIsInstance(transactions, LazyTransactions)
+        self.assertEqual(block.block_header.height, 1)
+        self.assertEqual(len(transactions), 10)
+        self.assertEqual(block.tx_hashes(), [tx.tx_hash for tx in self.txs])
+        self.assertEqual(transactions.decoded_count, 0)
+
+        self.assertEqual(transactions[3].tx_hash, self.txs[3].tx_hash)
+        self.assertEqual(transactions[-1].tx_hash, self.txs[-1].tx_hash)
+        self.assertIs(transactions[3], transactions[3])
+        self.assertEqual(transactions.decoded_count, 2)
+        self.assertRaises(IndexError, transactions.__getitem__, 10)
+
+        self.assertEqual([tx.tx_hash for tx in transactions[::5]], [self.txs[0].tx_hash, self.txs[5].tx_hash])
+        self.assertEqual([tx.tx_hash for tx in transactions], [tx.tx_hash for tx in self.txs])
+        self.assertEqual(transactions.decoded_count, 10)
+
+    def test_serialize(self):
+        block = Block.deserialize(self.data)
+        block.transactions[0]
+        self.assertEqual(block.serialize(), self.data)
+        self.assertEqual(block.serialize_compact()["tx_hashes"], [tx.tx_hash for tx in self.txs])
+
+    def test_compact(self):
+        compact = Block(Block.deserialize(self.data).block_header, self.txs).serialize_compact()
+        records = [self.txs[0]] + [tx.serialize() for tx in self.txs[1:]]
+        block = Block.deserialize(compact, records)
+
+        self.assertIs(block.transactions[0], self.txs[0])
+        self.assertEqual(block.transactions[1].tx_hash, self.txs[1].tx_hash)
+        self.assertEqual(block.serialize(), self.data)
+
+
+class TestValueObjects(unittest.TestCase):
+
+    def test_serialize_copy(self):
+        tx = make_tx(1)
+        data = tx.serialize()
+        data["outputs"][0]["value"] = 100
+        self.assertEqual(tx.outputs[0].value, 1)
+        self.assertFalse(hasattr(tx.outputs[0], "__dict__"))
+
+        header = BlockHeader("", 1, "00" * 32)
+        header.serialize()["height"] = 2
+        self.assertEqual(header.height, 1)
+        self.assertEqual(list(header.serialize()), list(BlockHeader.FIELDS))
+
+    def test_round_trip(self):
+        data = {
+            "tx_hash": "ab" * 32,
+            "inputs": [
+                {"tx_hash": "", "index": -1, "signature": "", "pub_key": "01", "vote_info": {"a": 1},
+                 "delay_params": {}},
+                {"tx_hash": "cd" * 32, "index": 0, "signature": "02", "pub_key": "03", "unknown": 1}
+            ],
+            "outputs": [{"value": 5, "pub_key_hash": "04"}]
+        }
+        tx = Transaction.deserialize(data)
+
+        self.assertEqual(tx.inputs[0].vote_info, {"a": 1})
+        self.assertEqual(tx.inputs[1].serialize(), {"tx_hash": "cd" * 32, "index": 0, "signature": "02",
+                                                    "pub_key": "03"})
+        self.assertEqual(tx.outputs[0].serialize(), data["outputs"][0])
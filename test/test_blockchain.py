@@ -1,8 +1,12 @@
 import binascii
+import itertools
 import unittest
+from unittest import mock
 
 from core.transaction import Transaction
-from utils.leveldb import LevelDB
+from utils.database import Database
+from utils.convertor import NS_BLOCK, hash_to_key
+from utils.errors import StorageWriterError
 from core.utxo import UTXOSet
 from core.txmempool import TxMemPool
 from core.block_chain import BlockChain
@@ -76,4 +80,126 @@ class TestBlockchain(unittest.TestCase):
         UTXOSet().roll_back(block, bc)
         bc.roll_back()
         block, latest_hash = bc.get_latest_block()
-        self.assertEqual(height - 1, block.height)
\ No newline at end of file
+        self.assertEqual(height - 1, block.height)
+
+    def test_4_connect_disconnect(self):
+        bc = BlockChain()
+        new_block = bc.package_new_block([], {}, {})
+        bc.insert_block(new_block)
+
+        self.assertEqual(UTXOSet().get_latest_height(), new_block.height)
+
+        bc.disconnect_block()
+        block, latest_hash = bc.get_latest_block()
+        self.assertEqual(new_block.height - 1, block.height)
+        self.assertEqual(UTXOSet().get_latest_height(), block.height)
+        self.assertEqual(bc.get_block_by_hash(new_block.block_header.hash), None)
+        self.assertEqual(bc.get_block_by_height(new_block.height), None)
+
+    def test_5_compact_block(self):
+        bc = BlockChain()
+        new_block = bc.package_new_block([], {}, {})
+        bc.insert_block(new_block)
+
+        # 区块记录中只存储交易哈希， 交易内容从交易表中读取
+        data = Database().namespace(NS_BLOCK)[hash_to_key(new_block.block_header.hash)]
+        self.assertEqual(data["tx_hashes"], [tx.tx_hash for tx in new_block.transactions])
+        self.assertNotIn("transactions", data)
+
+        block = bc.get_block_by_height(new_block.height)
+        self.assertEqual([tx.tx_hash for tx in block.transactions], data["tx_hashes"])
+
+    def test_6_snapshot(self):
+        bc = BlockChain()
+        snapshot = Database().snapshot()
+        latest_block, _ = bc.get_latest_block(snapshot)
+
+        new_block = bc.package_new_block([], {}, {})
+        bc.insert_block(new_block)
+        Database().flush()
+
+        # 快照固定在创建时的区块高度
+        block, _ = bc.get_latest_block(snapshot)
+        self.assertEqual(block.height, latest_block.height)
+        self.assertIsNone(bc.get_block_by_height(new_block.height, snapshot))
+
+        snapshot = Database().snapshot()
+        block, _ = bc.get_latest_block(snapshot)
+        self.assertEqual(block.height, new_block.height)
+
+        address = new_block.transactions[0].outputs[0].pub_key_hash
+        self.assertEqual(UTXOSet().find_utxo(address, True), UTXOSet().find_utxo(address))
+
+    def test_7_header_index(self):
+        bc = BlockChain()
+        latest_block, latest_hash = bc.get_latest_block()
+        height = latest_block.height
+
+        header = bc.get_block_header_by_height(height)
+        self.assertEqual(header.serialize(), latest_block.block_header.serialize())
+        self.assertEqual(bc.get_height_by_hash(latest_hash), height)
+
+        # 从区块表重建之后和原来的索引一致
+        headers = [bc.get_block_header_by_height(idx).serialize() for idx in range(height + 1)]
+        bc.rebuild_header_index()
+        self.assertEqual([bc.get_block_header_by_height(idx).serialize() for idx in range(height + 1)], headers)
+
+        bc.disconnect_block()
+        self.assertIsNone(bc.get_height_by_hash(latest_hash))
+        self.assertIsNone(bc.get_block_header_by_height(height))
+
+    def test_8_iter_blocks(self):
+        bc = BlockChain()
+        for _ in range(40):
+            bc.insert_block(bc.package_new_block([], {}, {}))
+        latest_block, _ = bc.get_latest_block()
+        height = latest_block.height
+
+        expected = [bc.get_block_by_height(idx).block_header.hash for idx in range(height + 1)]
+        self.assertEqual([block.block_header.hash for block in bc.iter_blocks()], expected)
+        self.assertEqual([block.block_header.hash for block in bc.iter_blocks(1, None, 3)], expected[1::3])
+        self.assertEqual([block.block_header.hash for block in bc.iter_blocks(height, -1, -1)], expected[::-1])
+        self.assertEqual([header.hash for header in bc.iter_blocks(headers_only=True)], expected)
+        self.assertEqual(list(bc.iter_blocks(height + 1, height + 10)), [])
+
+        Database().flush()
+        snapshot = Database().snapshot()
+        self.assertEqual([block.block_header.hash for block in bc.iter_blocks(snapshot=snapshot)], expected)
+        self.assertRaises(ValueError, list, bc.iter_blocks(0, 1, 0))
+
+    def test_9_resolve_outpoints(self):
+        bc = BlockChain()
+        latest_block, _ = bc.get_latest_block()
+        tx = latest_block.transactions[0]
+
+        outputs = bc.resolve_outpoints([(tx.tx_hash, 0), (tx.tx_hash, 0), (tx.tx_hash, 9), ("zz", 0)])
+        self.assertEqual(list(outputs), [(tx.tx_hash, 0)])
+        self.assertEqual(outputs[(tx.tx_hash, 0)].serialize(), tx.outputs[0].serialize())
+
+        # 只有 coinbase 交易的区块不需要校验签名
+        self.assertTrue(bc.verify_block(latest_block))
+        self.assertFalse(bc.verify_transaction(tx))
+
+    def test_9_rollback_failed_insert(self):
+        bc = BlockChain()
+        latest_block, _ = bc.get_latest_block()
+        utxo_set = UTXOSet()
+        height = utxo_set.get_latest_height()
+        flushed_height = utxo_set.get_flushed_height()
+        address = latest_block.transactions[0].outputs[0].pub_key_hash
+        utxos = utxo_set.find_utxo(address)
+
+        # 写入单元在 UTxO 集合写入修改之后出错， 整个写入单元被丢弃， 之后重新连接的区块不写入修改
+        new_block = bc.package_new_block([], {}, {})
+        should_flush = itertools.chain([True], itertools.repeat(False))
+        with mock.patch.object(UTXOSet, "_UTXOSet__should_flush", side_effect=should_flush), \
+                mock.patch.object(BlockChain, "set_latest_hash", side_effect=StorageWriterError("injected")):
+            self.assertRaises(StorageWriterError, bc.insert_block, new_block)
+
+        self.assertEqual(utxo_set.get_latest_height(), height)
+        self.assertEqual(utxo_set.get_flushed_height(), flushed_height)
+        self.assertEqual(utxo_set.find_utxo(address), utxos)
+        self.assertEqual(utxo_set.get_outputs({(new_block.transactions[0].tx_hash, 0)}), {})
+
+        bc.insert_block(new_block)
+        self.assertEqual(utxo_set.get_latest_height(), new_block.height)
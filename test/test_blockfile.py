@@ -0,0 +1,50 @@
+import json
+import unittest
+
+from utils.blockfile import BlockFile, pack_location, unpack_location
+
+
+class TestBlockFile(unittest.TestCase):
+
+    def setUp(self):
+        self.block_file = BlockFile()
+        self.block_file.close()
+        self.block_file.open()
+
+    def tearDown(self):
+        self.block_file.close()
+
+    def test_append_read(self):
+        data = json.dumps({"height": 1, "transactions": []}).encode()
+        location = self.block_file.append(data)
+
+        self.assertEqual(self.block_file.read(location), data)
+        self.assertEqual(unpack_location(pack_location(*location)), location)
+
+    def test_rotate(self):
+        # 测试配置中分段文件的大小为 4096 字节
+        locations = [self.block_file.append(bytes([idx]) * 1000) for idx in range(10)]
+
+        self.assertGreater(self.block_file.position[0], 0)
+        for idx, location in enumerate(locations):
+            self.assertEqual(self.block_file.read(location), bytes([idx]) * 1000)
+
+    def test_truncate_uncommitted(self):
+        location = self.block_file.append(b"committed")
+        position = self.block_file.position
+        self.block_file.append(b"uncommitted")
+        self.block_file.close()
+
+        # 重新打开时丢弃写入位置之后的数据
+        self.block_file.open(position)
+        self.assertEqual(self.block_file.position, position)
+        self.assertEqual(self.block_file.read(location), b"committed")
+
+    def test_invalid_location(self):
+        location = self.block_file.append(b"block")
+        with self.assertRaises(ValueError):
+            self.block_file.read((location[0], location[1] + 1, location[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from utils.cache import SizedLRU, estimate_size
+
+
+class Item(object):
+    __slots__ = ("payload",)
+
+    def __init__(self, payload):
+        self.payload = payload
+
+
+class TestSizedLRU(unittest.TestCase):
+
+    def test_evict_by_budget(self):
+        cache = SizedLRU("test", 100)
+        for idx in range(5):
+            cache.put(idx, idx, 30)
+
+        # 只能容纳 3 个条目， 最早写入的被淘汰
+        self.assertEqual(len(cache), 3)
+        self.assertNotIn(0, cache)
+        self.assertNotIn(1, cache)
+
+        # 读取之后变为最近使用， 下一次淘汰 3
+        self.assertEqual(cache[2], 2)
+        cache.put(5, 5, 30)
+        self.assertIn(2, cache)
+        self.assertNotIn(3, cache)
+
+        stats = cache.stats()
+        self.assertEqual(stats["entries"], 3)
+        self.assertEqual(stats["bytes"], 90)
+        self.assertEqual(stats["evictions"], 3)
+
+    def test_replace_and_pop(self):
+        cache = SizedLRU("test", 100)
+        cache.put("a", 1, 40)
+        cache.put("a", 2, 50)
+        self.assertEqual(cache.stats()["bytes"], 50)
+
+        self.assertEqual(cache.pop("a"), 2)
+        self.assertIsNone(cache.pop("a"))
+        self.assertEqual(cache.stats()["bytes"], 0)
+
+        # 超过预算的条目不放入缓存
+        cache.put("b", 1, 101)
+        self.assertNotIn("b", cache)
+        self.assertRaises(KeyError, cache.__getitem__, "b")
+
+    def test_hit_rate(self):
+        cache = SizedLRU("test", 1024)
+        cache["a"] = "value"
+        cache.get("a")
+        cache.get("b")
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(cache.hit_rate(), 0.5)
+
+    def test_estimate_size(self):
+        small = estimate_size(Item("a"))
+        large = estimate_size(Item({"data": ["a" * 1000, "b" * 1000]}))
+        self.assertGreater(large - small, 2000)
+
+        # 同一个对象只计算一次
+        shared = "c" * 1000
+        self.assertLess(estimate_size([shared, shared]), estimate_size([shared, "d" * 1000]))
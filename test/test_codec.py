@@ -0,0 +1,62 @@
+import json
+import unittest
+
+from utils import codec
+
+
+class TestCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.tx = {
+            "tx_hash": "ab" * 32,
+            "inputs": [{
+                "tx_hash": "",
+                "index": -1,
+                "signature": "",
+                "pub_key": "cd" * 64,
+                "vote_info": {},
+                "delay_params": {"seed": "0f", "proof": "10"}
+            }],
+            "outputs": [{"value": 100000000, "pub_key_hash": "1PuRN6PvTfhVazxoK8zZ3eFvTUSU76VHRF"}]
+        }
+        self.block = {
+            "magic_no": "0xD9B4BEF9",
+            "block_header": {
+                "timestamp": "1666000000000",
+                "prev_block_hash": "",
+                "hash": "ef" * 32,
+                "hash_merkle_root": "12" * 32,
+                "height": 0,
+                "nonce": None
+            },
+            "transactions": [self.tx]
+        }
+
+    def test_round_trip(self):
+        utxo = {"value": 1, "pub_key_hash": "address", "index": 0, "tx_hash": "ab" * 32}
+        block_ref = {
+            "magic_no": self.block["magic_no"],
+            "block_header": self.block["block_header"],
+            "tx_hashes": [self.tx["tx_hash"]]
+        }
+        for value in (self.block, block_ref, self.tx, utxo, {"hash": "ab" * 32}, "ab" * 32, {"utxos": ["utxo#1"]}):
+            data = codec.encode(value)
+            self.assertTrue(codec.is_binary(data))
+            self.assertEqual(codec.decode(data), value)
+
+    def test_binary_smaller_than_json(self):
+        self.assertLess(len(codec.encode(self.block)), len(json.dumps(self.block)))
+
+    def test_unexpected_fields_kept(self):
+        # 大写的十六进制、多余的字段都需要原样保留
+        self.tx["tx_hash"] = "AB" * 32
+        self.tx["outputs"][0]["extra"] = 1
+        self.assertEqual(codec.decode(codec.encode(self.tx)), self.tx)
+
+    def test_read_json_record(self):
+        for value in (self.block, {"hash": "ab" * 32}, "ab" * 32):
+            self.assertEqual(codec.decode(bytes(json.dumps(value), "utf-8")), value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+
+from core.block import Block
+from core.block_header import BlockHeader
+from core.coins import CoinsViewCache
+from core.transaction import Transaction, TxInput, TxOutput
+from core.utxo import UTXOSet
+from utils.convertor import outpoint_to_key, NS_UTXO, NS_META, META_UTXO_HEIGHT
+from utils.database import Database
+
+
+def make_utxo(idx: int, address: str = "address") -> (bytes, dict):
+    tx_hash = "{:064x}".format(idx)
+    return outpoint_to_key(tx_hash, 0), {"value": idx, "pub_key_hash": address, "index": 0, "tx_hash": tx_hash}
+
+
+def make_block(height: int, txs: list) -> Block:
+    block = Block(BlockHeader("", height), txs)
+    block.set_header_hash()
+    return block
+
+
+class TestCoinsViewCache(unittest.TestCase):
+
+    def test_fresh(self):
+        view = CoinsViewCache()
+        key, utxo = make_utxo(1)
+
+        view.add(key, utxo)
+        self.assertEqual(view.lookup(key), (True, utxo))
+        self.assertGreater(view.bytes, 0)
+
+        # 写入之前产生并使用的输出不会写入数据库
+        view.spend(key, utxo)
+        self.assertEqual(view.lookup(key), (False, None))
+        self.assertEqual(view.changes(), [])
+        self.assertEqual(view.bytes, 0)
+        self.assertEqual(view.address_entries("address"), {})
+
+    def test_add_stored(self):
+        view = CoinsViewCache()
+        key, utxo = make_utxo(3)
+
+        # 覆盖数据库中未使用的输出， 使用之后需要从数据库中删除
+        view.add(key, utxo, True)
+        view.spend(key, utxo)
+        self.assertEqual(view.changes(), [(key, utxo, True)])
+
+    def test_balance(self):
+        view = CoinsViewCache()
+        key, utxo = make_utxo(5)
+        other_key, other = make_utxo(6)
+
+        self.assertEqual(view.missing_balances(["address", "other"]), ["address", "other"])
+        view.set_balances({"address": (10, 1)})
+        self.assertEqual(view.missing_balances(["address", "other"]), ["other"])
+
+        view.add(key, utxo)
+        view.add(other_key, other)
+        view.spend(key, utxo)
+        # 覆盖未使用的输出时余额不变
+        view.add(other_key, other)
+        self.assertEqual(view.balance("address"), (16, 2))
+        # 已经加载的余额不会被覆盖
+        view.set_balances({"address": (0, 0)})
+        self.assertEqual(view.balances(), {"address": (16, 2)})
+        self.assertIsNone(view.balance("other"))
+
+    def test_spend_stored(self):
+        view = CoinsViewCache()
+        key, utxo = make_utxo(2)
+
+        view.spend(key, utxo)
+        self.assertEqual(view.lookup(key), (True, None))
+        self.assertEqual(view.changes(), [(key, utxo, True)])
+        self.assertEqual(view.address_entries("address"), {key: None})
+
+        # 回滚时恢复的输出在数据库中还存在， 需要写入
+        view.add(key, utxo)
+        self.assertEqual(view.changes(), [(key, utxo, False)])
+        view.spend(key, utxo)
+        self.assertEqual(view.changes(), [(key, utxo, True)])
+
+        view.clear()
+        self.assertEqual(len(view), 0)
+        self.assertEqual(view.stats(), {"entries": 0, "spent": 0, "balances": 0, "bytes": 0, "blocks": 0})
+
+
+class TestUTxOFlush(unittest.TestCase):
+
+    def test_flush(self):
+        utxo_set = UTXOSet()
+        utxos = Database().namespace(NS_UTXO)
+        height = utxo_set.get_latest_height()
+        utxo_set.flush()
+
+        coinbase = Transaction([TxInput("", -1)], [TxOutput(idx, "flush address") for idx in range(2)])
+        coinbase.set_id()
+        spend = Transaction([TxInput(coinbase.tx_hash, 0)], [TxOutput(3, "flush address")])
+        spend.set_id()
+        created = outpoint_to_key(coinbase.tx_hash, 0)
+
+        try:
+            utxo_set.update(make_block(height + 1, [coinbase]))
+            self.assertEqual(utxo_set.get_cache_stats()["utxo_view"]["blocks"], 1)
+            # 没有写入之前从写回缓存中读取
+            self.assertIsNone(utxos.get(created))
+            self.assertIn((coinbase.tx_hash, 0), utxo_set.get_outputs([(coinbase.tx_hash, 0)]))
+
+            utxo_set.update(make_block(height + 2, [spend]))
+            self.assertEqual(utxo_set.get_outputs([(coinbase.tx_hash, 0)]), {})
+            expected = [(coinbase.tx_hash, 1), (spend.tx_hash, 0)]
+            self.assertEqual(sorted((tx_hash, idx) for tx_hash, idx, _ in utxo_set.iter_utxo("flush address")),
+                             sorted(expected))
+
+            utxo_set.flush()
+            self.assertEqual(utxo_set.get_cache_stats()["utxo_view"]["entries"], 0)
+            self.assertEqual(Database().namespace(NS_META)[META_UTXO_HEIGHT], {"height": height + 2})
+            # 写入之前已经被使用的输出不会写入数据库
+            self.assertIsNone(utxos.get(created))
+            self.assertEqual(sorted((tx_hash, idx) for tx_hash, idx, _ in
+                                    utxo_set.iter_utxo("flush address", True)), sorted(expected))
+        finally:
+            utxo_set.set_latest_height(height)
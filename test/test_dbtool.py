@@ -1,12 +1,14 @@
 import unittest
 
-from utils.leveldb import LevelDB
+from utils.database import Database
+from utils.leveldb import load_options
+from utils.convertor import NS_META, NS_TX, META_LAYOUT_VERSION, LAYOUT_VERSION
 
 
 class TestDatabaseUtil(unittest.TestCase):
 
     def test_insert(self):
-        db = LevelDB()
+        db = Database()
 
         insert_key = "test"
         insert_data = {"test": "testdata"}
@@ -17,7 +19,7 @@ class TestDatabaseUtil(unittest.TestCase):
         self.assertTrue(db.remove(insert_key), "Database delete error.")
 
     def test_delete(self):
-        db = LevelDB()
+        db = Database()
 
         key = "delete_test"
         data = {"test": "delete"}
@@ -27,7 +29,7 @@ class TestDatabaseUtil(unittest.TestCase):
         self.assertEqual(db[key], None, "Get value from database with deleted key error.")
 
     def test_update(self):
-        db = LevelDB()
+        db = Database()
         key = "test1"
         origin_data = {"test": "testdata"}
         new_data = {"test": "new testdata"}
@@ -39,5 +41,68 @@ class TestDatabaseUtil(unittest.TestCase):
 
         self.assertTrue(db.remove(key), "Database delete error.")
 
+    def test_layout_version(self):
+        db = Database()
+        self.assertEqual(db.namespace(NS_META)[META_LAYOUT_VERSION], LAYOUT_VERSION)
+
+    def test_namespace_batch(self):
+        db = Database()
+        namespace = db.namespace(NS_TX)
+        key = b"\xff" * 32
+
+        with db.write_batch() as batch:
+            batch.put(namespace, key, {"test": "namespace"})
+        self.assertEqual(namespace[key], {"test": "namespace"})
+
+        with db.write_batch() as batch:
+            batch.delete(namespace, key)
+        self.assertNotIn(key, namespace)
+
+    def test_write_behind(self):
+        db = Database()
+        namespace = db.namespace(NS_TX)
+        keys = [bytes([idx]) * 32 for idx in range(100)]
+
+        for key in keys:
+            with db.write_batch() as batch:
+                batch.put(namespace, key, {"test": "write behind"})
+        # 测试配置中开启了写入线程， 提交之后立刻可以读到
+        self.assertEqual(namespace.multi_get(keys), [{"test": "write behind"}] * len(keys))
+
+        with db.write_batch() as batch:
+            for key in keys:
+                batch.delete(namespace, key)
+        self.assertNotIn(keys[0], namespace)
+
+        db.flush(True)
+        self.assertIsNone(db.db.get(NS_TX + keys[0]))
+
+    def test_after_commit(self):
+        db = Database()
+        namespace = db.namespace(NS_TX)
+        key = b"\xfe" * 32
+        seen = []
+
+        # 提交回调执行时修改已经写入存储引擎， 快照可以读到
+        with db.write_batch() as batch:
+            batch.put(namespace, key, {"test": "after commit"})
+            batch.after_commit(lambda: seen.append(db.snapshot().namespace(NS_TX).get(key)))
+        self.assertEqual(seen, [{"test": "after commit"}])
+
+        with db.write_batch() as batch:
+            batch.delete(namespace, key)
+
+    def test_load_options(self):
+        options = load_options("rpc-heavy", {"block_cache_size": "1024", "compression": "none"})
+        self.assertEqual(options["lru_cache_size"], 1024)
+        self.assertEqual(options["bloom_filter_bits"], 10)
+        self.assertIsNone(options["compression"])
+
+        with self.assertRaises(ValueError):
+            load_options("unknown")
+        with self.assertRaises(ValueError):
+            load_options("default", {"paranoid_checks": "maybe"})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+import unittest
+
+from utils.leveldb import LevelDBEngine
+from utils.memorydb import MemoryEngine
+from utils.sqlitedb import SQLiteEngine
+
+
+class EngineTestMixin(object):
+    """
+    所有存储引擎共用的测试， 子类实现 open_engine
+    """
+
+    def open_engine(self, path: str):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.engine = self.open_engine(self.path)
+
+    def tearDown(self):
+        self.engine.close()
+        shutil.rmtree(self.path)
+
+    def test_write(self):
+        self.engine.write([(b"a", b"1"), (b"b", b"2"), (b"a", None), (b"c", b"3"), (b"c", b"4")])
+
+        self.assertIsNone(self.engine.get(b"a"))
+        self.assertEqual(self.engine.get(b"b"), b"2")
+        self.assertEqual(self.engine.get(b"c"), b"4")
+        self.assertEqual(self.engine.multi_get([b"a", b"b", b"c", b"d"]), {b"b": b"2", b"c": b"4"})
+
+    def test_iterator(self):
+        values = [idx.to_bytes(2, "big") for idx in range(300)]
+        self.engine.write([(b"\x00a" + value, value) for value in values] +
+                          [(b"\x00b", b"b"), (b"\x00", b"root")], True)
+
+        iterator = self.engine.iterator(b"\x00a")
+        self.assertEqual([value for _, value in iterator], values)
+
+        iterator = self.engine.iterator(b"\x00a")
+        iterator.seek(b"\x00a" + values[5])
+        self.assertEqual(next(iterator), (b"\x00a" + values[5], values[5]))
+        iterator.seek(b"\x00a\xff")
+        self.assertRaises(StopIteration, next, iterator)
+        iterator.close()
+
+        self.assertEqual(len(list(self.engine.iterator())), 302)
+
+    def test_snapshot(self):
+        self.engine.write([(b"key", b"old")])
+        snapshot = self.engine.snapshot()
+        self.engine.write([(b"key", b"new"), (b"other", b"value")])
+
+        self.assertEqual(snapshot.get(b"key"), b"old")
+        self.assertEqual(snapshot.multi_get([b"key", b"other"]), {b"key": b"old"})
+        self.assertEqual(list(snapshot.iterator()), [(b"key", b"old")])
+        self.assertEqual(self.engine.get(b"key"), b"new")
+        snapshot.close()
+
+    def test_snapshot_changes(self):
+        self.engine.write([(b"\x00a" + bytes([idx]), bytes([idx])) for idx in range(10)] + [(b"\x00b", b"b")])
+        first = self.engine.snapshot()
+        self.engine.write([(b"\x00a\x03", None), (b"\x00a\x05", b"changed"), (b"\x00a\x20", b"added")])
+        second = self.engine.snapshot()
+        self.engine.write([(b"\x00a\x05", None), (b"\x00a\x03", b"again")])
+
+        # 每个快照只看到创建之前的修改
+        self.assertEqual([value for _, value in first.iterator(b"\x00a")], [bytes([idx]) for idx in range(10)])
+        self.assertEqual(first.multi_get([b"\x00a\x03", b"\x00a\x20"]), {b"\x00a\x03": b"\x03"})
+        self.assertEqual(dict(second.iterator(b"\x00a"))[b"\x00a\x05"], b"changed")
+        self.assertEqual(len(list(second.iterator(b"\x00a"))), 10)
+        self.assertIsNone(second.get(b"\x00a\x03"))
+        self.assertEqual(self.engine.get(b"\x00a\x03"), b"again")
+        first.close()
+        second.close()
+
+
+class TestLevelDBEngine(EngineTestMixin, unittest.TestCase):
+
+    def open_engine(self, path: str):
+        return LevelDBEngine(path)
+
+
+class TestMemoryEngine(EngineTestMixin, unittest.TestCase):
+
+    def open_engine(self, path: str):
+        return MemoryEngine()
+
+
+class TestSQLiteEngine(EngineTestMixin, unittest.TestCase):
+
+    def open_engine(self, path: str):
+        return SQLiteEngine(path + "/test.sqlite")
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from core.block_header import BlockHeader
+from core.header_index import HeaderIndex
+
+
+def make_header(height: int, prev_hash: str = "") -> BlockHeader:
+    header = BlockHeader(os.urandom(32).hex() if height else "", height, prev_hash)
+    header.set_hash()
+    return header
+
+
+class TestHeaderIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = HeaderIndex(os.path.join(self.path, "headers.dat"))
+        self.index.open()
+
+        self.headers = []
+        prev_hash = ""
+        for height in range(5000):
+            header = make_header(height, prev_hash)
+            self.index.put(header)
+            self.headers.append(header)
+            prev_hash = header.hash
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.path)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.index), len(self.headers))
+        for height in (0, 1, 4095, 4096, 4999):
+            header = self.headers[height]
+            self.assertEqual(self.index.header_at(height).serialize(), header.serialize())
+            self.assertEqual(self.index.hash_at(height), header.hash)
+            self.assertEqual(self.index.height_of(header.hash), height)
+
+        self.assertIsNone(self.index.hash_at(5000))
+        self.assertIsNone(self.index.height_of("00" * 32))
+
+    def test_rollback(self):
+        removed = self.headers[-1]
+        self.index.truncate(len(self.headers) - 1)
+        self.assertIsNone(self.index.height_of(removed.hash))
+
+        # 分叉时覆盖相同高度的区块
+        fork = make_header(4998, self.headers[4997].hash)
+        self.index.put(fork)
+        self.assertEqual(len(self.index), 4999)
+        self.assertEqual(self.index.height_of(fork.hash), 4998)
+        self.assertIsNone(self.index.height_of(self.headers[4998].hash))
+
+        self.assertRaises(ValueError, self.index.put, make_header(5001))
+
+    def test_reopen(self):
+        self.index.close()
+        self.index.open()
+
+        self.assertEqual(len(self.index), len(self.headers))
+        self.assertEqual(self.index.height_of(self.headers[1234].hash), 1234)
+        self.assertEqual(self.index.header_at(4999).serialize(), self.headers[4999].serialize())
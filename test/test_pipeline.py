@@ -0,0 +1,81 @@
+import threading
+import time
+import unittest
+
+from core.block import Block
+from core.block_header import BlockHeader
+from core.config import Config
+from core.transaction import Transaction, TxOutput
+from threads.pipeline import BlockPipeline, StageStats, check_header
+
+
+def make_block(height: int = 1) -> Block:
+    tx = Transaction([], [TxOutput(height, "ab" * 20)])
+    tx.set_id()
+    block = Block(BlockHeader("", height, "00" * 32), [tx])
+    block.set_hash_merkle_tree(block.compute_merkle_root())
+    block.set_header_hash()
+    return Block.deserialize(block.serialize())
+
+
+class TestPipeline(unittest.TestCase):
+
+    def test_check_header(self):
+        block = make_block()
+        self.assertTrue(check_header(block))
+
+        block.block_header.nonce = 1
+        self.assertFalse(check_header(block))
+
+        block = make_block()
+        block.set_hash_merkle_tree("00" * 32)
+        block.set_header_hash()
+        self.assertFalse(check_header(block))
+
+    def test_merkle_activation(self):
+        block = make_block(5)
+        block.set_hash_merkle_tree("00" * 32)
+        block.set_header_hash()
+
+        # 升级之前的区块的 merkle 根使用过滤之前的交易列表计算， 只校验哈希
+        Config().set("node.merkle_activation_height", "6")
+        try:
+            self.assertTrue(check_header(block))
+            self.assertTrue(check_header(make_block(6)))
+            Config().set("node.merkle_activation_height", "5")
+            self.assertFalse(check_header(block))
+        finally:
+            Config().set("node.merkle_activation_height", "0")
+
+    def test_stages(self):
+        accepted = []
+        rejected = []
+        done = threading.Event()
+        # 第二个阶段慢于第一个阶段， 后面的区块在第一个阶段等待
+        stages = [("header", lambda block: block.height % 3 != 0),
+                  ("vdf", lambda block: time.sleep(0.01) or block.height % 5 != 0)]
+
+        def sink(block):
+            accepted.append(block.height)
+            if block.height == 19:
+                done.set()
+
+        pipeline = BlockPipeline(sink, lambda block, stage: rejected.append((block.height, stage)), stages,
+                                 StageStats())
+        for height in range(1, 20):
+            pipeline.submit(make_block(height))
+        self.assertTrue(done.wait(5))
+
+        self.assertEqual(accepted, [height for height in range(1, 20) if height % 3 and height % 5])
+        self.assertEqual(sorted(rejected), sorted([(height, "header") for height in range(3, 20, 3)] +
+                                                  [(5, "vdf"), (10, "vdf")]))
+        stats = pipeline.stats.stats()
+        self.assertEqual((stats["header"]["blocks"], stats["header"]["rejected"]), (19, 6))
+        self.assertEqual((stats["vdf"]["blocks"], stats["vdf"]["rejected"]), (13, 2))
+
+        # 最后一个区块交给 sink 之后阶段才标记完成
+        for _ in range(100):
+            if pipeline.pending() == 0:
+                break
+            time.sleep(0.01)
+        self.assertEqual(pipeline.pending(), 0)
@@ -0,0 +1,92 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在单独的进程中运行节点， 每个进程重新创建 Database、BlockChain 和 UTXOSet 的单例
+NODE_SCRIPT = """
+import os
+import sys
+
+from core.config import Config
+
+Config().set("storage.engine", "leveldb")
+Config().set("storage.write_behind", "0")
+Config().set("storage.block_files", "0")
+Config().set("storage.prune", "1")
+Config().set("storage.keep_last_n_blocks", "100")
+Config().set("utxo.flush_interval", "1000")
+
+from core.block import Block
+from core.block_chain import BlockChain
+from core.block_header import BlockHeader
+from core.transaction import Transaction, TxInput, TxOutput
+from core.utxo import UTXOSet
+from utils.convertor import NS_META, META_UTXO_HEIGHT
+from utils.database import Database
+from utils.errors import PrunedBlockError
+
+ADDRESS = "prune address"
+
+
+def make_block(height, prev_hash):
+    tx = Transaction([TxInput("", -1)], [TxOutput(height, ADDRESS)])
+    tx.set_id()
+    block = Block(BlockHeader(prev_hash, height), [tx])
+    block.set_header_hash()
+    return block
+
+
+bc = BlockChain()
+if sys.argv[1] == "connect":
+    prev_hash = ""
+    for height in range(151):
+        block = make_block(height, prev_hash)
+        bc.insert_block(block)
+        prev_hash = block.header_hash
+        if height == 30:
+            UTXOSet().flush()
+    print(bc.get_prune_height())
+    # 模拟崩溃， 不在退出时写入 UTxO 的修改
+    os._exit(0)
+elif sys.argv[1] == "rebuild":
+    # 没有 UTxO 集合时需要从所有区块重建， 裁剪之后不能重建
+    with Database().write_batch() as batch:
+        batch.delete(Database().namespace(NS_META), META_UTXO_HEIGHT)
+    try:
+        UTXOSet().reindex(bc)
+    except PrunedBlockError:
+        print(-1)
+else:
+    UTXOSet().reindex(bc)
+    values = [utxo["value"] for _, _, utxo in UTXOSet().iter_utxo(ADDRESS)]
+    print(UTXOSet().get_latest_height(), len(values), sum(values))
+"""
+
+
+class TestPrune(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.path, "conf"))
+        shutil.copy(os.path.join(ROOT, "test", "conf", "config.ini"), os.path.join(self.path, "conf"))
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def run_node(self, command: str) -> list:
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        output = subprocess.run([sys.executable, "-c", NODE_SCRIPT, command], cwd=self.path, env=env,
+                                stdout=subprocess.PIPE, check=True, timeout=120).stdout
+        return [int(value) for value in output.split()]
+
+    def test_prune_before_flush(self):
+        # UTxO 集合只写入到高度 30， 之后的区块即使超出保留的数量也不能裁剪
+        self.assertEqual(self.run_node("connect"), [31])
+        # 重启之后重新连接高度 30 之后的区块
+        self.assertEqual(self.run_node("reindex"), [150, 151, sum(range(151))])
+        self.assertEqual(self.run_node("rebuild"), [-1])
@@ -0,0 +1,92 @@
+import binascii
+import copy
+import unittest
+
+import ecdsa
+
+from core.sighash import SigHasher, SignatureCache
+from core.transaction import Transaction, TxInput, TxOutput
+
+
+def reference_digests(tx: Transaction, prev_txs: dict) -> list:
+    """
+    原来的签名哈希计算方式： 复制交易之后逐个修改输入并重新计算交易哈希
+    """
+    tx_copy = copy.deepcopy(tx)
+    digests = []
+    for idx, _input in enumerate(tx.inputs):
+        tx_copy.inputs[idx].signature = None
+        tx_copy.inputs[idx].pub_key = prev_txs[_input.tx_hash].outputs[_input.index].pub_key_hash
+        digests.append(tx_copy.set_id())
+        tx_copy.inputs[idx].pub_key = None
+    return digests
+
+
+class TestSigHash(unittest.TestCase):
+
+    def setUp(self):
+        self.keys = [ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1) for _ in range(2)]
+        self.prev_txs = {}
+        inputs = []
+        for idx in range(6):
+            prev_tx = Transaction([], [TxOutput(idx, "{:040x}".format(idx)), TxOutput(idx, "{:040x}".format(idx + 1))])
+            prev_tx.set_id()
+            self.prev_txs[prev_tx.tx_hash] = prev_tx
+
+            key = self.keys[idx % 2]
+            inputs.append(TxInput(prev_tx.tx_hash, idx % 2, key.get_verifying_key().to_string().hex()))
+
+        # 反序列化之后第一个输入为 CoinBaseInput， 带有 vote_info 和 delay_params
+        tx = Transaction(inputs, [TxOutput(10, "ab" * 20)])
+        tx.set_id()
+        self.tx = Transaction.deserialize(tx.serialize())
+
+        # 签名哈希包含之后的输入的签名， 需要从最后一个输入开始签名
+        for idx in reversed(range(len(self.tx.inputs))):
+            digest = reference_digests(self.tx, self.prev_txs)[idx]
+            signature = self.keys[idx % 2].sign(digest.encode())
+            self.tx.inputs[idx].signature = binascii.b2a_hex(signature).decode()
+
+    def test_digest(self):
+        hasher = SigHasher(self.tx)
+        digests = [hasher.digest(idx, self.prev_txs[_input.tx_hash].outputs[_input.index].pub_key_hash)
+                   for idx, _input in enumerate(self.tx.inputs)]
+        self.assertEqual(digests, reference_digests(self.tx, self.prev_txs))
+
+        # 回到之前的输入时重新计算
+        _input = self.tx.inputs[1]
+        self.assertEqual(hasher.digest(1, self.prev_txs[_input.tx_hash].outputs[_input.index].pub_key_hash),
+                         digests[1])
+
+    def test_verify(self):
+        self.assertTrue(self.tx.verify(self.prev_txs))
+
+        tx = copy.deepcopy(self.tx)
+        tx.inputs[3].signature = self.tx.inputs[2].signature
+        self.assertFalse(tx.verify(self.prev_txs))
+
+        tx = copy.deepcopy(self.tx)
+        tx.outputs[0].value = 11
+        self.assertFalse(tx.verify(self.prev_txs))
+
+        prev_txs = dict(self.prev_txs)
+        prev_txs.pop(self.tx.inputs[5].tx_hash)
+        self.assertFalse(self.tx.verify(prev_txs))
+
+    def test_signature_cache(self):
+        cache = SignatureCache()
+        cache.clear()
+
+        self.assertTrue(self.tx.verify(self.prev_txs))
+        self.assertEqual(cache.stats()["entries"], len(self.tx.inputs))
+        hits = cache.stats()["hits"]
+        self.assertTrue(self.tx.verify(self.prev_txs))
+        self.assertEqual(cache.stats()["hits"] - hits, len(self.tx.inputs))
+
+        # 交易哈希不变但是内容被修改时不能命中缓存
+        tx = copy.deepcopy(self.tx)
+        tx.outputs[0].value = 11
+        self.assertFalse(tx.verify(self.prev_txs))
+
+        cache.clear()
+        self.assertEqual(cache.stats()["entries"], 0)
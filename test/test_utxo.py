@@ -1,8 +1,21 @@
 import unittest
 
-from utils.leveldb import LevelDB
+import ecdsa
+
+from utils.database import Database
+from utils.funcs import pub_to_address
+from core.block import Block
 from core.block_chain import BlockChain
-from core.utxo import UTXOSet
+from core.block_header import BlockHeader
+from core.transaction import Transaction, TxInput, TxOutput
+from core.utxo import UTXOSet, UTXO_READ_BATCH
+from utils.convertor import NS_UNDO, NS_BALANCE, hash_to_key, address_to_key
+
+
+def make_block(height: int, txs: list) -> Block:
+    block = Block(BlockHeader("", height), txs)
+    block.set_header_hash()
+    return block
 
 
 class TestUTxO(unittest.TestCase):
@@ -16,4 +29,92 @@ class TestUTxO(unittest.TestCase):
 
     def test_find_utxo(self):
         utxos = UTXOSet().find_utxo("1PuRN6PvTfhVazxoK8zZ3eFvTUSU76VHRF")
-        print(utxos)
\ No newline at end of file
+        print(utxos)
+
+    def test_address_index(self):
+        utxo_set = UTXOSet()
+        height = utxo_set.get_latest_height()
+        pub_key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1).get_verifying_key().to_string().hex()
+        address = pub_to_address(pub_key)
+
+        # 输出数量超过一次批量读取的数量
+        count = UTXO_READ_BATCH + 10
+        coinbase = Transaction([TxInput("", -1)], [TxOutput(idx, address) for idx in range(count)])
+        coinbase.set_id()
+        spend = Transaction([TxInput(coinbase.tx_hash, idx, pub_key) for idx in range(2)], [TxOutput(1, address)])
+        spend.set_id()
+
+        try:
+            utxo_set.update(make_block(height + 1, [coinbase]))
+            utxo_set.update(make_block(height + 2, [spend]))
+
+            outpoints = [(tx_hash, index) for tx_hash, index, _ in utxo_set.iter_utxo(address)]
+            expected = sorted([(coinbase.tx_hash, idx) for idx in range(2, count)] + [(spend.tx_hash, 0)])
+            self.assertEqual(outpoints, expected)
+
+            # 从游标的位置继续遍历
+            cursor = expected[100]
+            self.assertEqual([(tx_hash, index) for tx_hash, index, _ in utxo_set.iter_utxo(address, start=cursor)],
+                             expected[100:])
+
+            # 同一笔交易的多个输出都包含在结果中， 游标不包含游标所在的 UTxO
+            self.assertEqual(len(utxo_set.find_utxo(address)), len(expected))
+            page = utxo_set.find_utxo(address, after=expected[99], limit=10)
+            self.assertEqual([(utxo["tx_hash"], utxo["index"]) for utxo in page], expected[100:110])
+            self.assertEqual(utxo_set.find_utxo(address, after=expected[-1]), [])
+            self.assertEqual(sorted(utxo["value"] for utxo in utxo_set.find_utxo(address, min_value=count - 5)),
+                             list(range(count - 5, count)))
+
+            utxos = list(utxo_set.iter_utxo(address, True))
+            self.assertEqual([utxo["value"] for _, _, utxo in utxos],
+                             [utxo["value"] for _, _, utxo in utxo_set.iter_utxo(address)])
+        finally:
+            utxo_set.set_latest_height(height)
+
+    def test_roll_back(self):
+        utxo_set = UTXOSet()
+        height = utxo_set.get_latest_height()
+        pub_key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1).get_verifying_key().to_string().hex()
+        address = pub_to_address(pub_key)
+
+        coinbase = Transaction([TxInput("", -1)], [TxOutput(idx + 1, address) for idx in range(3)])
+        coinbase.set_id()
+        # 第二笔交易使用同一个区块中第一笔交易的输出
+        spend = Transaction([TxInput(coinbase.tx_hash, idx, pub_key) for idx in range(2)], [TxOutput(3, address)])
+        spend.set_id()
+        spend_again = Transaction([TxInput(spend.tx_hash, 0, pub_key)], [TxOutput(3, address)])
+        spend_again.set_id()
+
+        first = make_block(height + 1, [coinbase])
+        second = make_block(height + 2, [spend, spend_again])
+        utxo_set.update(first)
+        before = list(utxo_set.iter_utxo(address))
+        self.assertEqual(utxo_set.get_balance(address), {"value": 6, "count": 3})
+        utxo_set.update(second)
+        self.assertEqual(utxo_set.get_balance(address), {"value": 6, "count": 2})
+
+        undo = Database().namespace(NS_UNDO)
+        self.assertEqual(undo[hash_to_key(second.header_hash)], [[address, 1], [address, 2], [address, 3]])
+
+        # 回滚只使用回滚记录， 不需要读取交易
+        utxo_set.roll_back(second, None)
+        self.assertEqual(list(utxo_set.iter_utxo(address)), before)
+        self.assertEqual(utxo_set.get_latest_height(), height + 1)
+        self.assertIsNone(undo[hash_to_key(second.header_hash)])
+        # 回滚之后写入数据库， 快照中读取到写入的余额
+        self.assertEqual(utxo_set.get_balance(address, True), {"value": 6, "count": 3})
+
+        utxo_set.roll_back(first, None)
+        self.assertEqual(list(utxo_set.iter_utxo(address)), [])
+        self.assertEqual(utxo_set.get_balance(address), {"value": 0, "count": 0})
+        self.assertIsNone(Database().namespace(NS_BALANCE)[address_to_key(address)])
+        self.assertEqual(utxo_set.get_latest_height(), height)
+
+    def test_clear_transactions(self):
+        def make_tx(*outpoints):
+            tx = Transaction([TxInput(tx_hash, index) for tx_hash, index in outpoints], [TxOutput(1, "ab")])
+            tx.set_id()
+            return tx
+
+        txs = [make_tx(("aa", 0), ("aa", 1)), make_tx(("aa", 1)), make_tx(("bb", 0), ("bb", 0)), make_tx(("bb", 1))]
+        self.assertEqual(UTXOSet.clear_transactions(txs), [txs[0], txs[3]])
@@ -0,0 +1,52 @@
+import binascii
+import unittest
+
+import ecdsa
+
+from core.sighash import SigHasher, verify_signatures
+from core.transaction import Transaction, TxInput, TxOutput
+from core.verifier import VerifyExecutor
+
+
+def make_job(key: ecdsa.SigningKey, idx: int) -> tuple:
+    """
+    生成一笔两个输入的交易以及输入引用的输出的 pub_key_hash
+    """
+    pub_key = key.get_verifying_key().to_string().hex()
+    prev_pub_key_hashes = ["{:040x}".format(idx), "{:040x}".format(idx + 1)]
+    inputs = [TxInput("{:064x}".format(idx * 2 + n), n, pub_key) for n in range(2)]
+    tx = Transaction.deserialize(Transaction(inputs, [TxOutput(idx, "ab" * 20)]).serialize())
+
+    for n in reversed(range(2)):
+        digest = SigHasher(tx).digest(n, prev_pub_key_hashes[n])
+        tx.inputs[n].signature = binascii.b2a_hex(key.sign(digest.encode())).decode()
+    tx.set_id()
+    return tx.serialize(), prev_pub_key_hashes
+
+
+class TestVerifyExecutor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        key = ecdsa.SigningKey.generate(curve=ecdsa.SECP256k1)
+        cls.jobs = [make_job(key, idx) for idx in range(24)]
+
+    @classmethod
+    def tearDownClass(cls):
+        VerifyExecutor().close()
+
+    def test_verify(self):
+        executor = VerifyExecutor()
+        self.assertTrue(executor.should_parallel(len(self.jobs)))
+        self.assertFalse(executor.should_parallel(1))
+
+        for tx_data, prev_pub_key_hashes in self.jobs:
+            self.assertTrue(verify_signatures(Transaction.deserialize(tx_data), prev_pub_key_hashes))
+        self.assertTrue(executor.verify(self.jobs))
+        self.assertTrue(executor.verify([]))
+
+    def test_failure(self):
+        jobs = list(self.jobs)
+        tx_data, prev_pub_key_hashes = jobs[17]
+        jobs[17] = (tx_data, list(reversed(prev_pub_key_hashes)))
+        self.assertFalse(VerifyExecutor().verify(jobs))
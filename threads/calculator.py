@@ -152,6 +152,13 @@ class Calculator(Singleton):
         thread = threading.Thread(target=self.task, args=())
         thread.start()
 
+    @property
+    def ready(self) -> bool:
+        """
+        是否已经从创世区块中读取了 VDF 的参数， 没有读取之前无法校验
+        """
+        return self.__has_inited
+
     def verify(self, result, pi, seed):
         """
         验证VDF的计算结果是否正确，即Calculate(seed, t) == Verify(result, pi)
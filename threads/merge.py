@@ -9,6 +9,7 @@ from core.txmempool import TxMemPool
 from core.utxo import UTXOSet
 from node.timer import Timer
 from threads.calculator import Calculator
+from threads.pipeline import BlockPipeline, STAGE_TRANSACTION, STAGE_CONNECT
 # from threads.counter import Counter
 # from threads.vote_center import VoteCenter
 from utils import funcs
@@ -44,10 +45,12 @@ class MergeThread(Singleton):
         # self.cache = LRU(500)
         self.cache = {}
 
-        # 区块合并队列
+        # 区块合并队列， 只包含通过了 header 和 vdf 阶段校验的区块
         self.__queue = Queue()
         self.__cond = threading.Condition()
         self.__lock = threading.Lock()
+        # 区块先经过流水线的前面几个阶段， 再由合并线程校验交易并连接
+        self.__pipeline = BlockPipeline(self.__enqueue, self.__reject)
         self.thread = threading.Thread(target=self.__task, args=(), name="Merge Thread")
         self.thread.start()
         # self.__cleaner = threading.Thread(target=self.__clear_task, args=(), name="Cleaner Thread")
@@ -69,11 +72,12 @@ class MergeThread(Singleton):
         #     latest_height = 0
         block_height = block.height
         prev_hash = block.block_header.prev_block_hash
-        prev_block = bc.get_block_by_hash(prev_hash)
+        # 数据库中只保存主链上的区块， 通过区块头索引检查前一个区块是否存在， 不需要读取整个区块
+        prev_block = bc.get_height_by_hash(prev_hash) is not None
         # delta = abs(latest_height - block_height)
 
         # 如果前一个区块在本地没有出现过， 拉取前一个区块
-        if prev_hash not in self.cache and block_height != 0 and prev_block is None:
+        if prev_hash not in self.cache and block_height != 0 and not prev_block:
             # and delta < 5:
             logging.debug("Previous block#{} not exists, pull block.".format(prev_hash))
             return MergeThread.STATUS_PULL
@@ -93,16 +97,63 @@ class MergeThread(Singleton):
                 return MergeThread.STATUS_APPEND
 
         # 如果该区块在本地没有出现过（不在cache中也没有在数据库中）
+        logging.info("Append Block#{} height {} to pipeline.".format(block_hash, block_height))
+        self.cache[block_hash] = {
+            'status': False,
+            'prev_hash': prev_hash
+        }
+        self.__pipeline.submit(block)
+        self.__lock.release()
+        return MergeThread.STATUS_APPEND
+
+    def get_pipeline_stats(self) -> dict:
+        """
+        区块校验流水线各个阶段处理的区块数量、拒绝的区块数量和累计耗时
+        """
+        return self.__pipeline.stats.stats()
+
+    def __enqueue(self, block):
+        """
+        通过流水线前面阶段的区块放入合并队列
+        """
         with self.__cond:
-            logging.info("Append Block#{} height {} to queue.".format(block_hash, block_height))
             self.__queue.put(block)
-            self.cache[block_hash] = {
-                'status': False,
-                'prev_hash': prev_hash
-            }
             self.__cond.notify_all()
-        self.__lock.release()
-        return MergeThread.STATUS_APPEND
+
+    def __reject(self, block, stage):
+        """
+        被拒绝的区块标记为已经处理， 后续的区块追溯到该区块时不再等待
+        """
+        with self.__lock:
+            if block.header_hash in self.cache:
+                self.cache[block.header_hash]['status'] = True
+
+    def __connect(self, block, rolled_back=False, verify=True) -> bool:
+        """ 校验区块中的交易之后连接区块
+
+        Args:
+            block: 前一个区块已经连接的区块
+            rolled_back: 是否在回滚之后连接
+            verify: 是否校验签名和双花， 创世区块不需要校验
+        Returns:
+            区块是否成功连接
+        """
+        bc = BlockChain()
+        stats = self.__pipeline.stats
+
+        if verify:
+            start_time = time.time()
+            accepted = UTXOSet().check_spends(block) and bc.verify_block(block, parallel=True)
+            stats.record(STAGE_TRANSACTION, time.time() - start_time, accepted)
+            if not accepted:
+                logging.warning("Block#{} rejected in stage {}.".format(block.header_hash, STAGE_TRANSACTION))
+                return False
+
+        start_time = time.time()
+        self.__update(block, rolled_back)
+        bc.insert_block(block)
+        stats.record(STAGE_CONNECT, time.time() - start_time, True)
+        return True
 
     @staticmethod
     def __update(block, rolled_back=False):
@@ -155,8 +206,7 @@ class MergeThread(Singleton):
                 if not latest_block:
                     # 如果不存在最新区块， 直接insert
                     logging.info("Insert genesis block to database.")
-                    self.__update(block)
-                    bc.insert_block(block)
+                    self.__connect(block, verify=False)
                     continue
 
                 latest_height = latest_block.block_header.height
@@ -168,15 +218,31 @@ class MergeThread(Singleton):
                 # 获取到的该区块的高度低于或等于本地高度， 说明区块已经存在
                 if block_height <= latest_height:
                     logging.info("Block has equal block, check whether block is legal.")
-                    block_count = block.vote_count
                     block_timestamp = block.block_header.timestamp
 
-                    # 获取到本地存储的对等高度的区块, 以及用于比较的信息
+                    # 获取到本地存储的对等高度的区块头, 以及用于比较的信息
+                    equal_header = bc.get_block_header_by_height(block_height)
+                    if equal_header is None:
+                        logging.warning("Block header at height {} not found, ignore.".format(block_height))
+                        continue
+
+                    equal_hash = equal_header.hash
+                    equal_timestamp = equal_header.timestamp
+                    equal_prev_hash = equal_header.prev_block_hash
+
+                    # 同一个区块或者不是同一个分叉点， 不需要读取整个区块比较投票
+                    if block_hash == equal_hash or block_prev_hash != equal_prev_hash:
+                        logging.info("block#{} < equal block.".format(block_hash))
+                        continue
+
                     equal_block = bc.get_block_by_height(block_height)
+                    if equal_block is None:
+                        # 分叉点低于裁剪模式保留的高度， 无法回滚
+                        logging.warning("Block#{} forks below pruned height, ignore.".format(block_hash))
+                        continue
+
+                    block_count = block.vote_count
                     equal_count = equal_block.vote_count
-                    equal_hash = equal_block.block_header.hash
-                    equal_timestamp = equal_block.block_header.timestamp
-                    equal_prev_hash = equal_block.block_header.prev_block_hash
 
                     # 比较的大前提是两个区块的前一个区块一致（分叉点）， 并且区块哈希值不一样
                     logging.debug(
@@ -184,30 +250,32 @@ class MergeThread(Singleton):
                     logging.debug(
                         "Block timestamp is {}. Equal block timestamp is {}.".format(block_timestamp, equal_timestamp))
 
-                    if block_hash == equal_hash or block_prev_hash != equal_prev_hash or block_count < equal_count or (
+                    if block_count < equal_count or (
                             block_count == equal_count and block_timestamp > equal_timestamp):
                         logging.info("block#{} < equal block.".format(block_hash))
                         continue
 
                     # 如果代码逻辑到达这里， 说明需要进行区块的回退
+                    # 交易的校验依赖回退之后的 UTxO， 保存被回退的区块， 校验失败时重新连接
+                    rolled_back_blocks = [bc.get_block_by_height(height)
+                                          for height in range(block_height, latest_height + 1)]
                     rollback_times = latest_height - block_height + 1
                     for _ in range(rollback_times):
-                        latest_block, _ = bc.get_latest_block()
-                        logging.info("Rollback block#{}.".format(latest_block.block_header.hash))
-                        UTXOSet().roll_back(latest_block, bc)
-                        bc.roll_back()
+                        bc.disconnect_block()
 
                     # 回退然后更新, 回退后需要保证投票中心的更新
-                    self.__update(block, True)
-                    bc.insert_block(block)
+                    if not self.__connect(block, True):
+                        logging.warning("Restore {} rolled back blocks.".format(len(rolled_back_blocks)))
+                        for rolled_back_block in rolled_back_blocks:
+                            if rolled_back_block is not None:
+                                self.__connect(rolled_back_block, verify=False)
                     continue
                 elif block_height == latest_height + 1:
                     # 取得区块的前一个区块哈希
                     block_prev_hash = block.block_header.prev_block_hash
                     if block_prev_hash == latest_hash:
                         # 在需要insert时优先更新同步使用的信息
-                        self.__update(block)
-                        bc.insert_block(block)
+                        self.__connect(block)
                     else:
                         # 最前面的区块没有被处理过， 将区块返回到队列中等待
                         # 追溯到最前面的区块， 并且检查是否被处理过， 需要在cache中存储前一个区块的信息
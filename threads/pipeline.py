@@ -0,0 +1,197 @@
+import logging
+import threading
+import time
+from queue import Queue, Empty
+
+from lru import LRU
+
+from core.block import Block, merkle_activation_height
+from core.block_chain import BlockChain
+from threads.calculator import Calculator
+from utils import constant
+from utils import funcs
+
+"""
+区块校验的流水线
+
+从邻居节点收到的区块依次经过以下阶段， 每个阶段在单独的线程中执行：
+  - header： 重新计算区块头的哈希和 merkle 根， 开销最小， 最先过滤掉错误的区块
+  - vdf： 使用前一个区块的 seed 校验区块中的 VDF 结果和证明
+  - transaction： 签名（进程池并行校验）和 UTxO 的双花检查， 依赖前一个区块已经连接， 由合并线程执行
+  - connect： 写入区块并更新 UTxO 等状态， 由合并线程执行
+同步时前一个区块在 transaction/connect 阶段的同时， 后面的区块可以进行 header/vdf 阶段的校验
+"""
+
+STAGE_HEADER = "header"
+STAGE_VDF = "vdf"
+STAGE_TRANSACTION = "transaction"
+STAGE_CONNECT = "connect"
+STAGES = (STAGE_HEADER, STAGE_VDF, STAGE_TRANSACTION, STAGE_CONNECT)
+
+# 阶段线程等待区块的超时时间（秒）， 超时之后检查节点是否已经停止
+_POLL_TIMEOUT = 1
+# vdf 阶段保存的最近区块的参数数量， 前一个区块还没有连接时从这里查询
+_RECENT_PARAMS_SIZE = 1024
+
+
+def check_header(block: Block) -> bool:
+    """
+    校验区块头的哈希以及 merkle 根， 创世区块没有 merkle 根， 只校验哈希
+    低于 merkle_activation_height 的区块的 merkle 根不能重新计算， 同样只校验哈希
+    """
+    header = block.block_header
+    if header.compute_hash() != header.hash:
+        logging.warning("Block#{} hash mismatch.".format(header.hash))
+        return False
+
+    if header.height < merkle_activation_height():
+        return True
+
+    if header.height != 0 and block.compute_merkle_root() != header.hash_merkle_root:
+        logging.warning("Block#{} merkle root mismatch.".format(header.hash))
+        return False
+    return True
+
+
+def _delay_params(block: Block) -> dict:
+    return block.transactions[0].inputs[0].delay_params or {}
+
+
+class StageStats(object):
+    """
+    每个阶段处理的区块数量、拒绝的区块数量和累计耗时
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__stats = {stage: {"blocks": 0, "rejected": 0, "seconds": 0.0} for stage in STAGES}
+
+    def record(self, stage: str, seconds: float, accepted: bool) -> None:
+        with self.__lock:
+            item = self.__stats[stage]
+            item["blocks"] += 1
+            item["seconds"] += seconds
+            if not accepted:
+                item["rejected"] += 1
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {stage: dict(item) for stage, item in self.__stats.items()}
+
+
+class VDFChecker(object):
+    """
+    校验区块中的 VDF 参数， 前一个区块可能还在流水线中， 通过 header 阶段的区块需要调用 remember 记录参数
+    """
+
+    def __init__(self):
+        # 区块哈希 -> (seed, proof)
+        self.__recent = LRU(_RECENT_PARAMS_SIZE)
+
+    def remember(self, block: Block) -> None:
+        params = _delay_params(block)
+        self.__recent[block.header_hash] = (params.get("seed"), params.get("proof"))
+
+    def __call__(self, block: Block) -> bool:
+        if block.height == 0:
+            return True
+
+        calculator = Calculator()
+        if not calculator.ready:
+            logging.debug("Calculator is not ready, skip VDF check of block#{}.".format(block.header_hash))
+            return True
+
+        prev_hash = block.block_header.prev_block_hash
+        prev_params = self.__recent.get(prev_hash)
+        if prev_params is None:
+            prev_block = BlockChain().get_block_by_hash(prev_hash)
+            if prev_block is None:
+                logging.warning("Previous block#{} of block#{} not found.".format(prev_hash, block.header_hash))
+                return False
+            params = _delay_params(prev_block)
+            prev_params = (params.get("seed"), params.get("proof"))
+
+        params = _delay_params(block)
+        seed, proof = params.get("seed"), params.get("proof")
+        # 打包节点还没有计算完成时沿用前一个区块的参数
+        if (seed, proof) == prev_params:
+            return True
+
+        try:
+            return calculator.verify(funcs.hex2int(seed), funcs.hex2int(proof), funcs.hex2int(prev_params[0]))
+        except (TypeError, ValueError):
+            logging.warning("Invalid VDF params in block#{}.".format(block.header_hash))
+            return False
+
+
+class BlockPipeline(object):
+    """
+    按顺序执行的校验阶段， 每个阶段一个线程， 通过所有阶段的区块交给 sink
+    """
+
+    def __init__(self, sink, on_reject=None, stages: list = None, stats: StageStats = None):
+        """
+        :param sink: 通过所有阶段的区块的回调
+        :param on_reject: 区块被拒绝时的回调， 参数为区块和阶段的名称
+        :param stages: (阶段名称, 校验函数) 的列表， 为空时使用 header 和 vdf 阶段
+        :param stats: 各个阶段的统计信息
+        """
+        if stages is None:
+            vdf_checker = VDFChecker()
+
+            def header_stage(block):
+                if not check_header(block):
+                    return False
+                vdf_checker.remember(block)
+                return True
+
+            stages = [(STAGE_HEADER, header_stage), (STAGE_VDF, vdf_checker)]
+
+        self.stats = stats if stats is not None else StageStats()
+        self.__sink = sink
+        self.__on_reject = on_reject
+        self.__queues = [Queue() for _ in stages]
+        self.__threads = []
+
+        for idx, (name, check) in enumerate(stages):
+            thread = threading.Thread(target=self.__task, args=(idx, name, check),
+                                      name="Block {} Check Thread".format(name), daemon=True)
+            thread.start()
+            self.__threads.append(thread)
+
+    def submit(self, block: Block) -> None:
+        self.__queues[0].put(block)
+
+    def pending(self) -> int:
+        """
+        还在流水线中等待或者正在校验的区块数量
+        """
+        return sum(queue.unfinished_tasks for queue in self.__queues)
+
+    def __task(self, idx: int, name: str, check):
+        queue = self.__queues[idx]
+        while constant.NODE_RUNNING:
+            try:
+                block = queue.get(timeout=_POLL_TIMEOUT)
+            except Empty:
+                continue
+
+            try:
+                start_time = time.time()
+                try:
+                    accepted = check(block)
+                except Exception as e:
+                    logging.exception("Check block#{} in stage {} failed: {}".format(block.header_hash, name, e))
+                    accepted = False
+                self.stats.record(name, time.time() - start_time, accepted)
+
+                if not accepted:
+                    logging.warning("Block#{} rejected in stage {}.".format(block.header_hash, name))
+                    if self.__on_reject is not None:
+                        self.__on_reject(block, name)
+                elif idx + 1 < len(self.__queues):
+                    self.__queues[idx + 1].put(block)
+                else:
+                    self.__sink(block)
+            finally:
+                queue.task_done()
@@ -0,0 +1,203 @@
+import atexit
+import logging
+import threading
+import time
+from queue import Queue, Empty
+
+from core.config import Config
+from interfaces.EngineInterface import EngineInterface
+from utils.errors import StorageWriterError
+
+
+class StorageWriter(object):
+    """
+    数据库的写入线程， 由 Database 持有
+
+    WriteBatch 提交时只将修改放入有界队列， 由该线程写入数据库， 区块的解码和验证可以和磁盘写入同时进行
+      - 写入线程每次取出队列中已经积压的写入单元， 合并成存储引擎的一次提交（group commit）
+      - 提交之前的修改保存在内存中的 overlay 中， 读取时优先查询 overlay， 保证写入之后立刻可以读到
+      - 队列满时提交方阻塞， 避免内存中积压过多的数据
+    """
+
+    def __init__(self, db: EngineInterface, on_commit=None):
+        self.__db = db
+        # 每次提交写入数据库之后执行的回调
+        self.__on_commit = on_commit
+        self.__queue = Queue(int(Config().get("storage.writer_queue_size", 64)))
+        # 一次提交最多合并的写入单元数量
+        self.__group_size = int(Config().get("storage.group_commit_size", 32))
+        # 取到第一个写入单元之后等待更多写入单元的时间， 为 0 时只合并已经在队列中的写入单元
+        self.__group_wait = float(Config().get("storage.group_commit_ms", 0)) / 1000
+
+        """
+        overlay 的结构:
+        {
+            key(bytes): (seq(int), value(bytes or None))
+            value 为 None 表示 key 已经被删除
+        }
+        """
+        self.__overlay = {}
+        self.__submit_lock = threading.Lock()
+        self.__cond = threading.Condition()
+        self.__submitted = 0
+        self.__committed = 0
+        self.__error = None
+        self.__closed = False
+
+        self.thread = threading.Thread(target=self.__task, args=(), name="Storage Writer Thread", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def lookup(self, key: bytes) -> (bool, bytes):
+        """ 查询还没有写入数据库的修改
+
+        Args:
+            key: 完整的 key
+        Returns:
+            (是否存在修改, 修改后的值)， 值为 None 表示已经被删除
+        """
+        entry = self.__overlay.get(key)
+        if entry is None:
+            return False, None
+        return True, entry[1]
+
+    def submit(self, ops: list, sync: bool = False) -> int:
+        """ 提交一个写入单元
+
+        Args:
+            ops: (key, value) 列表， value 为 None 表示删除
+            sync: 是否需要同步刷盘， 为 True 时等待数据写入之后再返回
+        Returns:
+            写入单元的序号
+        Raises:
+            StorageWriterError: 写入线程已经失败或者关闭
+        """
+        self.__check()
+
+        with self.__submit_lock:
+            with self.__cond:
+                self.__submitted += 1
+                seq = self.__submitted
+                for key, value in ops:
+                    self.__overlay[key] = (seq, value)
+            # 序号的分配和入队在同一个锁中完成， 保证写入线程按照序号的顺序提交
+            self.__queue.put((seq, ops, sync))
+
+        if sync:
+            self.wait(seq)
+        return seq
+
+    def flush(self, sync: bool = False) -> None:
+        """ 等待所有已经提交的写入单元写入数据库
+
+        Args:
+            sync: 是否额外提交一次同步刷盘， 关闭节点之前使用
+        Raises:
+            StorageWriterError: 写入线程提交失败
+        """
+        if sync:
+            self.submit([], True)
+            return
+
+        with self.__cond:
+            seq = self.__submitted
+        self.wait(seq)
+
+    def close(self) -> None:
+        """
+        刷新所有的写入单元并停止写入线程， 可以重复调用
+        """
+        if self.__closed:
+            return
+
+        try:
+            self.flush(True)
+        except StorageWriterError as e:
+            logging.error(e)
+        finally:
+            self.__closed = True
+            self.__queue.put(None)
+            self.thread.join()
+
+    def __check(self):
+        if self.__error is not None:
+            raise StorageWriterError("Storage writer failed: {}".format(self.__error))
+        if self.__closed:
+            raise StorageWriterError("Storage writer is closed.")
+
+    def wait(self, seq: int) -> None:
+        """ 等待序号不超过 seq 的写入单元写入数据库
+
+        返回时提交回调已经执行， 之后创建的快照可以读到这些写入单元的修改
+        Raises:
+            StorageWriterError: 写入线程提交失败
+        """
+        with self.__cond:
+            while self.__committed < seq and self.__error is None:
+                self.__cond.wait()
+        if self.__error is not None:
+            raise StorageWriterError("Storage writer failed: {}".format(self.__error))
+
+    def __task(self):
+        """
+        写入线程的线程函数， 取出一组写入单元合并提交， 收到 None 时退出
+        """
+        running = True
+        while running:
+            item = self.__queue.get()
+            if item is None:
+                break
+
+            group = [item]
+            deadline = time.monotonic() + self.__group_wait
+            while len(group) < self.__group_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        item = self.__queue.get(timeout=timeout)
+                    else:
+                        item = self.__queue.get_nowait()
+                except Empty:
+                    break
+
+                if item is None:
+                    running = False
+                    break
+                group.append(item)
+
+            self.__commit(group)
+
+    def __commit(self, group: list) -> None:
+        # 之前的提交已经失败， 后面的写入单元依赖失败的修改， 不再写入
+        if self.__error is not None:
+            return
+
+        last_seq = group[-1][0]
+        sync = any(item[2] for item in group)
+
+        try:
+            self.__db.write([op for _, ops, _ in group for op in ops], sync)
+        except Exception as e:
+            # overlay 中的数据保留， 保证读取的结果和内存中的状态一致
+            logging.error("Commit write batch #{} failed: {}".format(last_seq, e))
+            with self.__cond:
+                self.__error = e
+                self.__cond.notify_all()
+            return
+
+        # 先执行提交回调再唤醒等待的线程， 等待返回之后创建的快照总是包含这次提交
+        if self.__on_commit is not None:
+            self.__on_commit()
+
+        with self.__cond:
+            for seq, ops, _ in group:
+                for key, _ in ops:
+                    entry = self.__overlay.get(key)
+                    # 之后的写入单元修改了同一个 key 时保留 overlay 中的数据
+                    if entry is not None and entry[0] <= last_seq:
+                        del self.__overlay[key]
+            self.__committed = last_seq
+            self.__cond.notify_all()
+
+        if len(group) > 1:
+            logging.debug("Group commit {} write batches.".format(len(group)))
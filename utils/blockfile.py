@@ -0,0 +1,224 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+
+from core.config import Config
+from utils.singleton import Singleton
+
+"""
+区块文件存储
+
+区块的内容以追加的方式写入分段文件 blk<编号>.dat， leveldb 中只保存区块的位置 (文件编号, 偏移, 长度)
+区块数据不再和 UTxO 集合一起参与 leveldb 的 compaction
+
+每条记录的格式:
+    [RECORD_MAGIC 4 字节][数据长度 4 字节大端][区块的 json 数据]
+区块数据使用和网络传输相同的 json 格式， 向邻居节点发送区块时直接使用映射出来的数据， 不需要反序列化
+读取通过 mmap 完成， 写满的分段文件不会再被修改
+
+写入位置和区块位置在同一个写入单元中提交到 leveldb， 打开时将分段文件截断到 leveldb 中记录的写入位置，
+写入文件之后、leveldb 提交之前进程退出留下的数据会被丢弃
+"""
+
+RECORD_MAGIC = b"\xf9\xbe\xb4\xd9"
+
+# 每次追加后都刷盘
+FSYNC_ALWAYS = "always"
+# 分段文件写满切换时刷盘
+FSYNC_ROTATE = "rotate"
+# 由操作系统决定刷盘时机
+FSYNC_NEVER = "never"
+
+_RECORD_HEADER = struct.Struct(">4sI")
+_LOCATION = struct.Struct(">IQI")
+_POSITION = struct.Struct(">IQ")
+
+
+def pack_location(file_no: int, offset: int, length: int) -> bytes:
+    return _LOCATION.pack(file_no, offset, length)
+
+
+def unpack_location(data: bytes) -> (int, int, int):
+    return _LOCATION.unpack(data)
+
+
+def pack_position(file_no: int, offset: int) -> bytes:
+    return _POSITION.pack(file_no, offset)
+
+
+def unpack_position(data: bytes) -> (int, int):
+    return _POSITION.unpack(data)
+
+
+class BlockFile(Singleton):
+    def __init__(self):
+        self.__path = Config().get_path("storage.block_dir", "blocks")
+        self.__segment_size = int(Config().get("storage.block_file_size", 128 * 1024 * 1024))
+        self.__fsync = Config().get("storage.block_fsync", FSYNC_ROTATE)
+
+        if self.__fsync not in (FSYNC_ALWAYS, FSYNC_ROTATE, FSYNC_NEVER):
+            logging.warning("Unknown block fsync policy {}, use {}.".format(self.__fsync, FSYNC_ROTATE))
+            self.__fsync = FSYNC_ROTATE
+
+        self.__lock = threading.Lock()
+        # 文件编号 -> 只读的 mmap
+        self.__maps = {}
+        self.__file = None
+        self.__file_no = 0
+        self.__offset = 0
+
+    @property
+    def opened(self) -> bool:
+        return self.__file is not None
+
+    @property
+    def position(self) -> (int, int):
+        """
+        当前的写入位置 (文件编号, 偏移)， 需要和区块位置一起提交到 leveldb
+        """
+        return self.__file_no, self.__offset
+
+    def __segment_path(self, file_no: int) -> str:
+        return os.path.join(self.__path, "blk{:05d}.dat".format(file_no))
+
+    def open(self, position: tuple = None) -> None:
+        """ 打开写入的分段文件
+
+        Args:
+            position: leveldb 中记录的写入位置 (文件编号, 偏移)， 为空时从第一个分段文件开始
+        """
+        with self.__lock:
+            if self.__file is not None:
+                return
+
+            os.makedirs(self.__path, exist_ok=True)
+            file_no, offset = position or (0, 0)
+
+            self.__close_map(file_no)
+            file = open(self.__segment_path(file_no), "ab")
+            if file.tell() != offset:
+                logging.warning("Truncate block file #{} from {} to {}.".format(file_no, file.tell(), offset))
+                file.truncate(offset)
+
+            self.__file = file
+            self.__file_no = file_no
+            self.__offset = offset
+
+    def append(self, data: bytes) -> (int, int, int):
+        """ 追加一个区块
+
+        当前分段文件写满之后切换到下一个分段文件， 单个区块不会跨越两个文件
+
+        Args:
+            data: 区块的 json 数据
+        Returns:
+            区块数据的位置 (文件编号, 偏移, 长度)
+        """
+        with self.__lock:
+            record_size = _RECORD_HEADER.size + len(data)
+            if self.__offset > 0 and self.__offset + record_size > self.__segment_size:
+                self.__rotate()
+
+            self.__file.write(_RECORD_HEADER.pack(RECORD_MAGIC, len(data)))
+            self.__file.write(data)
+            self.__file.flush()
+
+            if self.__fsync == FSYNC_ALWAYS:
+                os.fsync(self.__file.fileno())
+
+            location = (self.__file_no, self.__offset + _RECORD_HEADER.size, len(data))
+            self.__offset += record_size
+            return location
+
+    def read(self, location: tuple) -> bytes:
+        """ 读取区块的 json 数据
+
+        Args:
+            location: append 返回的位置 (文件编号, 偏移, 长度)
+        Returns:
+            区块的 json 数据
+        Raises:
+            ValueError: 位置对应的数据不是一条区块记录
+        """
+        file_no, offset, length = location
+        header_offset = offset - _RECORD_HEADER.size
+
+        with self.__lock:
+            block_map = self.__maps.get(file_no)
+
+            # 正在写入的分段文件会继续增长， 超出映射范围时重新映射
+            if block_map is None or len(block_map) < offset + length:
+                self.__close_map(file_no)
+                with open(self.__segment_path(file_no), "rb") as file:
+                    block_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.__maps[file_no] = block_map
+
+            if header_offset < 0 or len(block_map) < offset + length:
+                raise ValueError("Block location {} out of file range.".format(location))
+
+            magic, size = _RECORD_HEADER.unpack_from(block_map, header_offset)
+            if magic != RECORD_MAGIC or size != length:
+                raise ValueError("Invalid block record at {}.".format(location))
+
+            return block_map[offset: offset + length]
+
+    def remove_before(self, file_no: int, keep: set = None) -> None:
+        """ 删除编号小于 file_no 的分段文件， 用于裁剪模式
+
+        主链上的区块按照高度依次追加， 被裁剪的区块所在文件之前的文件中只包含更低高度的区块
+
+        Args:
+            file_no: 保留的最小文件编号
+            keep: 需要保留的文件编号， 例如创世区块所在的文件
+        """
+        with self.__lock:
+            for name in os.listdir(self.__path):
+                if not (name.startswith("blk") and name.endswith(".dat")):
+                    continue
+                try:
+                    number = int(name[3:-4])
+                except ValueError:
+                    continue
+
+                if number >= file_no or number in (keep or ()):
+                    continue
+                if self.__file is not None and number == self.__file_no:
+                    continue
+
+                self.__close_map(number)
+                os.remove(os.path.join(self.__path, name))
+                logging.info("Remove pruned block file #{}.".format(number))
+
+    def close(self) -> None:
+        with self.__lock:
+            if self.__file is not None:
+                self.__file.flush()
+                if self.__fsync != FSYNC_NEVER:
+                    os.fsync(self.__file.fileno())
+                self.__file.close()
+                self.__file = None
+
+            for file_no in list(self.__maps):
+                self.__close_map(file_no)
+
+    def __rotate(self) -> None:
+        """
+        关闭写满的分段文件， 打开下一个分段文件
+        """
+        if self.__fsync != FSYNC_NEVER:
+            os.fsync(self.__file.fileno())
+        self.__file.close()
+
+        self.__file_no += 1
+        self.__offset = 0
+        # 编号更大的分段文件不会被 leveldb 中的位置引用， 直接覆盖
+        self.__close_map(self.__file_no)
+        self.__file = open(self.__segment_path(self.__file_no), "wb")
+        logging.info("Switch to block file #{}.".format(self.__file_no))
+
+    def __close_map(self, file_no: int) -> None:
+        block_map = self.__maps.pop(file_no, None)
+        if block_map is not None:
+            block_map.close()
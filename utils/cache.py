@@ -0,0 +1,162 @@
+import sys
+import threading
+from collections import OrderedDict
+
+"""
+按照内存预算淘汰的 LRU 缓存
+
+每个条目在写入时估计占用的字节数， 缓存的总字节数超过预算时从最久没有使用的条目开始淘汰，
+交易数量不同的区块按照实际的大小占用缓存， 进程的内存占用不会因为大区块而大幅波动
+"""
+
+_CONTAINERS = (list, tuple, set, frozenset)
+
+
+def estimate_size(obj) -> int:
+    """ 估计对象及其引用的所有对象占用的字节数
+
+    遍历 dict、list、tuple、set 以及普通对象的 __dict__ 和 __slots__， 同一个对象只计算一次
+
+    Args:
+        obj: 需要估计的对象
+    Returns:
+        估计的字节数
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, _CONTAINERS):
+            stack.extend(item)
+        elif isinstance(item, (str, bytes, int, float, bool)) or item is None:
+            continue
+        else:
+            if hasattr(item, "__dict__"):
+                stack.append(item.__dict__)
+            # 子类的 __slots__ 只包含新增的字段， 需要遍历所有父类
+            for cls in type(item).__mro__:
+                slots = cls.__dict__.get("__slots__", ())
+                for slot in (slots,) if isinstance(slots, str) else slots:
+                    if hasattr(item, slot):
+                        stack.append(getattr(item, slot))
+    return size
+
+
+class SizedLRU(object):
+    """
+    按照估计的字节数进行淘汰的 LRU 缓存， 接口和 lru.LRU 的常用方法一致， 并且统计命中和淘汰的次数
+    """
+
+    def __init__(self, name: str, budget: int, sizeof=estimate_size):
+        """
+        :param name: 缓存的名称， 用于统计信息
+        :param budget: 缓存的内存预算（字节）
+        :param sizeof: 估计条目大小的函数， 参数为缓存的值
+        """
+        self.name = name
+        self.__budget = budget
+        self.__sizeof = sizeof
+        # key -> (value, size)
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key, default=None):
+        """
+        获取 key 对应的值并标记为最近使用， 统计命中和未命中的次数
+        """
+        with self.__lock:
+            entry = self.__data.get(key)
+            if entry is None:
+                self.__misses += 1
+                return default
+            self.__data.move_to_end(key)
+            self.__hits += 1
+            return entry[0]
+
+    def put(self, key, value, size: int = None) -> None:
+        """ 写入一个条目， 超出预算时淘汰最久没有使用的条目
+
+        Args:
+            key: 条目的 key
+            value: 条目的值
+            size: 条目的字节数， 为空时通过 sizeof 估计
+        """
+        if size is None:
+            size = self.__sizeof(value)
+
+        with self.__lock:
+            self.__remove(key)
+            # 单个条目超过预算时不放入缓存
+            if size > self.__budget:
+                return
+
+            self.__data[key] = (value, size)
+            self.__bytes += size
+            while self.__bytes > self.__budget:
+                _, (_, evicted_size) = self.__data.popitem(last=False)
+                self.__bytes -= evicted_size
+                self.__evictions += 1
+
+    def pop(self, key, default=None):
+        with self.__lock:
+            entry = self.__remove(key)
+        return default if entry is None else entry[0]
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__data.clear()
+            self.__bytes = 0
+
+    def stats(self) -> dict:
+        """
+        缓存的统计信息： 条目数量、字节数、预算以及命中、未命中和淘汰的次数
+        """
+        with self.__lock:
+            return {
+                "entries": len(self.__data),
+                "bytes": self.__bytes,
+                "budget": self.__budget,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+            }
+
+    def hit_rate(self) -> float:
+        with self.__lock:
+            total = self.__hits + self.__misses
+            return round(self.__hits / total, 3) if total else 0
+
+    def __remove(self, key):
+        entry = self.__data.pop(key, None)
+        if entry is not None:
+            self.__bytes -= entry[1]
+        return entry
+
+    def __getitem__(self, key):
+        value = self.get(key, self)
+        if value is self:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def __len__(self):
+        return len(self.__data)
@@ -0,0 +1,256 @@
+import json
+import marshal
+
+"""
+数据库中的值编码
+
+旧版本中所有的值都直接使用 json.dumps 写入数据库，区块、交易、UTxO 的编解码成为插入区块和缓存未命中时的主要开销
+新的二进制格式在第一个字节写入格式标记，json 编码的值不会以该字节开头，因此旧的记录仍然可以直接读取
+
+二进制格式(v1):
+    [FORMAT_BINARY_V1][记录类型][marshal 数据]
+    - 区块（完整区块或只包含交易哈希的区块）、交易、UTxO 记录按照固定的字段顺序转换为元组， 不再存储字段名
+    - 十六进制字符串（哈希、签名、公钥）转换为原始字节， 长度减半
+    - 结构和预期不一致的记录使用 RECORD_GENERIC 直接存储
+marshal 只用于序列化 dict/list/tuple/str/bytes/int/float/None 这些基础类型， 数据的编解码都在 C 实现中完成
+marshal 的格式版本固定为 MARSHAL_VERSION， 避免不同 Python 版本写入的数据不一致
+"""
+
+FORMAT_BINARY_V1 = 0x01
+
+RECORD_GENERIC = 0x00
+RECORD_BLOCK = 0x01
+RECORD_TRANSACTION = 0x02
+RECORD_OUTPUT = 0x03
+RECORD_UTXO = 0x04
+RECORD_BLOCK_REF = 0x05
+
+MARSHAL_VERSION = 4
+
+_HEADER_KEYS = {"timestamp", "prev_block_hash", "hash", "hash_merkle_root", "height", "nonce"}
+_BLOCK_KEYS = {"magic_no", "block_header", "transactions"}
+_BLOCK_REF_KEYS = {"magic_no", "block_header", "tx_hashes"}
+_TX_KEYS = {"tx_hash", "inputs", "outputs"}
+_INPUT_KEYS = {"tx_hash", "index", "signature", "pub_key"}
+_COINBASE_INPUT_KEYS = {"tx_hash", "index", "signature", "pub_key", "vote_info", "delay_params"}
+_OUTPUT_KEYS = {"value", "pub_key_hash"}
+_UTXO_KEYS = {"value", "pub_key_hash", "index", "tx_hash"}
+
+
+class _Mismatch(Exception):
+    """
+    记录结构和预期不一致， 使用通用格式进行存储
+    """
+
+
+def is_binary(data: bytes) -> bool:
+    """
+    判断从数据库中取出的数据是否是二进制格式
+    """
+    return len(data) > 1 and data[0] == FORMAT_BINARY_V1
+
+
+def encode(value) -> bytes:
+    """ 将 json 兼容的数据编码为二进制记录
+
+    区块、交易、输出、UTxO 记录使用紧凑的结构存储， 其他数据使用通用格式
+
+    Args:
+        value: 待编码的数据
+    Returns:
+        带有格式标记的二进制数据
+    Raises:
+        ValueError: 存在无法编码的类型
+    """
+    record_type = RECORD_GENERIC
+    packed = value
+
+    if type(value) is dict:
+        try:
+            keys = value.keys()
+            if keys == _TX_KEYS:
+                packed = _pack_tx(value)
+                record_type = RECORD_TRANSACTION
+            elif keys == _BLOCK_KEYS:
+                packed = _pack_block(value)
+                record_type = RECORD_BLOCK
+            elif keys == _BLOCK_REF_KEYS:
+                packed = _pack_block_ref(value)
+                record_type = RECORD_BLOCK_REF
+            elif keys == _UTXO_KEYS:
+                packed = _pack_utxo(value)
+                record_type = RECORD_UTXO
+            elif keys == _OUTPUT_KEYS:
+                packed = _pack_output(value)
+                record_type = RECORD_OUTPUT
+        except (_Mismatch, AttributeError, KeyError, TypeError):
+            record_type = RECORD_GENERIC
+            packed = value
+
+    return bytes((FORMAT_BINARY_V1, record_type)) + marshal.dumps(packed, MARSHAL_VERSION)
+
+
+def decode(data: bytes):
+    """ 解码数据库中的记录
+
+    根据第一个字节判断记录的格式， 二进制格式的记录按照 v1 格式解码， 其他的按照 json 进行解码
+
+    Args:
+        data: 数据库中取出的原始数据
+    Returns:
+        解码后的数据
+    """
+    if not is_binary(data):
+        return json.loads(bytes(data).decode())
+
+    record_type = data[1]
+    packed = marshal.loads(memoryview(data)[2:])
+
+    if record_type == RECORD_GENERIC:
+        return packed
+    if record_type == RECORD_TRANSACTION:
+        return _unpack_tx(packed)
+    if record_type == RECORD_BLOCK:
+        return _unpack_block(packed)
+    if record_type == RECORD_BLOCK_REF:
+        return _unpack_block_ref(packed)
+    if record_type == RECORD_UTXO:
+        return _unpack_utxo(packed)
+    if record_type == RECORD_OUTPUT:
+        return _unpack_output(packed)
+
+    raise ValueError("Unknown record type 0x{:02x}".format(record_type))
+
+
+def _hex(value):
+    """
+    小写的十六进制字符串转换为字节， 其他数据原样返回
+    """
+    if type(value) is str and value:
+        try:
+            raw = bytes.fromhex(value)
+        except ValueError:
+            return value
+        if raw.hex() == value:
+            return raw
+    return value
+
+
+def _unhex(value):
+    return value.hex() if type(value) is bytes else value
+
+
+def _check(value: dict, keys: set) -> dict:
+    if type(value) is not dict or value.keys() != keys:
+        raise _Mismatch()
+    return value
+
+
+def _pack_output(output: dict) -> tuple:
+    return output["value"], output["pub_key_hash"]
+
+
+def _unpack_output(packed) -> dict:
+    return {"value": packed[0], "pub_key_hash": packed[1]}
+
+
+def _pack_utxo(utxo: dict) -> tuple:
+    return utxo["value"], utxo["pub_key_hash"], utxo["index"], _hex(utxo["tx_hash"])
+
+
+def _unpack_utxo(packed) -> dict:
+    return {"value": packed[0], "pub_key_hash": packed[1], "index": packed[2], "tx_hash": _unhex(packed[3])}
+
+
+def _pack_input(_input: dict) -> tuple:
+    keys = _input.keys()
+    packed = (_hex(_input["tx_hash"]), _input["index"], _hex(_input["signature"]), _hex(_input["pub_key"]))
+    if keys == _INPUT_KEYS:
+        return packed
+    if keys == _COINBASE_INPUT_KEYS:
+        return packed + (_input["vote_info"], _input["delay_params"])
+    raise _Mismatch()
+
+
+def _unpack_input(packed) -> dict:
+    result = {
+        "tx_hash": _unhex(packed[0]),
+        "index": packed[1],
+        "signature": _unhex(packed[2]),
+        "pub_key": _unhex(packed[3])
+    }
+    if len(packed) == 6:
+        result["vote_info"] = packed[4]
+        result["delay_params"] = packed[5]
+    return result
+
+
+def _pack_tx(tx: dict) -> tuple:
+    return (
+        _hex(tx["tx_hash"]),
+        tuple(_pack_input(_input) for _input in tx["inputs"]),
+        tuple(_pack_output(_check(output, _OUTPUT_KEYS)) for output in tx["outputs"])
+    )
+
+
+def _unpack_tx(packed) -> dict:
+    return {
+        "tx_hash": _unhex(packed[0]),
+        "inputs": [_unpack_input(_input) for _input in packed[1]],
+        "outputs": [{"value": output[0], "pub_key_hash": output[1]} for output in packed[2]]
+    }
+
+
+def _pack_header(header: dict) -> tuple:
+    _check(header, _HEADER_KEYS)
+    return (
+        header["timestamp"],
+        _hex(header["prev_block_hash"]),
+        _hex(header["hash"]),
+        _hex(header["hash_merkle_root"]),
+        header["height"],
+        header["nonce"]
+    )
+
+
+def _unpack_header(packed) -> dict:
+    return {
+        "timestamp": packed[0],
+        "prev_block_hash": _unhex(packed[1]),
+        "hash": _unhex(packed[2]),
+        "hash_merkle_root": _unhex(packed[3]),
+        "height": packed[4],
+        "nonce": packed[5]
+    }
+
+
+def _pack_block(block: dict) -> tuple:
+    return (
+        block["magic_no"],
+        _pack_header(block["block_header"]),
+        tuple(_pack_tx(_check(tx, _TX_KEYS)) for tx in block["transactions"])
+    )
+
+
+def _unpack_block(packed) -> dict:
+    return {
+        "magic_no": packed[0],
+        "block_header": _unpack_header(packed[1]),
+        "transactions": [_unpack_tx(tx) for tx in packed[2]]
+    }
+
+
+def _pack_block_ref(block: dict) -> tuple:
+    return (
+        block["magic_no"],
+        _pack_header(block["block_header"]),
+        tuple(_hex(tx_hash) for tx_hash in block["tx_hashes"])
+    )
+
+
+def _unpack_block_ref(packed) -> dict:
+    return {
+        "magic_no": packed[0],
+        "block_header": _unpack_header(packed[1]),
+        "tx_hashes": [_unhex(tx_hash) for tx_hash in packed[2]]
+    }
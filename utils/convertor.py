@@ -1,3 +1,5 @@
+import struct
+
 
 BLOCK_PREFIX = "block#"
 TRANSACTION_PREFIX = "tx#"
@@ -41,4 +43,116 @@ def height_to_db_key(height: int) -> str:
 
 
 def addr_utxo_db_key(address: str) -> str:
-    return UTXO_PREFIX + address
\ No newline at end of file
+    return UTXO_PREFIX + address
+
+"""
+layout v2 的 key 布局
+
+每一种记录使用一个独立的命名空间（plyvel prefixed_db），前缀以 0x00 开头，不会和旧版本的字符串 key 冲突
+  - 哈希值使用 32 字节的二进制
+  - 高度使用 8 字节大端整数，按照 key 排序即按照高度排序
+  - UTxO 的 key 为 32 字节交易哈希 + 4 字节大端输出索引
+
+layout v3 中地址索引的每个 UTxO 使用单独的 key： 地址 + 0x00 + UTxO 的 key， 值为输出的金额
+同一个地址的 UTxO 通过前缀遍历读取， 连接和回滚区块时只需要写入或删除对应的 key
+
+layout v4 增加地址的余额记录， key 为地址， 值为 {"value": 金额, "count": UTxO 数量}
+"""
+LAYOUT_VERSION = 4
+
+NS_BLOCK = b"\x00b"
+NS_HEIGHT = b"\x00h"
+NS_TX = b"\x00t"
+NS_UTXO = b"\x00u"
+NS_ADDRESS = b"\x00a"
+NS_META = b"\x00m"
+# 区块在分段文件中的位置， 见 utils.blockfile
+NS_BLOCK_FILE = b"\x00f"
+# 地址的余额， 和地址索引一起更新
+NS_BALANCE = b"\x00s"
+# 区块的回滚记录， 按照顺序保存区块中被使用的输出的 [地址, 金额]， 见 core.utxo
+NS_UNDO = b"\x00r"
+
+META_LAYOUT_VERSION = b"layout_version"
+META_LATEST = b"latest"
+META_UTXO_HEIGHT = b"utxo_height"
+META_BLOCK_FILE = b"block_file"
+META_PRUNE_HEIGHT = b"prune_height"
+
+_HEIGHT_STRUCT = struct.Struct(">Q")
+_INDEX_STRUCT = struct.Struct(">I")
+
+_ADDRESS_SEPARATOR = b"\x00"
+# UTxO 的 key 的长度， 以及加上地址分隔符之后的长度
+_OUTPOINT_SIZE = 32 + _INDEX_STRUCT.size
+_ADDRESS_OUTPOINT_SIZE = len(_ADDRESS_SEPARATOR) + _OUTPOINT_SIZE
+
+
+def hash_to_key(hex_hash: str) -> bytes:
+    """
+    16进制的哈希值转换为 32 字节的 key
+    :raise ValueError: 哈希值格式错误
+    """
+    key = bytes.fromhex(hex_hash)
+    if len(key) != 32:
+        raise ValueError("Invalid hash length: {}".format(hex_hash))
+    return key
+
+
+def key_to_hash(key: bytes) -> str:
+    return bytes(key).hex()
+
+
+def height_to_key(height: int) -> bytes:
+    return _HEIGHT_STRUCT.pack(height)
+
+
+def key_to_height(key: bytes) -> int:
+    return _HEIGHT_STRUCT.unpack(key)[0]
+
+
+def outpoint_to_key(tx_hash: str, index: int) -> bytes:
+    """
+    交易哈希和输出索引转换为 UTxO 的 key
+    """
+    return hash_to_key(tx_hash) + _INDEX_STRUCT.pack(index)
+
+
+def key_to_outpoint(key: bytes) -> (str, int):
+    return bytes(key[:32]).hex(), _INDEX_STRUCT.unpack(key[32:36])[0]
+
+
+def address_to_key(address: str) -> bytes:
+    return address.encode()
+
+
+def address_prefix(address: str) -> bytes:
+    """
+    地址索引中一个地址的所有 key 的公共前缀， 地址中不包含 0x00， 不会匹配到以该地址开头的其他地址
+    """
+    return address_to_key(address) + _ADDRESS_SEPARATOR
+
+
+def address_outpoint_to_key(address: str, tx_hash: str, index: int) -> bytes:
+    """
+    地址和 UTxO 转换为地址索引的 key
+    """
+    return address_prefix(address) + outpoint_to_key(tx_hash, index)
+
+
+def key_to_address_outpoint(key: bytes) -> (str, str, int):
+    """
+    地址索引的 key 转换为 (地址, 交易哈希, 输出索引)
+    """
+    key = bytes(key)
+    return (key[:-_ADDRESS_OUTPOINT_SIZE].decode(),) + key_to_outpoint(key[-_OUTPOINT_SIZE:])
+
+
+def prefix_end(prefix: bytes):
+    """
+    以 prefix 开头的 key 的上界（不包含）， prefix 全部为 0xff 时没有上界， 返回 None
+    """
+    prefix = prefix.rstrip(b"\xff")
+    if not prefix:
+        return None
+    return prefix[:-1] + bytes([prefix[-1] + 1])
@@ -0,0 +1,498 @@
+import logging
+
+from interfaces.DBInterface import DBInterface
+from interfaces.EngineInterface import EngineInterface
+from utils import codec
+from utils.convertor import LAYOUT_VERSION, NS_META, META_LAYOUT_VERSION, META_LATEST, prefix_end
+from utils.errors import DatabaseLayoutError
+from utils.singleton import Singleton
+from core.config import Config
+from threads.writer import StorageWriter
+
+ENGINE_LEVELDB = "leveldb"
+ENGINE_MEMORY = "memory"
+ENGINE_SQLITE = "sqlite"
+
+ENGINES = (ENGINE_LEVELDB, ENGINE_MEMORY, ENGINE_SQLITE)
+
+
+def open_engine(name: str) -> EngineInterface:
+    """ 根据名称打开存储引擎， 引擎的参数从配置文件中读取
+
+    Args:
+        name: 引擎的名称， 见 ENGINES
+    Returns:
+        打开的存储引擎
+    Raises:
+        ValueError: 引擎不存在或者参数不合法
+    """
+    if name == ENGINE_LEVELDB:
+        from utils.leveldb import LevelDBEngine, OPTIONS, load_options
+
+        path = Config().get("leveldb.path")
+        preset = Config().get("leveldb.preset", "default")
+        overrides = {}
+        for option in OPTIONS:
+            value = Config().get("leveldb." + option)
+            if value is not None:
+                overrides[option] = value
+
+        options = load_options(preset, overrides)
+        logging.info("Open leveldb {} with preset {}, options: {}".format(path, preset, options))
+        return LevelDBEngine(path, options)
+
+    if name == ENGINE_MEMORY:
+        from utils.memorydb import MemoryEngine
+
+        logging.info("Open memory database, data will be lost after exit.")
+        return MemoryEngine()
+
+    if name == ENGINE_SQLITE:
+        from utils.sqlitedb import SQLiteEngine
+
+        path = Config().get("sqlite.path", "./data.sqlite")
+        logging.info("Open sqlite database {}".format(path))
+        return SQLiteEngine(path)
+
+    raise ValueError("Unknown storage engine {}, expect one of {}".format(name, ", ".join(ENGINES)))
+
+
+def _decode_all(values: list) -> list:
+    """
+    解码批量读取的结果， 不存在的 key 对应 None
+    """
+    return [None if data is None else codec.decode(data) for data in values]
+
+
+def _iterate(reader, namespace_prefix: bytes, prefix: bytes, start: bytes, include_value: bool):
+    """ 遍历命名空间内以 prefix 开头的记录
+
+    Args:
+        reader: 存储引擎或者引擎的快照
+        namespace_prefix: 命名空间的前缀
+        prefix: 命名空间内 key 的前缀
+        start: 从第一个不小于 start 的 key 开始遍历， 为空时从头开始， 用于分批读取时的游标
+        include_value: 是否解码并返回值
+    Returns:
+        产生不包含命名空间前缀的 key 或者 (key, 值) 的生成器
+    """
+    full_prefix = namespace_prefix + prefix
+    iterator = reader.iterator(full_prefix)
+    try:
+        if start is not None:
+            iterator.seek(namespace_prefix + start)
+        for key, value in iterator:
+            if include_value:
+                yield key[len(namespace_prefix):], codec.decode(value)
+            else:
+                yield key[len(namespace_prefix):]
+    finally:
+        iterator.close()
+
+
+class Namespace(object):
+    """
+    单一记录类型的命名空间， 所有的 key 都带有相同的前缀
+    读取和遍历时自动加上前缀， 写入通过 WriteBatch 使用完整的 key 提交， 保证跨命名空间的原子性
+    """
+
+    def __init__(self, database, prefix: bytes):
+        self.__database = database
+        self.prefix = prefix
+
+    def get(self, key: bytes, default=None):
+        data = self.__database.read(self.prefix + key)
+        if data is None:
+            return default
+        return codec.decode(data)
+
+    def get_raw(self, key: bytes):
+        return self.__database.read(self.prefix + key)
+
+    def multi_get(self, keys: list) -> list:
+        """ 批量读取多个 key
+
+        先查询写入线程中还没有提交的修改， 剩余的 key 交给存储引擎批量读取
+
+        Args:
+            keys: 需要读取的 key 列表
+        Returns:
+            和 keys 顺序一致的值列表， 不存在的 key 对应 None
+        """
+        return _decode_all(self.multi_get_raw(keys))
+
+    def multi_get_raw(self, keys: list) -> list:
+        """
+        批量读取多个 key 的原始数据， 和 multi_get 一致但是不解码
+        """
+        found = {}
+        pending = set()
+        for key in set(keys):
+            exists, data = self.__database.lookup(self.prefix + key)
+            if not exists:
+                pending.add(self.prefix + key)
+            elif data is not None:
+                found[self.prefix + key] = data
+
+        found.update(self.__database.db.multi_get(pending))
+        return [found.get(self.prefix + key) for key in keys]
+
+    def iterator(self, include_value: bool = True, prefix: bytes = b"", start: bytes = None):
+        """
+        按照 key 的顺序遍历命名空间内以 prefix 开头的记录， 返回的 key 不包含命名空间前缀
+        start 不为空时从第一个不小于 start 的 key 开始
+        只能遍历到已经写入数据库的记录， 需要时先调用 Database.flush
+        """
+        return _iterate(self.__database.db, self.prefix, prefix, start, include_value)
+
+    def __getitem__(self, key: bytes):
+        return self.get(key)
+
+    def __contains__(self, key: bytes):
+        return self.__database.read(self.prefix + key) is not None
+
+
+class Snapshot(object):
+    """
+    数据库在某一次提交之后的只读视图， 由 Database.snapshot 创建
+    每次提交都包含完整的区块连接或断开， 快照中的最新区块指针、区块、交易和 UTxO 总是一致的
+    读取不经过写入线程的 overlay， 也不会和写入线程竞争
+    """
+
+    def __init__(self, db: EngineInterface, generation: int):
+        self.__snapshot = db.snapshot()
+        self.__namespaces = {}
+        # 创建快照时数据库的提交次数
+        self.generation = generation
+
+    def namespace(self, prefix: bytes):
+        if prefix not in self.__namespaces:
+            self.__namespaces[prefix] = SnapshotNamespace(self.__snapshot, prefix)
+        return self.__namespaces[prefix]
+
+
+class SnapshotNamespace(object):
+    """
+    快照中的命名空间， 提供和 Namespace 一致的读取接口
+    """
+
+    def __init__(self, snapshot, prefix: bytes):
+        self.__snapshot = snapshot
+        self.prefix = prefix
+
+    def get(self, key: bytes, default=None):
+        data = self.__snapshot.get(self.prefix + key)
+        if data is None:
+            return default
+        return codec.decode(data)
+
+    def get_raw(self, key: bytes):
+        return self.__snapshot.get(self.prefix + key)
+
+    def multi_get(self, keys: list) -> list:
+        return _decode_all(self.multi_get_raw(keys))
+
+    def multi_get_raw(self, keys: list) -> list:
+        found = self.__snapshot.multi_get(set(self.prefix + key for key in keys))
+        return [found.get(self.prefix + key) for key in keys]
+
+    def iterator(self, include_value: bool = True, prefix: bytes = b"", start: bytes = None):
+        return _iterate(self.__snapshot, self.prefix, prefix, start, include_value)
+
+    def __getitem__(self, key: bytes):
+        return self.get(key)
+
+    def __contains__(self, key: bytes):
+        return self.get_raw(key) is not None
+
+
+class WriteBatch(object):
+    """
+    一次原子提交的写入单元， 收集区块连接/断开时对区块、交易、UTxO 以及索引的所有修改
+    在 write 时通过存储引擎的一次原子写入提交， 避免在多次提交之间崩溃导致索引不一致
+    开启写入线程时交给 StorageWriter 提交， 提交之前的修改通过 overlay 读取
+    """
+
+    def __init__(self, db: EngineInterface, sync: bool = False, writer: StorageWriter = None, on_commit=None):
+        self.__db = db
+        self.__sync = sync
+        self.__writer = writer
+        self.__on_commit = on_commit
+        # (key, value) 列表， value 为 None 表示删除
+        self.__ops = []
+        self.__callbacks = []
+        self.__commit_callbacks = []
+        self.__written = False
+
+    def insert(self, _key: str, _value) -> None:
+        self.__ops.append((bytes(_key, "utf-8"), codec.encode(_value)))
+
+    def remove(self, _key: str) -> None:
+        self.__ops.append((bytes(_key, "utf-8"), None))
+
+    def batch_insert(self, kv_data: dict) -> None:
+        for key in kv_data:
+            self.insert(key, kv_data[key])
+
+    def put(self, namespace: Namespace, key: bytes, value) -> None:
+        self.__ops.append((namespace.prefix + key, codec.encode(value)))
+
+    def put_raw(self, namespace: Namespace, key: bytes, data: bytes) -> None:
+        self.__ops.append((namespace.prefix + key, data))
+
+    def delete(self, namespace: Namespace, key: bytes) -> None:
+        self.__ops.append((namespace.prefix + key, None))
+
+    def batch_remove(self, keys: list) -> None:
+        for key in keys:
+            self.remove(key)
+
+    def after_write(self, callback) -> None:
+        """
+        注册提交成功后执行的回调， 用于在数据可以被读取之后再更新内存中的缓存和索引
+        开启写入线程时， 写入单元进入 overlay 之后执行
+        """
+        self.__callbacks.append(callback)
+
+    def after_commit(self, callback) -> None:
+        """
+        注册写入存储引擎之后执行的回调， 用于快照可以读到修改之后才能执行的操作， 在 after_write 的回调之后执行
+        开启写入线程时 write 会等待写入线程提交该写入单元， 只用于不频繁的写入单元
+        """
+        self.__commit_callbacks.append(callback)
+
+    def write(self) -> None:
+        if self.__written:
+            return
+
+        seq = None
+        if self.__writer is not None:
+            seq = self.__writer.submit(self.__ops, self.__sync)
+        else:
+            self.__db.write(self.__ops, self.__sync)
+            if self.__on_commit is not None:
+                self.__on_commit()
+        self.__written = True
+
+        for callback in self.__callbacks:
+            callback()
+
+        if self.__commit_callbacks:
+            if seq is not None:
+                self.__writer.wait(seq)
+            for callback in self.__commit_callbacks:
+                callback()
+
+    def __setitem__(self, key, value):
+        self.insert(key, value)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # 出现异常时丢弃整个批次
+        if exc_type is None:
+            self.write()
+        else:
+            self.__ops.clear()
+
+
+class Database(DBInterface, Singleton):
+    """
+    节点的数据库， 存储引擎通过配置文件中的 storage.engine 选择， 见 ENGINES
+    在引擎之上提供命名空间、记录的编码、写入线程和快照
+    """
+
+    def __init__(self):
+        self.__db = None
+        self.__engine = Config().get("storage.engine", ENGINE_LEVELDB)
+        self.__namespaces = {}
+        self.__writer = None
+        # 数据库的提交次数和最近一次创建的快照
+        self.__generation = 0
+        self.__snapshot = None
+        # 写入交给单独的写入线程， 见 threads.writer
+        self.__write_behind = int(Config().get("storage.write_behind", 0)) == 1
+
+    @property
+    def db(self) -> EngineInterface:
+        if not self.__db:
+            db = open_engine(self.__engine)
+            self.check_layout(db)
+            self.__db = db
+
+            if self.__write_behind:
+                self.__writer = StorageWriter(db, self.__on_commit)
+
+        return self.__db
+
+    @staticmethod
+    def check_layout(db: EngineInterface) -> None:
+        """ 检查数据目录的 key 布局版本
+
+        新建的数据目录直接写入当前的版本号
+        旧版本的数据目录（存在旧布局的 latest 记录）需要先离线迁移
+
+        Raises:
+            DatabaseLayoutError: 数据目录的版本和当前程序不一致
+        """
+        data = db.get(NS_META + META_LAYOUT_VERSION)
+
+        if data is None:
+            if db.get(META_LATEST) is not None:
+                raise DatabaseLayoutError("Database layout is outdated, run `python main.py migrate` first.")
+            db.write([(NS_META + META_LAYOUT_VERSION, codec.encode(LAYOUT_VERSION))], True)
+            return
+
+        version = codec.decode(data)
+        if version < LAYOUT_VERSION:
+            raise DatabaseLayoutError("Database layout v{} is outdated, run `python main.py migrate` first.".format(
+                version))
+        if version != LAYOUT_VERSION:
+            raise DatabaseLayoutError("Database layout version {} is not supported, expect {}.".format(
+                version, LAYOUT_VERSION))
+
+    def namespace(self, prefix: bytes) -> Namespace:
+        """
+        获取对应前缀的命名空间， 前缀定义在 utils.convertor 中
+        """
+        if prefix not in self.__namespaces:
+            self.__namespaces[prefix] = Namespace(self, prefix)
+        return self.__namespaces[prefix]
+
+    def read(self, key: bytes):
+        """
+        读取完整 key 对应的原始数据， 优先读取写入线程中还没有提交的修改
+        """
+        exists, data = self.lookup(key)
+        if exists:
+            return data
+        return self.db.get(key)
+
+    def lookup(self, key: bytes) -> (bool, bytes):
+        """
+        查询写入线程中还没有提交的修改， 返回 (是否存在修改, 修改后的值)
+        """
+        if self.__writer is None:
+            return False, None
+        return self.__writer.lookup(key)
+
+    def flush(self, sync: bool = False) -> None:
+        """
+        等待写入线程将已经提交的写入单元全部写入数据库
+        :param sync: 是否额外进行一次同步刷盘
+        """
+        if self.__writer is not None:
+            self.__writer.flush(sync)
+
+    def compact(self, prefix: bytes) -> None:
+        """
+        等待写入线程提交之后压缩整个命名空间， 回收被删除的记录占用的空间
+        """
+        self.flush()
+        self.db.compact_range(prefix, prefix_end(prefix))
+
+    def close(self) -> None:
+        """
+        停止写入线程并关闭数据库， 关闭节点时调用
+        """
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
+        self.__snapshot = None
+        if self.__db:
+            self.__db.close()
+            self.__db = None
+
+    def insert(self, _key: str, _value: dict) -> bool:
+        try:
+            with self.write_batch() as batch:
+                batch.insert(_key, _value)
+        except Exception as e:
+            logging.error(e)
+            return False
+
+        return True
+
+    def remove(self, _key: str) -> bool:
+        try:
+            with self.write_batch() as batch:
+                batch.remove(_key)
+        except Exception as e:
+            logging.error(e)
+            return False
+
+        return True
+
+    def get(self, key, default=None):
+        bytes_key = bytes(key, "utf-8")
+        bytes_data = self.read(bytes_key)
+
+        if not bytes_data:
+            return default
+        return codec.decode(bytes_data)
+
+    def write_batch(self, sync: bool = False) -> WriteBatch:
+        """
+        创建一个原子写入单元， 配合 with 语句使用， 退出时统一提交
+        :param sync: 是否在提交时同步刷盘
+        """
+        return WriteBatch(self.db, sync, self.__writer, self.__on_commit)
+
+    def __on_commit(self) -> None:
+        self.__generation += 1
+
+    def snapshot(self) -> Snapshot:
+        """ 获取最近一次提交之后的快照
+
+        同一次提交之后的所有读取共用一个快照， 在下一次提交之后重新创建
+        RPC 和邻居节点的读取通过快照完成， 一次请求中的多次读取看到的是同一个区块高度的状态
+
+        Returns:
+            只读的快照
+        """
+        generation = self.__generation
+        snapshot = self.__snapshot
+        # 先取出提交次数再创建快照， 创建期间发生的提交会让下一次调用重新创建
+        if snapshot is None or snapshot.generation != generation:
+            snapshot = Snapshot(self.db, generation)
+            self.__snapshot = snapshot
+        return snapshot
+
+    def batch_insert(self, kv_data: dict):
+        """
+        考虑后面挪到一个文档中说明
+        kv_data format:
+        {
+            "key1": {value_dict},
+            "key2": {value_dict},
+            ...
+        }
+        """
+        with self.write_batch() as batch:
+            batch.batch_insert(kv_data)
+
+    def batch_remove(self, keys: list):
+        with self.write_batch() as batch:
+            batch.batch_remove(keys)
+
+    def __getattr__(self, key):
+        return getattr(self.db, key)
+
+    def __getitem__(self, key: str):
+        bytes_key = bytes(key, "utf-8")
+        bytes_data = self.read(bytes_key)
+
+        if not bytes_data:
+            return None
+        return codec.decode(bytes_data)
+
+    def __setitem__(self, key, value):
+        self.insert(key, value)
+
+    def __del__(self):
+        self.close()
+
+    @staticmethod
+    def set_default(obj: set):
+        return list(obj)
\ No newline at end of file
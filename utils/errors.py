@@ -0,0 +1,16 @@
+class DatabaseLayoutError(Exception):
+    """
+    数据目录的 key 布局版本和当前程序不一致， 需要先执行 main.py migrate 进行迁移
+    """
+
+
+class StorageWriterError(Exception):
+    """
+    写入线程提交数据失败， 内存中的状态和数据库已经不一致， 需要重启节点
+    """
+
+
+class PrunedBlockError(Exception):
+    """
+    需要的区块内容已经被裁剪， 不能通过区块重建 UTxO 集合， 需要使用新的数据目录重新同步
+    """
@@ -1,97 +1,162 @@
-import json
-
 import plyvel
-import rlp
-import logging
-
-from interfaces.DBInterface import DBInterface
-from utils.singleton import Singleton
-from core.config import Config
-
-
-class LevelDB(DBInterface, Singleton):
-    def __init__(self):
-        self.__db = None
-        self.__leveldb = Config().get("leveldb.path")
-
-    @property
-    def db(self) -> plyvel.DB:
-        if not self.__db:
-            self.__db = plyvel.DB(self.__leveldb, create_if_missing=True)
-
-        return self.__db
-
-    def insert(self, _key: str, _value: dict) -> bool:
-        # bytes_value = rlp.encode(_value)
-        bytes_value = bytes(json.dumps(_value), "utf-8")
-        bytes_key = bytes(_key, 'utf-8')
-
-        try:
-            self.db.put(bytes_key, bytes_value)
-        except Exception as e:
-            logging.error(e)
-            return False
-
-        return True
-
-    def remove(self, _key: str) -> bool:
-        bytes_key = bytes(_key, 'utf-8')
-        try:
-            self.db.delete(bytes_key)
-        except Exception as e:
-            logging.error(e)
-            return False
 
+from interfaces.EngineInterface import EngineInterface
+
+# leveldb 调优参数的预设， 参数名和 plyvel.DB 一致， 没有出现的参数使用 leveldb 的默认值
+PRESETS = {
+    "default": {},
+    # 同步区块、大量写入： 更大的 memtable 和 sst 文件， 减少 compaction 的次数
+    "sync-heavy": {
+        "write_buffer_size": 64 * 1024 * 1024,
+        "max_file_size": 8 * 1024 * 1024,
+        "lru_cache_size": 32 * 1024 * 1024,
+        "bloom_filter_bits": 10,
+        "max_open_files": 1000,
+    },
+    # RPC 查询为主： 更大的块缓存和布隆过滤器， 降低随机读取的读放大
+    "rpc-heavy": {
+        "lru_cache_size": 256 * 1024 * 1024,
+        "bloom_filter_bits": 10,
+        "max_open_files": 2000,
+        "block_size": 4096,
+    },
+    "low-memory": {
+        "write_buffer_size": 2 * 1024 * 1024,
+        "lru_cache_size": 4 * 1024 * 1024,
+        "bloom_filter_bits": 10,
+        "max_open_files": 100,
+    },
+}
+
+
+def _parse_bool(value: str) -> bool:
+    if value.lower() in ("1", "true", "yes", "on"):
         return True
-
-    def get(self, key, default=None):
-        bytes_key = bytes(key, "utf-8")
-        bytes_data = self.db.get(bytes_key)
-
-        if not bytes_data:
-            return default
-        return json.loads(bytes_data.decode())
-
-    def batch_insert(self, kv_data: dict):
-        """
-        考虑后面挪到一个文档中说明
-        kv_data format:
-        {
-            "key1": {value_dict},
-            "key2": {value_dict},
-            ...
-        }
-        """
-        with self.db.write_batch() as wb:
-            for key in kv_data:
-                bytes_key = bytes(key, "utf-8")
-                # bytes_value = rlp.encode(kv_data[bytes_key])
-                bytes_value = bytes(json.dumps(kv_data[key]), "utf-8")
-                wb.put(bytes_key, bytes_value)
-
-    def batch_remove(self, keys: list):
-        with self.db.write_batch() as wb:
-            for key in keys:
-                bytes_key = bytes(key, "utf-8")
-                wb.delete(bytes_key)
-
-    def __getattr__(self, key):
-        return getattr(self.db, key)
-
-    def __getitem__(self, key: str):
-        bytes_key = bytes(key, "utf-8")
-        bytes_data = self.db.get(bytes_key)
-
-        if not bytes_data:
-            return None
-        return json.loads(bytes_data.decode())
-
-    def __setitem__(self, key, value):
-        self.insert(key, value)
-
-    def __del__(self):
-        self.db.close()
-
-    @staticmethod
-    def set_default(obj: set):
-        return list(obj)
\ No newline at end of file
+    if value.lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError("Invalid boolean value {}".format(value))
+
+
+def _parse_compression(value: str):
+    if value.lower() == "snappy":
+        return "snappy"
+    if value.lower() in ("none", ""):
+        return None
+    raise ValueError("Invalid compression {}, expect snappy or none".format(value))
+
+
+# 配置文件 [leveldb] 中的参数名 -> (plyvel.DB 的参数名, 转换函数)
+OPTIONS = {
+    "block_cache_size": ("lru_cache_size", int),
+    "bloom_filter_bits": ("bloom_filter_bits", int),
+    "write_buffer_size": ("write_buffer_size", int),
+    "max_open_files": ("max_open_files", int),
+    "block_size": ("block_size", int),
+    "max_file_size": ("max_file_size", int),
+    "compression": ("compression", _parse_compression),
+    "paranoid_checks": ("paranoid_checks", _parse_bool),
+}
+
+
+def load_options(preset: str = "default", overrides: dict = None) -> dict:
+    """ 计算打开 leveldb 时使用的参数
+
+    先取出预设中的参数， 再使用配置文件中单独设置的参数进行覆盖
+
+    Args:
+        preset: 预设的名称， 见 PRESETS
+        overrides: 配置文件中的参数， 参数名见 OPTIONS， 值为字符串
+    Returns:
+        plyvel.DB 的参数
+    Raises:
+        ValueError: 预设不存在或者参数的值不合法
+    """
+    if preset not in PRESETS:
+        raise ValueError("Unknown leveldb preset {}, expect one of {}".format(preset, ", ".join(PRESETS)))
+
+    options = dict(PRESETS[preset])
+    for name, value in (overrides or {}).items():
+        if name not in OPTIONS:
+            raise ValueError("Unknown leveldb option {}".format(name))
+        option, convert = OPTIONS[name]
+        options[option] = convert(value.strip())
+    return options
+
+
+def _seek_all(iterator, keys) -> dict:
+    """
+    对 key 排序后使用同一个迭代器依次 seek， 返回存在的 key 和对应的值， 迭代器使用之后关闭
+    """
+    found = {}
+    try:
+        for key in sorted(keys):
+            iterator.seek(key)
+            try:
+                item_key, item_value = next(iterator)
+            except StopIteration:
+                break
+            if item_key == key:
+                found[key] = item_value
+    finally:
+        iterator.close()
+    return found
+
+
+class LevelDBEngine(EngineInterface):
+    """
+    plyvel 实现的 leveldb 存储引擎
+    """
+
+    def __init__(self, path: str, options: dict = None):
+        self.__db = plyvel.DB(path, create_if_missing=True, **(options or {}))
+
+    def get(self, key: bytes):
+        return self.__db.get(key)
+
+    def multi_get(self, keys) -> dict:
+        return _seek_all(self.__db.iterator(), keys)
+
+    def write(self, ops: list, sync: bool = False) -> None:
+        with self.__db.write_batch(sync=sync) as wb:
+            for key, value in ops:
+                if value is None:
+                    wb.delete(key)
+                else:
+                    wb.put(key, value)
+
+    def iterator(self, prefix: bytes = b""):
+        if not prefix:
+            return self.__db.iterator()
+        return self.__db.iterator(prefix=prefix)
+
+    def snapshot(self):
+        return LevelDBSnapshot(self.__db.snapshot())
+
+    def compact_range(self, start: bytes, stop: bytes) -> None:
+        self.__db.compact_range(start=start, stop=stop)
+
+    def close(self) -> None:
+        self.__db.close()
+
+
+class LevelDBSnapshot(object):
+    """
+    leveldb 的快照， 读取创建快照时的数据
+    """
+
+    def __init__(self, snapshot):
+        self.__snapshot = snapshot
+
+    def get(self, key: bytes):
+        return self.__snapshot.get(key)
+
+    def multi_get(self, keys) -> dict:
+        return _seek_all(self.__snapshot.iterator(), keys)
+
+    def iterator(self, prefix: bytes = b""):
+        if not prefix:
+            return self.__snapshot.iterator()
+        return self.__snapshot.iterator(prefix=prefix)
+
+    def close(self) -> None:
+        self.__snapshot.close()
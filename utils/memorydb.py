@@ -0,0 +1,167 @@
+import bisect
+import threading
+import weakref
+
+from interfaces.EngineInterface import EngineInterface
+from utils.convertor import prefix_end
+
+"""
+内存存储引擎
+
+数据保存在 dict 中， 另外维护一个有序的 key 列表用于按顺序遍历， 进程退出后数据丢失
+用于测试和 benchmark， 对比其他引擎时排除磁盘的影响
+"""
+
+
+def _bounds(keys: list, prefix: bytes) -> (int, int):
+    """
+    以 prefix 开头的 key 在有序列表中的范围 [lo, hi)
+    """
+    lo = bisect.bisect_left(keys, prefix)
+    stop = prefix_end(prefix)
+    hi = len(keys) if stop is None else bisect.bisect_left(keys, stop, lo)
+    return lo, hi
+
+
+class MemoryIterator(object):
+    """
+    有序 key 列表 [lo, hi) 范围内的迭代器， 接口和 plyvel 的迭代器一致
+    """
+
+    def __init__(self, keys: list, data: dict, lo: int, hi: int):
+        self.__keys = keys
+        self.__data = data
+        self.__lo = lo
+        self.__hi = hi
+        self.__pos = lo
+
+    def seek(self, key: bytes) -> None:
+        self.__pos = bisect.bisect_left(self.__keys, key, self.__lo, self.__hi)
+
+    def close(self) -> None:
+        self.__pos = self.__hi
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while self.__pos < self.__hi:
+            key = self.__keys[self.__pos]
+            self.__pos += 1
+            # 遍历期间被删除的 key 直接跳过
+            value = self.__data.get(key)
+            if value is not None:
+                return key, value
+        raise StopIteration
+
+
+class MemorySnapshot(object):
+    """
+    内存引擎的快照， 写时复制： 创建时不复制数据， 引擎在修改 key 之前把修改前的值保存到所有存活的快照中，
+    读取时优先使用保存的值， 没有保存的 key 在创建快照之后没有被修改过， 直接读取引擎中的数据
+    """
+
+    def __init__(self, keys: list, data: dict, lock):
+        self.__keys = keys
+        self.__data = data
+        self.__lock = lock
+        # key -> 创建快照时的值， 创建快照时不存在的 key 对应 None
+        self.__saved = {}
+        self.__closed = False
+
+    def save(self, key: bytes, value) -> None:
+        """
+        引擎修改 key 之前调用， 只保存第一次修改之前的值， 调用方持有引擎的锁
+        """
+        if not self.__closed and key not in self.__saved:
+            self.__saved[key] = value
+
+    def get(self, key: bytes):
+        # 先读取引擎中的数据再查询保存的值， 引擎先保存再修改， 读到修改之后的值时一定可以查询到保存的值
+        value = self.__data.get(key)
+        saved = self.__saved
+        if key in saved:
+            return saved[key]
+        return value
+
+    def multi_get(self, keys) -> dict:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def iterator(self, prefix: bytes = b""):
+        with self.__lock:
+            lo, hi = _bounds(self.__keys, prefix)
+            keys = set(self.__keys[lo:hi])
+            stop = prefix_end(prefix)
+            # 创建快照之后被删除的 key 只存在于保存的值中
+            keys.update(key for key in self.__saved if key >= prefix and (stop is None or key < stop))
+        keys = sorted(keys)
+        return MemoryIterator(keys, self, 0, len(keys))
+
+    def close(self) -> None:
+        # 关闭之后不再保存修改前的值， 也不能再读取
+        with self.__lock:
+            self.__closed = True
+            self.__saved = {}
+
+
+class MemoryEngine(EngineInterface):
+    def __init__(self):
+        self.__data = {}
+        # 和 data 中的 key 一致的有序列表
+        self.__keys = []
+        self.__lock = threading.Lock()
+        # 存活的快照， 修改 key 之前保存修改前的值
+        self.__snapshots = weakref.WeakSet()
+
+    def get(self, key: bytes):
+        return self.__data.get(key)
+
+    def multi_get(self, keys) -> dict:
+        found = {}
+        for key in keys:
+            value = self.__data.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def write(self, ops: list, sync: bool = False) -> None:
+        with self.__lock:
+            for key, value in ops:
+                for snapshot in self.__snapshots:
+                    snapshot.save(key, self.__data.get(key))
+
+                if value is None:
+                    if self.__data.pop(key, None) is not None:
+                        del self.__keys[bisect.bisect_left(self.__keys, key)]
+                    continue
+
+                if key not in self.__data:
+                    bisect.insort(self.__keys, key)
+                self.__data[key] = bytes(value)
+
+    def iterator(self, prefix: bytes = b""):
+        with self.__lock:
+            lo, hi = _bounds(self.__keys, prefix)
+            # 复制遍历范围内的 key， 遍历期间的写入不会影响迭代器的位置
+            keys = self.__keys[lo:hi]
+        return MemoryIterator(keys, self.__data, 0, len(keys))
+
+    def snapshot(self):
+        with self.__lock:
+            snapshot = MemorySnapshot(self.__keys, self.__data, self.__lock)
+            self.__snapshots.add(snapshot)
+        return snapshot
+
+    def compact_range(self, start: bytes, stop: bytes) -> None:
+        pass
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__data = {}
+            self.__keys = []
+            self.__snapshots = weakref.WeakSet()
@@ -0,0 +1,271 @@
+import logging
+
+import plyvel
+
+from utils import codec
+from utils.convertor import BLOCK_PREFIX, TRANSACTION_PREFIX, UTXO_PREFIX
+from utils.convertor import LAYOUT_VERSION, NS_BLOCK, NS_HEIGHT, NS_TX, NS_UTXO, NS_ADDRESS, NS_BALANCE, NS_META
+from utils.convertor import META_LAYOUT_VERSION, META_LATEST, META_UTXO_HEIGHT
+from utils.convertor import hash_to_key, height_to_key, outpoint_to_key, address_to_key, address_prefix
+from utils.convertor import key_to_address_outpoint
+
+"""
+数据目录的离线迁移工具， 由 main.py 中的 migrate 命令调用
+迁移过程中节点不能运行， 否则 leveldb 的锁会导致打开数据库失败
+"""
+
+# 每个批量写入包含的记录数
+BATCH_SIZE = 10000
+
+
+def rewrite_values(db: plyvel.DB) -> int:
+    """ 将 json 格式的值重写为二进制格式
+
+    遍历命名空间之外的记录， 已经是二进制格式的记录直接跳过， 可以重复执行
+    命名空间中的记录在迁移时已经写入为二进制格式
+
+    Args:
+        db: 已经打开的数据库实例
+    Returns:
+        被重写的记录数量
+    """
+    count = 0
+    wb = db.write_batch()
+    pending = 0
+
+    for key, value in db.iterator():
+        if key.startswith(b"\x00") or codec.is_binary(value):
+            continue
+
+        try:
+            record = codec.decode(value)
+        except ValueError:
+            logging.warning("Skip undecodable record {}.".format(key))
+            continue
+
+        wb.put(key, codec.encode(record))
+        count += 1
+        pending += 1
+
+        if pending >= BATCH_SIZE:
+            wb.write()
+            wb = db.write_batch()
+            pending = 0
+
+    wb.write()
+    return count
+
+
+def _parse_utxo_key(key: str) -> (str, int):
+    """
+    解析旧布局下的 utxo#<tx_hash>#<index>
+    """
+    tx_hash, index = key[len(UTXO_PREFIX):].split("#")
+    return tx_hash, int(index)
+
+
+def _convert_legacy_record(key: str, value):
+    """ 将旧布局下的一条记录转换为新布局下的 (命名空间, key, 值)
+
+    Returns:
+        无法识别的记录（钱包信息等）返回 None， 保留在原有的位置
+    """
+    if key == "latest":
+        return NS_META, META_LATEST, codec.encode(value)
+
+    if key.startswith(BLOCK_PREFIX):
+        suffix = key[len(BLOCK_PREFIX):]
+        if suffix.isdigit():
+            # block#<height> 存储的是区块哈希
+            return NS_HEIGHT, height_to_key(int(suffix)), hash_to_key(value)
+        return NS_BLOCK, hash_to_key(suffix), codec.encode(value)
+
+    if key.startswith(TRANSACTION_PREFIX):
+        return NS_TX, hash_to_key(key[len(TRANSACTION_PREFIX):]), codec.encode(value)
+
+    if key.startswith(UTXO_PREFIX):
+        suffix = key[len(UTXO_PREFIX):]
+        if suffix == "latest#0":
+            return NS_META, META_UTXO_HEIGHT, codec.encode(value)
+        if "#" in suffix:
+            # UTXOSet.reindex 写入的记录使用 hash 作为交易哈希的字段名
+            if "hash" in value:
+                value["tx_hash"] = value.pop("hash")
+            return NS_UTXO, outpoint_to_key(*_parse_utxo_key(key)), codec.encode(value)
+
+        # 旧版本中地址记录存在直接存储列表的情况
+        utxo_db_keys = value.get("utxos", []) if isinstance(value, dict) else value
+        utxo_keys = [outpoint_to_key(*_parse_utxo_key(utxo_db_key)) for utxo_db_key in utxo_db_keys]
+        return NS_ADDRESS, address_to_key(suffix), codec.encode({"utxos": utxo_keys})
+
+    return None
+
+
+def migrate_layout_v2(db: plyvel.DB) -> int:
+    """ layout v1 -> v2
+
+    将 block#、tx#、utxo# 等字符串 key 移动到各自的命名空间中， 哈希、高度转换为二进制的 key
+
+    Args:
+        db: 已经打开的数据库实例
+    Returns:
+        被迁移的记录数量
+    """
+    count = 0
+    wb = db.write_batch()
+    pending = 0
+
+    for key, value in db.iterator():
+        # 已经在命名空间中的记录
+        if key.startswith(b"\x00"):
+            continue
+
+        try:
+            converted = _convert_legacy_record(key.decode(), codec.decode(value))
+        except ValueError as e:
+            logging.warning("Skip invalid record {}: {}".format(key, e))
+            continue
+
+        if converted is None:
+            continue
+
+        prefix, new_key, new_value = converted
+        wb.put(prefix + new_key, new_value)
+        wb.delete(key)
+        count += 1
+        pending += 1
+
+        if pending >= BATCH_SIZE:
+            wb.write()
+            wb = db.write_batch()
+            pending = 0
+
+    wb.write()
+    return count
+
+
+def migrate_layout_v3(db: plyvel.DB) -> int:
+    """ layout v2 -> v3
+
+    地址记录 {"utxos": [UTxO 的 key]} 拆分为每个 UTxO 一个 key 的地址索引， 值为输出的金额
+
+    Args:
+        db: 已经打开的数据库实例
+    Returns:
+        被拆分的地址记录数量
+    """
+    addresses = db.prefixed_db(NS_ADDRESS)
+    utxos = db.prefixed_db(NS_UTXO)
+    count = 0
+    wb = db.write_batch()
+    pending = 0
+
+    # 遍历期间写入的新 key 不会出现在迭代器中
+    with addresses.snapshot() as snapshot:
+        for key, value in snapshot.iterator():
+            # v3 的 key 中包含地址和 UTxO 之间的分隔符
+            if b"\x00" in key:
+                continue
+
+            prefix = address_prefix(key.decode())
+            for utxo_key in codec.decode(value).get("utxos", []):
+                utxo_data = utxos.get(utxo_key)
+                if utxo_data is None:
+                    logging.warning("Skip missing utxo {} of address {}.".format(bytes(utxo_key).hex(), key))
+                    continue
+                wb.put(NS_ADDRESS + prefix + utxo_key, codec.encode(codec.decode(utxo_data)["value"]))
+                pending += 1
+
+            wb.delete(NS_ADDRESS + key)
+            count += 1
+            pending += 1
+
+            if pending >= BATCH_SIZE:
+                wb.write()
+                wb = db.write_batch()
+                pending = 0
+
+    wb.write()
+    return count
+
+
+def migrate_layout_v4(db: plyvel.DB) -> int:
+    """ layout v3 -> v4
+
+    遍历地址索引， 按照地址累加输出的金额和数量， 写入地址的余额记录
+    地址索引按照地址排序， 同一个地址的记录是连续的
+
+    Args:
+        db: 已经打开的数据库实例
+    Returns:
+        写入的余额记录数量
+    """
+    balances = []
+    address = None
+
+    for key, value in db.prefixed_db(NS_ADDRESS).iterator():
+        key_address = key_to_address_outpoint(key)[0]
+        if key_address != address:
+            address = key_address
+            balances.append((address, {"value": 0, "count": 0}))
+
+        balance = balances[-1][1]
+        balance["value"] += codec.decode(value)
+        balance["count"] += 1
+
+    wb = db.write_batch()
+    for idx, (address, balance) in enumerate(balances):
+        wb.put(NS_BALANCE + address_to_key(address), codec.encode(balance))
+        if (idx + 1) % BATCH_SIZE == 0:
+            wb.write()
+            wb = db.write_batch()
+    wb.write()
+    return len(balances)
+
+
+# 按照版本号排列的迁移步骤， 每一步将数据目录迁移到对应的版本
+MIGRATIONS = [
+    (2, migrate_layout_v2),
+    (3, migrate_layout_v3),
+    (4, migrate_layout_v4),
+]
+
+
+def get_layout_version(db: plyvel.DB) -> int:
+    """
+    获取数据目录的布局版本， 没有版本标记的数据目录为 v1
+    """
+    data = db.prefixed_db(NS_META).get(META_LAYOUT_VERSION)
+    if data is None:
+        return 1
+    return codec.decode(data)
+
+
+def migrate(path: str) -> None:
+    """ 迁移指定的数据目录
+
+    依次执行版本号高于当前版本的迁移步骤， 每一步完成后更新版本标记
+    最后将剩余的 json 记录重写为二进制格式
+
+    Args:
+        path: leveldb 的数据目录
+    """
+    db = plyvel.DB(path, create_if_missing=False)
+    try:
+        version = get_layout_version(db)
+        if version > LAYOUT_VERSION:
+            logging.error("Database layout version {} is newer than {}.".format(version, LAYOUT_VERSION))
+            return
+
+        for target, step in MIGRATIONS:
+            if version >= target:
+                continue
+            count = step(db)
+            db.prefixed_db(NS_META).put(META_LAYOUT_VERSION, codec.encode(target), sync=True)
+            version = target
+            logging.info("Migrate {} records to layout v{}.".format(count, target))
+
+        count = rewrite_values(db)
+        logging.info("Rewrite {} records to binary format.".format(count))
+    finally:
+        db.close()
@@ -0,0 +1,179 @@
+import itertools
+import sqlite3
+import threading
+
+from interfaces.EngineInterface import EngineInterface
+from utils.convertor import prefix_end
+
+"""
+sqlite 存储引擎
+
+所有记录保存在一张 key 为主键的表中（WITHOUT ROWID， 按 key 有序存储）， 使用 WAL 模式
+  - 写入单元在一个事务中提交， sync 为 True 时使用 synchronous=FULL， 否则为 NORMAL
+  - 快照使用单独的连接开启一个读事务， WAL 模式下读事务只能看到开启时已经提交的数据
+  - 迭代器每次读取一页数据， 不长时间占用连接
+"""
+
+_PAGE_SIZE = 256
+# sqlite 单条语句的参数数量上限为 999
+_MULTI_GET_SIZE = 500
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # 事务由代码显式控制， 连接由多个线程通过锁共享
+    return sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+
+
+class SQLiteReader(object):
+    """
+    一个连接上的读取操作， 由引擎和快照共用
+    """
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock):
+        self._conn = conn
+        self._lock = lock
+
+    def get(self, key: bytes):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def multi_get(self, keys) -> dict:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for idx in range(0, len(keys), _MULTI_GET_SIZE):
+                chunk = keys[idx: idx + _MULTI_GET_SIZE]
+                sql = "SELECT key, value FROM kv WHERE key IN ({})".format(", ".join("?" * len(chunk)))
+                found.update(self._conn.execute(sql, chunk).fetchall())
+        return found
+
+    def iterator(self, prefix: bytes = b""):
+        return SQLiteIterator(self, prefix)
+
+    def page(self, start: bytes, inclusive: bool, stop) -> list:
+        """
+        读取 start 之后、stop 之前的一页数据， stop 为 None 时没有上界
+        """
+        sql = "SELECT key, value FROM kv WHERE key {} ?".format(">=" if inclusive else ">")
+        params = [start]
+        if stop is not None:
+            sql += " AND key < ?"
+            params.append(stop)
+        sql += " ORDER BY key LIMIT {}".format(_PAGE_SIZE)
+
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+class SQLiteIterator(object):
+    """
+    按页读取的迭代器， 接口和 plyvel 的迭代器一致
+    """
+
+    def __init__(self, reader: SQLiteReader, prefix: bytes):
+        self.__reader = reader
+        self.__prefix = prefix
+        self.__stop = prefix_end(prefix) if prefix else None
+        self.__rows = []
+        self.__pos = 0
+        self.__next_key = prefix
+        self.__inclusive = True
+        self.__done = False
+
+    def seek(self, key: bytes) -> None:
+        self.__rows = []
+        self.__pos = 0
+        self.__next_key = max(key, self.__prefix)
+        self.__inclusive = True
+        self.__done = False
+
+    def close(self) -> None:
+        self.__rows = []
+        self.__done = True
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.__pos >= len(self.__rows):
+            if self.__done:
+                raise StopIteration
+            self.__rows = self.__reader.page(self.__next_key, self.__inclusive, self.__stop)
+            self.__pos = 0
+            if len(self.__rows) < _PAGE_SIZE:
+                self.__done = True
+            if not self.__rows:
+                raise StopIteration
+            self.__next_key = self.__rows[-1][0]
+            self.__inclusive = False
+
+        row = self.__rows[self.__pos]
+        self.__pos += 1
+        return row
+
+
+class SQLiteSnapshot(SQLiteReader):
+    """
+    sqlite 的快照， 在单独的连接上保持一个读事务
+    """
+
+    def __init__(self, path: str):
+        super().__init__(_connect(path), threading.Lock())
+        self._conn.execute("BEGIN")
+        # 读事务在第一次读取时才真正开始
+        self._conn.execute("SELECT 1 FROM kv LIMIT 1").fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.rollback()
+                self._conn.close()
+                self._conn = None
+
+    def __del__(self):
+        self.close()
+
+
+class SQLiteEngine(SQLiteReader, EngineInterface):
+    def __init__(self, path: str):
+        conn = _connect(path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS kv (key BLOB PRIMARY KEY, value BLOB NOT NULL) WITHOUT ROWID")
+        super().__init__(conn, threading.Lock())
+        self.__path = path
+        self.__sync = False
+
+    def write(self, ops: list, sync: bool = False) -> None:
+        with self._lock:
+            # synchronous 不能在事务中修改
+            if sync != self.__sync:
+                self._conn.execute("PRAGMA synchronous = {}".format("FULL" if sync else "NORMAL"))
+                self.__sync = sync
+
+            self._conn.execute("BEGIN")
+            try:
+                # 连续的写入或删除合并成一次 executemany， 保持修改的顺序
+                for is_delete, group in itertools.groupby(ops, key=lambda op: op[1] is None):
+                    if is_delete:
+                        self._conn.executemany("DELETE FROM kv WHERE key = ?", ((key,) for key, _ in group))
+                    else:
+                        self._conn.executemany("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", group)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def snapshot(self):
+        return SQLiteSnapshot(self.__path)
+
+    def compact_range(self, start: bytes, stop: bytes) -> None:
+        # sqlite 不支持按范围压缩， 被删除的记录占用的页会被之后的写入复用
+        pass
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None